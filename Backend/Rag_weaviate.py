@@ -1,497 +1,1224 @@
-import os
-import re
-import json
-from typing import List, Dict, Any, Optional, Set
-from enum import Enum
-import time
-import traceback
-import datetime as dt
-
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain_core.prompts import PromptTemplate
-from langchain.schema import Document
-from langchain_cohere import CohereEmbeddings
-from sentence_transformers import CrossEncoder
-
-import weaviate
-from weaviate.classes.init import Auth
-from weaviate.classes.query import MetadataQuery, Filter
-
-# Asumsikan Anda memiliki file ini untuk manajemen riwayat obrolan.
-from chat_history_service import ChatHistoryService
-
-# Muat environment variables dari file .env
-load_dotenv()
-
-# ============================================================================
-# 1. SISTEM POLA RESPONS
-# ============================================================================
-class ResponsePattern(Enum):
-    """Enum untuk mendefinisikan pola-pola respons yang tersedia."""
-    GREETING = "greeting"
-    PASAL_QUERY = "pasal_query"
-    DOCUMENT_QUERY = "document_query"
-    OUT_OF_CONTEXT = "out_of_context"
-    GRATITUDE = "gratitude"
-    FAREWELL = "farewell"
-    SMALL_TALK = "small_talk"
-
-# ============================================================================
-# 2. FORMATTER RESPONS
-# ============================================================================
-class ResponseFormatter:
-    """Class untuk memformat respons RAG yang terstruktur."""
-    @staticmethod
-    def format_pasal_response(pasal_number: str, content: str, source_docs: List[Any]) -> Dict[str, Any]:
-        if source_docs and content:
-            response = f"📖 *PASAL {pasal_number}*\n\n{content}\n\n"
-            response += "=" * 35 + "\n"
-            response += "📚 *SUMBER PASAL:*\n"
-            response += "=" * 35 + "\n"
-            for i, doc in enumerate(source_docs[:2], 1):
-                metadata = doc.metadata
-                source_name = metadata.get("source", "Dokumen Hukum")
-                response += f"{i}. {source_name}"
-                if metadata.get("page") and str(metadata.get("page")) != "?":
-                    response += f" | Hal. {metadata.get('page')}"
-                response += "\n"
-        else:
-            response = f"❌ *PASAL {pasal_number} TIDAK DITEMUKAN*\n\nMaaf, Pasal {pasal_number} tidak ditemukan dalam dokumen yang tersedia."
-        return {"response": response, "source_documents": source_docs}
-
-    @staticmethod
-    def format_document_response(answer: str, source_docs: List[Any]) -> Dict[str, Any]:
-        response = f"{answer.strip()}\n\n"
-        if source_docs and len(source_docs) > 0:
-            response += "=" * 35 + "\n"
-            response += "📚 *REFERENSI:*\n"
-            response += "=" * 35 + "\n"
-            seen_sources = set()
-            displayed_docs = 0
-            for doc in source_docs:
-                if displayed_docs >= 3:
-                    break
-                metadata = doc.metadata
-                source_name = metadata.get("source", "Dokumen")
-                if source_name in seen_sources:
-                    continue
-                seen_sources.add(source_name)
-                displayed_docs += 1
-                response += f"{displayed_docs}. {source_name}"
-                details = []
-                if metadata.get("page") and str(metadata.get("page")) != "?": details.append(f"Hal. {metadata.get('page')}")
-                if metadata.get("pasal") and str(metadata.get("pasal")) != "-": details.append(f"Pasal {metadata.get('pasal')}")
-                if metadata.get('rerank_score') is not None: details.append(f"Score: {metadata['rerank_score']:.3f}")
-                if details: response += f" | {' | '.join(details)}"
-                response += "\n"
-        else:
-            response += "ℹ Tidak ada sumber spesifik ditemukan untuk pertanyaan ini."
-        return {"response": response, "source_documents": source_docs}
-
-    @staticmethod
-    def format_out_of_context_response() -> Dict[str, Any]:
-        response = "Maaf, saya tidak menemukan jawaban sesuai dengan sumber dokumen."
-        return {"response": response, "source_documents": []}
-
-# ============================================================================
-# 3. KONFIGURASI APLIKASI FASTAPI
-# ============================================================================
-app = FastAPI(
-    title="Dynamic Legal RAG System API",
-    description="Sistem RAG canggih dengan Hybrid Search, Re-ranking, dan respons percakapan dinamis.",
-    version="4.3.0-logging"
-)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-@app.middleware("http")
-async def add_process_time_header(request, call_next):
-    """
-    Middleware untuk mengukur waktu total pemrosesan setiap request.
-    """
-    start_time = time.perf_counter()
-    response = await call_next(request)
-    process_time = time.perf_counter() - start_time
-
-    # Menambahkan waktu proses ke header respons, bisa dilihat di browser dev tools
-    response.headers["X-Process-Time"] = f"{process_time:.4f}" 
-
-    # Mencetak log waktu ke konsol server agar mudah dilihat saat development
-    print(f"🚀 Total Waktu Respons untuk {request.url.path}: {process_time:.4f} detik")
-
-    return response
-
-# ============================================================================
-# 4. KELAS KONFIGURASI UTAMA
-# ============================================================================
-class Config:
-    GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-    COHERE_API_KEY = os.getenv("COHERE_API_KEY")
-    WEAVIATE_URL = os.getenv("WEAVIATE_URL")
-    WEAVIATE_API_KEY = os.getenv("WEAVIATE_API_KEY")
-    WEAVIATE_CLASS_NAME = os.getenv("WEAVIATE_CLASS_NAME")
-    COHERE_EMBEDDING_MODEL = "embed-multilingual-v3.0"
-    GROQ_MODEL = "llama-3.3-70b-versatile"
-    CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
-    MAX_TOKENS = 4096
-    TEMPERATURE = 0.1
-    SEARCH_LIMIT = 5
-    ALPHA = 0.5
-    RERANK_TOP_K = 2
-config = Config()
-if not all([config.GROQ_API_KEY, config.COHERE_API_KEY, config.WEAVIATE_URL, config.WEAVIATE_API_KEY, config.WEAVIATE_CLASS_NAME]):
-    raise ValueError("Pastikan semua variabel environment telah diatur dalam file .env")
-
-# ============================================================================
-# 5. KONEKSI & INISIALISASI MODEL
-# ============================================================================
-print("🚀 Memulai Inisialisasi Sistem...")
-try:
-    print("🔗 Menghubungkan ke Weaviate Cloud...")
-    client = weaviate.connect_to_weaviate_cloud(cluster_url=config.WEAVIATE_URL, auth_credentials=Auth.api_key(config.WEAVIATE_API_KEY))
-    if not client.is_ready(): raise ConnectionError("Koneksi Weaviate gagal.")
-    weaviate_collection = client.collections.get(config.WEAVIATE_CLASS_NAME)
-    print(f"✅ Terhubung ke Weaviate. Koleksi '{config.WEAVIATE_CLASS_NAME}' siap.")
-except Exception as e:
-    print(f"❌ Gagal terhubung ke Weaviate: {e}"); raise
-print("🤖 Menginisialisasi model AI...")
-embeddings = CohereEmbeddings(cohere_api_key=config.COHERE_API_KEY, model=config.COHERE_EMBEDDING_MODEL)
-llm = ChatGroq(model_name=config.GROQ_MODEL, temperature=config.TEMPERATURE, max_tokens=config.MAX_TOKENS)
-cross_encoder = CrossEncoder(config.CROSS_ENCODER_MODEL)
-print("✅ Semua model berhasil dimuat.")
-
-# ============================================================================
-# 6. PROMPT TEMPLATES & FUNGSI PEMROSESAN
-# ============================================================================
-conversational_prompt_template = """Anda adalah asisten AI Penjaminan mutu yang ramah dan profesional.
-Tugas Anda adalah merespons sapaan atau percakapan santai dari pengguna.
-Jawab dengan singkat, sopan, dan dalam bahasa Indonesia. Jangan menjawab pertanyaan substantif tentang hukum.
-Pesan Pengguna: "{user_message}"
-Respons Anda:"""
-conversational_prompt = PromptTemplate(template=conversational_prompt_template, input_variables=["user_message"])
-
-rag_with_memory_and_cot_template = """Anda adalah asisten AI Penjaminan Mutu yang sangat cerdas.
-Tugas Anda adalah menjawab pertanyaan pengguna secara akurat berdasarkan riwayat percakapan sebelumnya dan konteks dokumen yang baru diberikan.
-
-RIWAYAT PERCAKAPAN SEBELUMNYA:
-{chat_history}
-
-KONTEKS DOKUMEN YANG RELEVAN DENGAN PERTANYAAN TERAKHIR:
-{context}
-
-PERTANYAAN TERAKHIR DARI PENGGUNA: {question}
-
-INSTRUKSI UNTUK ANDA:
-1.  **Analisis**: Pahami pertanyaan terakhir pengguna dalam konteks riwayat percakapan.
-2.  **Penalaran (Chain-of-Thought)**: Secara internal, pikirkan langkah-langkah untuk menjawab. Pertama, rangkum informasi relevan dari riwayat dan konteks dokumen. Kedua, susun jawaban yang koheren dan logis.
-3.  **Jawaban**: Jawab pertanyaan pengguna HANYA berdasarkan informasi dari RIWAYAT dan KONTEKS. Jika informasi tidak cukup, katakan dengan jujur. Jawaban harus dalam bahasa Indonesia, jelas, dan ringkas.
-    
-    **PENTING: Aturan Pemformatan Jawaban**
-    - **Identifikasi Daftar**: Jika Anda menemukan daftar dalam KONTEKS (seperti daftar visi, misi, atau poin-poin), **WAJIB** format ulang menjadi daftar Markdown.
-    - **Gunakan Tanda Hubung**: Untuk daftar poin, gunakan tanda hubung (`- `) di awal setiap item. Contoh: `- Poin pertama.`
-    - **Gunakan Angka**: Untuk daftar bernomor, gunakan angka (`1. `, `2. `).
-    - **Gunakan Penekanan**: Gunakan `**teks tebal**` untuk judul atau istilah penting.
-
-4.  **Format Output**: Berikan output dalam format berikut (PENTING!):
-    *PEMIKIRAN:* [Tulis proses berpikir Anda di sini. Contoh: "Konteks berisi daftar misi. Saya akan memformatnya ulang menggunakan tanda hubung."]
-    *JAWABAN:* [Tulis jawaban akhir yang akan dibaca pengguna di sini, dalam format Markdown.]
-
-OUTPUT ANDA:"""
-rag_with_memory_and_cot_prompt = PromptTemplate(
-    template=rag_with_memory_and_cot_template,
-    input_variables=["chat_history", "context", "question"]
-)
-
-def generate_conversational_response(user_message: str) -> str:
-    print("💬 Menghasilkan respons percakapan dengan LLM...")
-    formatted_prompt = conversational_prompt.format(user_message=user_message)
-    response = llm.invoke(formatted_prompt)
-    return response.content.strip()
-
-def hybrid_search_weaviate(query: str) -> List[Document]:
-    try:
-        query_embedding = embeddings.embed_query(query)
-        response = weaviate_collection.query.hybrid(query=query, vector=query_embedding, alpha=config.ALPHA, limit=config.SEARCH_LIMIT, return_metadata=MetadataQuery(score=True))
-        return [Document(page_content=obj.properties.get('content', ''), metadata={**obj.properties, 'hybrid_score': obj.metadata.score if obj.metadata else 0, 'weaviate_id': str(obj.uuid)}) for obj in response.objects]
-    except Exception as e:
-        print(f"Error dalam hybrid search: {e}"); return []
-
-def rerank_documents(query: str, documents: List[Document]) -> List[Document]:
-    if not documents: return []
-    scores = cross_encoder.predict([[query, doc.page_content] for doc in documents])
-    for doc, score in zip(documents, scores): doc.metadata['rerank_score'] = float(score)
-    return sorted(documents, key=lambda x: x.metadata['rerank_score'], reverse=True)
-
-def detect_query_pattern(message: str) -> ResponsePattern:
-    message_lower = message.lower().strip()
-    if re.search(r'^(hai|hello|hi|halo|selamat\s+(pagi|siang|sore|malam)|apa\s+kabar)', message_lower): return ResponsePattern.GREETING
-    if re.search(r'terima\s+kasih|thank\s+you|makasih', message_lower): return ResponsePattern.GRATITUDE
-    if re.search(r'sampai\s+jumpa|goodbye|bye', message_lower): return ResponsePattern.FAREWELL
-    if re.search(r"pasal\s+(\d+)|ps\s*\.?\s*(\d+)|pasal\s+ke[\s-]*(\d+)", message_lower): return ResponsePattern.PASAL_QUERY
-    if len(message_lower.split()) <= 3 and len(message_lower) <= 20: return ResponsePattern.SMALL_TALK
-    return ResponsePattern.DOCUMENT_QUERY
-
-def search_pasal_specific(pasal_number: str) -> Dict[str, Any]:
-    try:
-        query_embedding = embeddings.embed_query(f"Isi lengkap dari pasal {pasal_number}")
-        response = weaviate_collection.query.near_vector(near_vector=query_embedding, limit=5, filters=Filter.by_property("pasal").equal(pasal_number))
-        matched_docs = [Document(page_content=obj.properties.get('content', ''), metadata=obj.properties) for obj in response.objects]
-        if matched_docs:
-            full_content = "\n\n".join([doc.page_content.strip() for doc in matched_docs if doc.page_content.strip()])
-            return ResponseFormatter.format_pasal_response(pasal_number, full_content, matched_docs)
-        return ResponseFormatter.format_pasal_response(pasal_number, "", [])
-    except Exception as e:
-        print(f"Error dalam pencarian pasal spesifik: {e}"); return ResponseFormatter.format_out_of_context_response()
-
-# ============================================================================
-# 7. FUNGSI PROSESOR & EVALUASI
-# ============================================================================
-def process_query_for_evaluation(user_message: str) -> Dict[str, Any]:
-    """
-    Fungsi ini menjalankan alur RAG utama dan mengembalikan output mentah
-    yang dibutuhkan oleh RAGAS untuk evaluasi. TIDAK MENGGUNAKAN HISTORI.
-    """
-    try:
-        print(f"🔬 [EVAL] Memproses: '{user_message}'")
-        
-        initial_docs = hybrid_search_weaviate(user_message)
-        if not initial_docs:
-            return {"question": user_message, "answer": "Tidak ada dokumen yang ditemukan.", "contexts": []}
-        
-        reranked_docs = rerank_documents(user_message, initial_docs)
-        final_docs = reranked_docs[:config.RERANK_TOP_K]
-        
-        contexts_list = [doc.page_content for doc in final_docs]
-        context_string = "\n\n---\n\n".join(contexts_list)
-
-        formatted_prompt = rag_with_memory_and_cot_prompt.format(
-            chat_history="Tidak ada riwayat percakapan.",
-            context=context_string,
-            question=user_message
-        )
-        
-        llm_output = llm.invoke(formatted_prompt).content
-        
-        answer_match = re.search(r"\*JAWABAN:\*([\s\S]*)", llm_output, re.IGNORECASE)
-        if answer_match:
-            answer = answer_match.group(1).strip()
-        else:
-            answer = llm_output.strip().removeprefix("*PEMIKIRAN:*").strip()
-
-        return {
-            "question": user_message,
-            "answer": answer,
-            "contexts": contexts_list
-        }
-
-    except Exception as e:
-        print(f"❌ ERROR dalam proses evaluasi RAG: {traceback.format_exc()}"); 
-        return {"question": user_message, "answer": "Terjadi error saat pemrosesan.", "contexts": []}
-
-def process_query(user_message: str, user_id: Optional[str] = None, chat_id: Optional[str] = None) -> tuple[str, List[Any]]:
-    pattern = detect_query_pattern(user_message)
-    conversational_patterns: Set[ResponsePattern] = {
-        ResponsePattern.GREETING, ResponsePattern.GRATITUDE, ResponsePattern.FAREWELL, ResponsePattern.SMALL_TALK
-    }
-
-    if pattern in conversational_patterns:
-        return generate_conversational_response(user_message), []
-
-    elif pattern == ResponsePattern.PASAL_QUERY:
-        match = re.search(r"(\d+)", user_message)
-        if match:
-            result = search_pasal_specific(match.group(1))
-            return result["response"], result["source_documents"]
-
-    try:
-        print(f"🔄 Memproses DOCUMENT_QUERY: '{user_message}' dengan konteks histori")
-        
-        initial_docs = hybrid_search_weaviate(user_message)
-        if not initial_docs:
-            return ResponseFormatter.format_out_of_context_response()["response"], []
-        
-        reranked_docs = rerank_documents(user_message, initial_docs)
-        final_docs = reranked_docs[:config.RERANK_TOP_K]
-        context = "\n\n---\n\n".join([doc.page_content for doc in final_docs])
-
-        chat_history = "Tidak ada riwayat percakapan."
-        if user_id and chat_id:
-            try:
-                history_messages = ChatHistoryService.get_recent_messages(user_id, chat_id, limit=4)
-                if history_messages:
-                    formatted_history = []
-                    for msg in history_messages:
-                        role = "Pengguna" if msg.get('role') == 'user' else 'Asisten'
-                        formatted_history.append(f"{role}: {msg.get('content', '')}")
-                    chat_history = "\n".join(formatted_history)
-                    print(f"📚 Konteks histori ditemukan untuk chat_id: {chat_id}")
-            except Exception as e:
-                print(f"⚠️ Gagal mengambil riwayat obrolan: {e}")
-
-        formatted_prompt = rag_with_memory_and_cot_prompt.format(
-            chat_history=chat_history,
-            context=context,
-            question=user_message
-        )
-        
-        llm_output = llm.invoke(formatted_prompt).content
-        
-        answer_match = re.search(r"\*JAWABAN:\*([\s\S]*)", llm_output, re.IGNORECASE)
-        if answer_match:
-            answer = answer_match.group(1).strip()
-        else:
-            print("⚠️ Peringatan: LLM tidak mengikuti format PEMIKIRAN/JAWABAN. Menggunakan output penuh.")
-            answer = llm_output.strip().removeprefix("*PEMIKIRAN:*").strip()
-
-        if any(phrase in answer.lower() for phrase in ["tidak ada dalam konteks", "tidak tersedia dalam dokumen", "maaf, informasi"]):
-            return ResponseFormatter.format_out_of_context_response()["response"], []
-
-        # ====================================================================
-        # ✨✨✨ BLOK LOGGING UNTUK EVALUASI MANUAL (DIPERBARUI) ✨✨✨
-        # ====================================================================
-        print("\n\n" + "="*60)
-        print("✨ LOG UNTUK EVALUASI MANUAL (SALIN KE EXCEL) ✨")
-        print(f"Waktu: {dt.datetime.now()}")
-        print("-"*60)
-        
-        # 1. Cetak Pertanyaan
-        print(f"PERTANYAAN (untuk kolom 'question'):\n{user_message}\n")
-        
-        # 2. Cetak Jawaban yang Dihasilkan Mesin
-        print(f"JAWABAN (untuk kolom 'answer'):\n{answer}\n")
-        
-        # 3. Cetak Konteks dalam format JSON yang rapi
-        print("KONTEKS (Salin semua di bawah ini ke dalam satu sel Excel untuk kolom 'contexts'):")
-        contexts_list_for_ragas = [doc.page_content for doc in final_docs] if final_docs else []
-        
-        # Format sebagai string JSON yang rapi dan mudah dibaca/disalin
-        json_contexts = json.dumps(contexts_list_for_ragas, ensure_ascii=False, indent=2)
-        print(json_contexts)
-        print("="*60 + "\n\n")
-        # ====================================================================
-        # ✨✨✨ AKHIR BLOK LOGGING ✨✨✨
-        # ====================================================================
-
-        result = ResponseFormatter.format_document_response(answer, final_docs)
-        return result["response"], result["source_documents"]
-
-    except Exception as e:
-        print(f"❌ ERROR dalam proses RAG: {traceback.format_exc()}"); 
-        return "❌ *SISTEM ERROR*\n\nTerjadi kesalahan internal. Silakan coba lagi.", []
-
-# ============================================================================
-# 8. MODEL DATA & ENDPOINTS API
-# ============================================================================
-class ChatRequest(BaseModel):
-    user_message: str
-    user_id: Optional[str] = None
-    chat_id: Optional[str] = None
-
-class ContinueChatRequest(BaseModel):
-    user_id: str
-    chat_id: str
-    user_message: str
-
-class UpdateTitleRequest(BaseModel):
-    user_id: str
-    new_title: str
-
-class UserAuthRequest(BaseModel):
-    user_id: str
-
-@app.post("/ask", tags=["Chat"])
-async def chat(request: ChatRequest):
-    if not request.user_message.strip(): raise HTTPException(status_code=400, detail="Pesan tidak boleh kosong.")
-    answer, source_docs = process_query(request.user_message.strip(), request.user_id, request.chat_id)
-    chat_id = request.chat_id
-    if request.user_id:
-        try:
-            if not chat_id: chat_id = ChatHistoryService.create_chat_session(request.user_id, request.user_message)
-            if chat_id:
-                ChatHistoryService.save_message(request.user_id, chat_id, request.user_message, "user")
-                source_metadata = [{"source": doc.metadata.get("source"), "page": doc.metadata.get("page"), "pasal": doc.metadata.get("pasal")} for doc in source_docs[:5]]
-                ChatHistoryService.save_message(request.user_id, chat_id, answer, "assistant", {"sources": source_metadata})
-                print(f"✅ Riwayat obrolan disimpan untuk chat_id: {chat_id}")
-        except Exception as e:
-            print(f"⚠ Gagal menyimpan riwayat obrolan: {e}")
-    return {"response": answer, "chat_id": chat_id}
-
-@app.get("/api/chat/history/{user_id}", tags=["Chat History"])
-async def get_user_chat_history(user_id: str):
-    try:
-        history = ChatHistoryService.get_chat_history(user_id)
-        return history
-    except Exception as e:
-        print(f"Error getting chat history: {e}"); raise HTTPException(status_code=500, detail="Gagal mengambil riwayat obrolan")
-
-@app.get("/api/chat/{chat_id}/messages", tags=["Chat History"])
-async def get_chat_messages(chat_id: str, user_id: str):
-    try:
-        messages = ChatHistoryService.get_chat_messages(user_id, chat_id)
-        return {"messages": messages}
-    except Exception as e:
-        print(f"Error getting chat messages: {e}"); raise HTTPException(status_code=500, detail="Gagal mengambil pesan obrolan")
-
-@app.post("/api/chat/continue", tags=["Chat History"])
-async def continue_chat(request: ContinueChatRequest):
-    if not request.user_message.strip(): raise HTTPException(status_code=400, detail="Pesan tidak boleh kosong.")
-    answer, source_docs = process_query(request.user_message.strip(), request.user_id, request.chat_id)
-    try:
-        ChatHistoryService.save_message(request.user_id, request.chat_id, request.user_message, "user")
-        source_metadata = [{"source": doc.metadata.get("source"), "page": doc.metadata.get("page"), "pasal": doc.metadata.get("pasal")} for doc in source_docs[:5]]
-        ChatHistoryService.save_message(request.user_id, request.chat_id, answer, "assistant", {"sources": source_metadata})
-    except Exception as e:
-        print(f"Error continuing chat: {e}"); raise HTTPException(status_code=500, detail="Gagal melanjutkan obrolan")
-    return {"response": answer}
-
-@app.delete("/api/chat/{chat_id}", tags=["Chat History"])
-async def delete_chat(chat_id: str, request: UserAuthRequest):
-    try:
-        success = ChatHistoryService.delete_chat(request.user_id, chat_id)
-        if success: return {"message": "Obrolan berhasil dihapus"}
-        else: raise HTTPException(status_code=404, detail="Gagal menghapus obrolan.")
-    except Exception as e:
-        print(f"Error deleting chat: {e}"); raise HTTPException(status_code=500, detail="Terjadi kesalahan saat menghapus obrolan")
-
-@app.put("/api/chat/{chat_id}/title", tags=["Chat History"])
-async def update_chat_title(chat_id: str, request: UpdateTitleRequest):
-    if not request.new_title.strip(): raise HTTPException(status_code=400, detail="Judul baru tidak boleh kosong.")
-    try:
-        success = ChatHistoryService.update_chat_title(request.user_id, chat_id, request.new_title.strip())
-        if success: return {"message": "Judul obrolan berhasil diperbarui"}
-        else: raise HTTPException(status_code=404, detail="Gagal memperbarui judul.")
-    except Exception as e:
-        print(f"Error updating chat title: {e}"); raise HTTPException(status_code=500, detail="Terjadi kesalahan saat memperbarui judul")
-
-@app.get("/", tags=["Status"])
-async def root():
-    return {"message": "Dynamic Legal RAG System API is running.", "version": "4.2.0-memory", "documentation": "/docs"}
-
-@app.get("/health", tags=["Status"])
-async def health_check():
-    return {
-        "status": "healthy",
-        "weaviate_connection": client.is_ready(),
-        "firestore_connection": ChatHistoryService.db is not None,
-        "timestamp": dt.datetime.now(dt.timezone.utc).isoformat()
-    }
-
-@app.get("/patterns", tags=["Status"])
-async def get_response_patterns():
-    return {pattern.name: pattern.value for pattern in ResponsePattern}
-
-# ============================================================================
-# 9. EKSEKUSI APLIKASI
-# ============================================================================
-if __name__ == "__main__":
-    import uvicorn
-    print("🎉 Sistem Siap! Menjalankan server Uvicorn di http://0.0.0.0:8000")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+import os
+import re
+import json
+import asyncio
+import functools
+import hashlib
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Set, Callable
+from enum import Enum
+import time
+import logging
+import datetime as dt
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, HTTPException, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from dotenv import load_dotenv
+from langchain_groq import ChatGroq
+from langchain_core.prompts import PromptTemplate
+from langchain.schema import Document
+from langchain_cohere import CohereEmbeddings
+
+import weaviate
+from weaviate.classes.init import Auth
+
+# Asumsikan Anda memiliki file ini untuk manajemen riwayat obrolan.
+try:
+    from chat_history_service import ChatHistoryService
+except ModuleNotFoundError:
+    # Mode offline (benchmark, evaluasi stub) dapat berjalan tanpa Firestore
+    if os.getenv("RAG_OFFLINE_MODE", "false").lower() != "true": raise
+    from local_stubs import InMemoryChatHistory as ChatHistoryService
+from batch_evaluation import load_questions, run_batch
+from context_builder import ContextBuilder, compress_history, estimate_tokens
+from conversation_cache import ConversationWindowCache, paginate
+from conversational_responder import ConversationalResponder
+from lifecycle import Readiness, run_startup
+from embedding_service import EmbeddingService, EmbeddingStore
+from llm_client import Backend, CircuitBreaker, LLMUnavailableError, Priority, PriorityScheduler, RateLimiter, ResilientEmbeddings, ResilientLLM
+import observability
+from observability import StructuredLogSink
+from pasal_index import PasalIndex, extract_pasal_numbers
+from persistence_queue import ChatWriteBehindQueue
+from prefetch_cache import PrefetchCache
+from pipeline import StageTimings, run_stage
+from reranker_service import RerankerService, load_cross_encoder
+from retriever import LocalRetriever, Retriever, WeaviateRetriever
+from semantic_cache import SemanticCache, InMemoryCacheBackend, DiskCacheBackend, CacheEntry
+
+# Muat environment variables dari file .env
+load_dotenv()
+
+# ============================================================================
+# 1. SISTEM POLA RESPONS
+# ============================================================================
+class ResponsePattern(Enum):
+    """Enum untuk mendefinisikan pola-pola respons yang tersedia."""
+    GREETING = "greeting"
+    PASAL_QUERY = "pasal_query"
+    DOCUMENT_QUERY = "document_query"
+    OUT_OF_CONTEXT = "out_of_context"
+    GRATITUDE = "gratitude"
+    FAREWELL = "farewell"
+    SMALL_TALK = "small_talk"
+
+# ============================================================================
+# 2. FORMATTER RESPONS
+# ============================================================================
+class ResponseFormatter:
+    """Class untuk memformat respons RAG yang terstruktur."""
+    @staticmethod
+    def format_pasal_response(pasal_number: str, content: str, source_docs: List[Any]) -> Dict[str, Any]:
+        if source_docs and content:
+            response = f"📖 *PASAL {pasal_number}*\n\n{content}\n\n"
+            response += "=" * 35 + "\n"
+            response += "📚 *SUMBER PASAL:*\n"
+            response += "=" * 35 + "\n"
+            for i, doc in enumerate(source_docs[:2], 1):
+                metadata = doc.metadata
+                source_name = metadata.get("source", "Dokumen Hukum")
+                response += f"{i}. {source_name}"
+                if metadata.get("page") and str(metadata.get("page")) != "?":
+                    response += f" | Hal. {metadata.get('page')}"
+                response += "\n"
+        else:
+            response = f"❌ *PASAL {pasal_number} TIDAK DITEMUKAN*\n\nMaaf, Pasal {pasal_number} tidak ditemukan dalam dokumen yang tersedia."
+        return {"response": response, "source_documents": source_docs}
+
+    @staticmethod
+    def format_document_response(answer: str, source_docs: List[Any]) -> Dict[str, Any]:
+        response = f"{answer.strip()}\n\n"
+        if source_docs and len(source_docs) > 0:
+            response += "=" * 35 + "\n"
+            response += "📚 *REFERENSI:*\n"
+            response += "=" * 35 + "\n"
+            seen_sources = set()
+            displayed_docs = 0
+            for doc in source_docs:
+                if displayed_docs >= 3:
+                    break
+                metadata = doc.metadata
+                source_name = metadata.get("source", "Dokumen")
+                if source_name in seen_sources:
+                    continue
+                seen_sources.add(source_name)
+                displayed_docs += 1
+                response += f"{displayed_docs}. {source_name}"
+                details = []
+                if metadata.get("page") and str(metadata.get("page")) != "?": details.append(f"Hal. {metadata.get('page')}")
+                if metadata.get("pasal") and str(metadata.get("pasal")) != "-": details.append(f"Pasal {metadata.get('pasal')}")
+                if metadata.get('rerank_score') is not None: details.append(f"Score: {metadata['rerank_score']:.3f}")
+                if details: response += f" | {' | '.join(details)}"
+                response += "\n"
+        else:
+            response += "ℹ Tidak ada sumber spesifik ditemukan untuk pertanyaan ini."
+        return {"response": response, "source_documents": source_docs}
+
+    @staticmethod
+    def format_out_of_context_response() -> Dict[str, Any]:
+        response = "Maaf, saya tidak menemukan jawaban sesuai dengan sumber dokumen."
+        return {"response": response, "source_documents": []}
+
+# ============================================================================
+# 3. KONFIGURASI APLIKASI FASTAPI
+# ============================================================================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup dan shutdown aplikasi; start_application/stop_application ada di bagian 9."""
+    await start_application()
+    yield
+    await stop_application()
+
+app = FastAPI(
+    title="Dynamic Legal RAG System API",
+    description="Sistem RAG canggih dengan Hybrid Search, Re-ranking, dan respons percakapan dinamis.",
+    version="4.3.0-logging",
+    lifespan=lifespan
+)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Process-Time", "X-Stage-Timings"],
+)
+@app.middleware("http")
+async def add_process_time_header(request, call_next):
+    """
+    Middleware untuk mengukur waktu total pemrosesan setiap request.
+    """
+    start_time = time.perf_counter()
+    response = await call_next(request)
+    process_time = time.perf_counter() - start_time
+
+    # Menambahkan waktu proses ke header respons, bisa dilihat di browser dev tools
+    response.headers["X-Process-Time"] = f"{process_time:.4f}" 
+
+    # Dicatat ke histogram /metrics; label path memakai template route agar kardinalitas tetap kecil
+    route = request.scope.get("route")
+    observability.REQUEST_DURATION.observe(process_time, method=request.method, path=getattr(route, "path", "unmatched"), status=response.status_code)
+
+    return response
+
+# ============================================================================
+# 4. KELAS KONFIGURASI UTAMA
+# ============================================================================
+class Config:
+    GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+    COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+    WEAVIATE_URL = os.getenv("WEAVIATE_URL")
+    WEAVIATE_API_KEY = os.getenv("WEAVIATE_API_KEY")
+    WEAVIATE_CLASS_NAME = os.getenv("WEAVIATE_CLASS_NAME")
+    COHERE_EMBEDDING_MODEL = "embed-multilingual-v3.0"
+    GROQ_MODEL = "llama-3.3-70b-versatile"
+    CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    MAX_TOKENS = 4096
+    TEMPERATURE = 0.1
+    SEARCH_LIMIT = 5
+    ALPHA = 0.5
+    RERANK_TOP_K = 2
+    # Batas konkurensi pipeline async (per worker uvicorn)
+    MAX_CONCURRENT_QUERIES = int(os.getenv("MAX_CONCURRENT_QUERIES", "32"))
+    IO_MAX_WORKERS = int(os.getenv("IO_MAX_WORKERS", "32"))
+    # Micro-batching reranker (backend: "torch" atau "onnx")
+    RERANK_BACKEND = os.getenv("RERANK_BACKEND", "torch")
+    RERANK_ONNX_FILE = os.getenv("RERANK_ONNX_FILE") or None
+    RERANK_MAX_BATCH_SIZE = int(os.getenv("RERANK_MAX_BATCH_SIZE", "64"))
+    RERANK_MAX_WAIT_MS = float(os.getenv("RERANK_MAX_WAIT_MS", "5"))
+    RERANK_SCORE_CACHE_SIZE = int(os.getenv("RERANK_SCORE_CACHE_SIZE", "10000"))
+    # Cache jawaban semantik (backend: "memory" atau "disk")
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_BACKEND = os.getenv("SEMANTIC_CACHE_BACKEND", "memory")
+    SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "semantic_cache.sqlite3")
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+    # Memoization & micro-batching embedding query
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+    EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "")
+    EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "10"))
+    EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "96"))
+    # Indeks pasal in-memory
+    PASAL_MAX_CHUNKS = int(os.getenv("PASAL_MAX_CHUNKS", "5"))
+    PASAL_INDEX_REFRESH_SECONDS = float(os.getenv("PASAL_INDEX_REFRESH_SECONDS", "600"))
+    # Batas waktu per tahap pipeline (detik)
+    RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_TIMEOUT_SECONDS", "10"))
+    RERANK_TIMEOUT_SECONDS = float(os.getenv("RERANK_TIMEOUT_SECONDS", "3"))
+    HISTORY_TIMEOUT_SECONDS = float(os.getenv("HISTORY_TIMEOUT_SECONDS", "1.5"))
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    # Jawaban template lokal untuk sapaan/terima kasih/perpisahan; LLM hanya untuk small talk ambigu
+    CONVERSATIONAL_TEMPLATES_ENABLED = os.getenv("CONVERSATIONAL_TEMPLATES_ENABLED", "true").lower() == "true"
+    # Write-behind riwayat obrolan: jendela penggabungan, ukuran batch, dan retry
+    PERSISTENCE_FLUSH_INTERVAL_MS = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL_MS", "50"))
+    PERSISTENCE_MAX_BATCH_SIZE = int(os.getenv("PERSISTENCE_MAX_BATCH_SIZE", "200"))
+    PERSISTENCE_MAX_RETRIES = int(os.getenv("PERSISTENCE_MAX_RETRIES", "5"))
+    # Cache jendela percakapan in-process (pesan terakhir per chat, LRU antar chat)
+    CONVERSATION_WINDOW_SIZE = int(os.getenv("CONVERSATION_WINDOW_SIZE", "8"))
+    CONVERSATION_CACHE_MAX_CHATS = int(os.getenv("CONVERSATION_CACHE_MAX_CHATS", "10000"))
+    CONVERSATION_CACHE_MAX_MB = float(os.getenv("CONVERSATION_CACHE_MAX_MB", "64"))
+    CHAT_LIST_TTL_SECONDS = float(os.getenv("CHAT_LIST_TTL_SECONDS", "30"))
+    # Umur jendela sejak terakhir dibaca dari Firestore atau ditulis worker ini. Multi-worker: pesan
+    # yang disimpan worker lain untuk chat yang sama baru terlihat setelah jendela menganggur selama TTL.
+    # Turunkan bila permintaan satu chat sering tersebar ke beberapa worker.
+    CONVERSATION_WINDOW_TTL_SECONDS = float(os.getenv("CONVERSATION_WINDOW_TTL_SECONDS", "300"))
+    # Penyusunan prompt: "cot" (PEMIKIRAN + JAWABAN) atau "direct" (langsung JAWABAN, lebih sedikit token output)
+    PROMPT_MODE = os.getenv("PROMPT_MODE", "cot")
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+    CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+    HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "300"))
+    HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "6"))
+    HISTORY_RECENT_MESSAGES = int(os.getenv("HISTORY_RECENT_MESSAGES", "2"))
+    # Evaluasi batch lewat API: input_path/output_path relatif terhadap direktori ini dan tidak boleh keluar darinya
+    EVAL_DIR = os.getenv("EVAL_DIR", "evaluation")
+    # Log terstruktur: record evaluasi (question/answer/contexts) dan trace per request, keduanya di-sampling.
+    # Path kosong menonaktifkan sink; file dirotasi setelah LOG_MAX_MB (LOG_BACKUP_COUNT file lama disimpan)
+    EVAL_LOG_PATH = os.getenv("EVAL_LOG_PATH", "evaluation_log.jsonl")
+    EVAL_LOG_SAMPLE_RATE = float(os.getenv("EVAL_LOG_SAMPLE_RATE", "0.05"))
+    TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "")
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+    LOG_MAX_MB = float(os.getenv("LOG_MAX_MB", "50"))
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    # Klien LLM/embedding: rate limit per backend (0 = tanpa batas, isi sesuai tier akun),
+    # model cadangan (kosong = tanpa cadangan, mis. "llama-3.1-8b-instant"), circuit breaker, dan antrean
+    # prioritas (interaktif > batch). Cadangan hanya dipakai saat model utama gagal atau circuit-nya terbuka;
+    # LLM_HEDGE_AFTER_SECONDS > 0 juga mengirim panggilan interaktif yang lambat ke cadangan (biaya ganda)
+    LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "")
+    LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))
+    LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+    LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+    LLM_FALLBACK_REQUESTS_PER_MINUTE = float(os.getenv("LLM_FALLBACK_REQUESTS_PER_MINUTE", "0"))
+    LLM_FALLBACK_TOKENS_PER_MINUTE = float(os.getenv("LLM_FALLBACK_TOKENS_PER_MINUTE", "0"))
+    LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "512"))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "256"))
+    # Retry di backend yang sama untuk 429/5xx/error jaringan setelah cadangan habis; Retry-After yang lebih
+    # lama dari LLM_MAX_RETRY_WAIT_SECONDS langsung dilaporkan sebagai sibuk
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_MAX_RETRY_WAIT_SECONDS = float(os.getenv("LLM_MAX_RETRY_WAIT_SECONDS", "10"))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+    EMBEDDING_REQUESTS_PER_MINUTE = float(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "0"))
+    # Prefetch retrieval spekulatif selagi pengguna mengetik (per sesi, TTL singkat)
+    PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+    PREFETCH_TTL_SECONDS = float(os.getenv("PREFETCH_TTL_SECONDS", "30"))
+    PREFETCH_SIMILARITY_THRESHOLD = float(os.getenv("PREFETCH_SIMILARITY_THRESHOLD", "0.9"))
+    PREFETCH_MIN_CHARS = int(os.getenv("PREFETCH_MIN_CHARS", "12"))
+    PREFETCH_MAX_SESSIONS = int(os.getenv("PREFETCH_MAX_SESSIONS", "10000"))
+    # Batas prefetch yang berjalan bersamaan per worker (di luar query_semaphore milik /ask)
+    PREFETCH_MAX_IN_FLIGHT = int(os.getenv("PREFETCH_MAX_IN_FLIGHT", "4"))
+    # Backend retrieval: "weaviate" (Weaviate Cloud) atau "local" (snapshot in-process, lihat retriever.py)
+    RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "weaviate")
+    LOCAL_SNAPSHOT_PATH = os.getenv("LOCAL_SNAPSHOT_PATH", "weaviate_snapshot")
+    # Siklus hidup worker: RERANK_PRELOAD memuat CrossEncoder saat import (proses master gunicorn
+    # dengan preload_app, lihat gunicorn.conf.py) sehingga dibagi copy-on-write ke semua worker
+    RERANK_PRELOAD = os.getenv("RERANK_PRELOAD", "false").lower() == "true"
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_QUERY = os.getenv("WARMUP_QUERY", "Apa saja standar penjaminan mutu internal?")
+    WARMUP_LLM = os.getenv("WARMUP_LLM", "false").lower() == "true"
+    # Lama request pipeline menunggu worker siap sebelum dijawab 503
+    STARTUP_WAIT_SECONDS = float(os.getenv("STARTUP_WAIT_SECONDS", "10"))
+    # Mode offline: tidak ada koneksi ke layanan cloud; komponen dipasang lewat install_components()
+    OFFLINE_MODE = os.getenv("RAG_OFFLINE_MODE", "false").lower() == "true"
+    # Level log saat dijalankan langsung (python Rag_weaviate.py); di bawah gunicorn/uvicorn konfigurasi
+    # log milik server yang berlaku. Tanpa konfigurasi, peringatan/error tetap tampil di stderr.
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+config = Config()
+logger = logging.getLogger(__name__)
+required_settings = [config.GROQ_API_KEY, config.COHERE_API_KEY]
+if config.RETRIEVER_BACKEND != "local": required_settings += [config.WEAVIATE_URL, config.WEAVIATE_API_KEY, config.WEAVIATE_CLASS_NAME]
+if not config.OFFLINE_MODE and not all(required_settings):
+    raise ValueError("Pastikan semua variabel environment telah diatur dalam file .env")
+
+# ============================================================================
+# 5. KONEKSI & INISIALISASI MODEL
+# ============================================================================
+def build_circuit_breaker() -> CircuitBreaker:
+    return CircuitBreaker(config.CIRCUIT_FAILURE_THRESHOLD, config.CIRCUIT_RESET_SECONDS)
+
+def build_embedding_service(embeddings_client, persistent: bool = True) -> EmbeddingService:
+    """`persistent=False` melewati EmbeddingStore SQLite (koneksi SQLite tidak boleh diwariskan lewat fork)."""
+    resilient_embeddings = ResilientEmbeddings(embeddings_client, "cohere:" + config.COHERE_EMBEDDING_MODEL,
+                                               RateLimiter(config.EMBEDDING_REQUESTS_PER_MINUTE), build_circuit_breaker())
+    return EmbeddingService(
+        resilient_embeddings,
+        max_cache_entries=config.EMBEDDING_CACHE_SIZE,
+        store=EmbeddingStore(config.EMBEDDING_STORE_PATH, config.COHERE_EMBEDDING_MODEL) if config.EMBEDDING_STORE_PATH and persistent else None,
+        batch_window_ms=config.EMBEDDING_BATCH_WINDOW_MS,
+        max_batch_size=config.EMBEDDING_MAX_BATCH_SIZE
+    )
+
+def build_llm_service(primary_model, fallback_model=None) -> ResilientLLM:
+    backends = [Backend("groq:" + config.GROQ_MODEL, primary_model, RateLimiter(config.LLM_REQUESTS_PER_MINUTE, config.LLM_TOKENS_PER_MINUTE), build_circuit_breaker())]
+    if fallback_model is not None:
+        backends.append(Backend("groq:" + config.LLM_FALLBACK_MODEL, fallback_model,
+                                RateLimiter(config.LLM_FALLBACK_REQUESTS_PER_MINUTE, config.LLM_FALLBACK_TOKENS_PER_MINUTE), build_circuit_breaker()))
+    return ResilientLLM(backends, PriorityScheduler("llm", config.LLM_MAX_CONCURRENCY, config.LLM_MAX_QUEUE),
+                        config.LLM_HEDGE_AFTER_SECONDS or None, config.LLM_EXPECTED_OUTPUT_TOKENS,
+                        max_retries=config.LLM_MAX_RETRIES, max_retry_wait=config.LLM_MAX_RETRY_WAIT_SECONDS)
+
+def build_reranker_service(reranker_model) -> RerankerService:
+    return RerankerService(reranker_model, config.RERANK_MAX_BATCH_SIZE, config.RERANK_MAX_WAIT_MS, config.RERANK_SCORE_CACHE_SIZE)
+
+def build_semantic_cache() -> Optional[SemanticCache]:
+    if not config.SEMANTIC_CACHE_ENABLED: return None
+    cache_backend = DiskCacheBackend(config.SEMANTIC_CACHE_PATH) if config.SEMANTIC_CACHE_BACKEND == "disk" else InMemoryCacheBackend()
+    print(f"✅ Cache semantik aktif (backend: {config.SEMANTIC_CACHE_BACKEND}).")
+    return SemanticCache(cache_backend, config.SEMANTIC_CACHE_THRESHOLD, config.SEMANTIC_CACHE_TTL_SECONDS, config.SEMANTIC_CACHE_MAX_ENTRIES)
+
+client = weaviate_collection = retriever = embeddings = llm = fallback_llm = cross_encoder = None
+if config.OFFLINE_MODE:
+    print("🧪 Mode offline: koneksi cloud dilewati, komponen menunggu install_components().")
+elif config.RERANK_PRELOAD:
+    print("📦 Memuat CrossEncoder sebelum worker di-fork...")
+    cross_encoder = load_cross_encoder(config.CROSS_ENCODER_MODEL, config.RERANK_BACKEND, config.RERANK_ONNX_FILE)
+
+def initialize_components() -> None:
+    """
+    Membuka koneksi dan memuat model; sinkron, dijalankan di thread oleh lifespan setiap worker.
+    Klien jaringan (gRPC Weaviate, HTTP Cohere/Groq) dibuat setelah fork karena tidak aman dibagi antar
+    proses. CrossEncoder yang sudah dimuat sebelum fork (RERANK_PRELOAD) dipakai ulang.
+    """
+    global client, weaviate_collection, retriever, embeddings, llm, fallback_llm, cross_encoder, embedding_service, llm_service, reranker_service, semantic_cache
+    print("🚀 Memulai Inisialisasi Sistem...")
+    if config.RETRIEVER_BACKEND == "local":
+        print(f"📦 Memuat snapshot retriever lokal dari '{config.LOCAL_SNAPSHOT_PATH}'...")
+        retriever = LocalRetriever.load(config.LOCAL_SNAPSHOT_PATH)
+    else:
+        try:
+            print("🔗 Menghubungkan ke Weaviate Cloud...")
+            client = weaviate.connect_to_weaviate_cloud(cluster_url=config.WEAVIATE_URL, auth_credentials=Auth.api_key(config.WEAVIATE_API_KEY))
+            if not client.is_ready(): raise ConnectionError("Koneksi Weaviate gagal.")
+            weaviate_collection = client.collections.get(config.WEAVIATE_CLASS_NAME)
+            print(f"✅ Terhubung ke Weaviate. Koleksi '{config.WEAVIATE_CLASS_NAME}' siap.")
+        except Exception as e:
+            print(f"❌ Gagal terhubung ke Weaviate: {e}"); raise
+        retriever = WeaviateRetriever(weaviate_collection)
+    print("🤖 Menginisialisasi model AI...")
+    embeddings = CohereEmbeddings(cohere_api_key=config.COHERE_API_KEY, model=config.COHERE_EMBEDDING_MODEL)
+    llm = ChatGroq(model_name=config.GROQ_MODEL, temperature=config.TEMPERATURE, max_tokens=config.MAX_TOKENS)
+    fallback_llm = ChatGroq(model_name=config.LLM_FALLBACK_MODEL, temperature=config.TEMPERATURE, max_tokens=config.MAX_TOKENS) if config.LLM_FALLBACK_MODEL else None
+    if cross_encoder is None:
+        cross_encoder = load_cross_encoder(config.CROSS_ENCODER_MODEL, config.RERANK_BACKEND, config.RERANK_ONNX_FILE)
+    embedding_service = build_embedding_service(embeddings)
+    llm_service = build_llm_service(llm, fallback_llm)
+    reranker_service = build_reranker_service(cross_encoder)
+    semantic_cache = build_semantic_cache()
+    print("✅ Semua model berhasil dimuat.")
+
+# Di luar mode offline layanan ini hanya placeholder sampai initialize_components() berjalan di worker
+embedding_service = build_embedding_service(embeddings, persistent=config.OFFLINE_MODE)
+llm_service = build_llm_service(llm, fallback_llm)
+reranker_service = build_reranker_service(cross_encoder)
+readiness = Readiness()
+
+def install_components(llm_client=None, embeddings_client=None, collection=None, reranker_model=None, chat_history_service=None, retriever_backend: Optional[Retriever] = None) -> None:
+    """
+    Mengganti komponen eksternal, mis. dengan klien perekam/pemutar ulang atau stub
+    lokal untuk evaluasi dan benchmark offline. Komponen yang tidak diberikan tetap.
+    `collection` dibungkus WeaviateRetriever; `retriever_backend` memasang Retriever apa pun secara langsung.
+    """
+    global llm, llm_service, embeddings, embedding_service, weaviate_collection, retriever, cross_encoder, reranker_service, ChatHistoryService
+    if llm_client is not None:
+        llm = llm_client
+        llm_service = build_llm_service(llm_client)
+    if embeddings_client is not None:
+        embeddings = embeddings_client
+        embedding_service = build_embedding_service(embeddings_client)
+    if collection is not None:
+        weaviate_collection = collection
+        retriever = WeaviateRetriever(collection)
+    if retriever_backend is not None: retriever = retriever_backend
+    if reranker_model is not None:
+        cross_encoder = reranker_model
+        reranker_service = build_reranker_service(reranker_model)
+    if chat_history_service is not None: ChatHistoryService = chat_history_service
+
+# Executor terbatas untuk panggilan I/O sinkron (Weaviate, Firestore); reranker
+# CrossEncoder berjalan di thread worker milik RerankerService. Event loop tidak pernah diblokir.
+io_executor = ThreadPoolExecutor(max_workers=config.IO_MAX_WORKERS, thread_name_prefix="rag-io")
+query_semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_QUERIES)
+
+# Dibuat per worker di initialize_components (koneksi SQLite backend disk tidak boleh dibuka sebelum fork);
+# mode offline tidak memakai lifespan sehingga cache dibuat saat import
+semantic_cache: Optional[SemanticCache] = build_semantic_cache() if config.OFFLINE_MODE else None
+
+evaluation_log = StructuredLogSink("evaluation", config.EVAL_LOG_PATH or None, config.EVAL_LOG_SAMPLE_RATE,
+                                   max_bytes=int(config.LOG_MAX_MB * 1024 * 1024), backup_count=config.LOG_BACKUP_COUNT)
+trace_log = StructuredLogSink("trace", config.TRACE_LOG_PATH or None, config.TRACE_SAMPLE_RATE,
+                              max_bytes=int(config.LOG_MAX_MB * 1024 * 1024), backup_count=config.LOG_BACKUP_COUNT)
+
+async def run_blocking(func: Callable, *args, executor: Optional[ThreadPoolExecutor] = None, **kwargs) -> Any:
+    """Menjalankan fungsi sinkron di executor tanpa memblokir event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor or io_executor, functools.partial(func, *args, **kwargs))
+
+conversation_cache = ConversationWindowCache(
+    window_size=config.CONVERSATION_WINDOW_SIZE,
+    max_chats=config.CONVERSATION_CACHE_MAX_CHATS,
+    max_bytes=int(config.CONVERSATION_CACHE_MAX_MB * 1024 * 1024),
+    chat_list_ttl=config.CHAT_LIST_TTL_SECONDS,
+    window_ttl=config.CONVERSATION_WINDOW_TTL_SECONDS
+)
+
+# ChatHistoryService dibaca saat flush agar penggantian lewat install_components() ikut terpakai
+chat_writer = ChatWriteBehindQueue(
+    lambda: ChatHistoryService, run_blocking,
+    flush_interval_ms=config.PERSISTENCE_FLUSH_INTERVAL_MS,
+    max_batch_size=config.PERSISTENCE_MAX_BATCH_SIZE,
+    max_retries=config.PERSISTENCE_MAX_RETRIES
+)
+
+prefetch_cache = PrefetchCache(config.PREFETCH_TTL_SECONDS, config.PREFETCH_SIMILARITY_THRESHOLD, config.PREFETCH_MAX_SESSIONS,
+                               config.PREFETCH_MAX_IN_FLIGHT)
+
+# ============================================================================
+# 6. PROMPT TEMPLATES & FUNGSI PEMROSESAN
+# ============================================================================
+conversational_prompt_template = """Anda adalah asisten AI Penjaminan mutu yang ramah dan profesional.
+Tugas Anda adalah merespons sapaan atau percakapan santai dari pengguna.
+Jawab dengan singkat, sopan, dan dalam bahasa Indonesia. Jangan menjawab pertanyaan substantif tentang hukum.
+Pesan Pengguna: "{user_message}"
+Respons Anda:"""
+conversational_prompt = PromptTemplate(template=conversational_prompt_template, input_variables=["user_message"])
+
+rag_with_memory_and_cot_template = """Anda adalah asisten AI Penjaminan Mutu yang sangat cerdas.
+Tugas Anda adalah menjawab pertanyaan pengguna secara akurat berdasarkan riwayat percakapan sebelumnya dan konteks dokumen yang baru diberikan.
+
+RIWAYAT PERCAKAPAN SEBELUMNYA:
+{chat_history}
+
+KONTEKS DOKUMEN YANG RELEVAN DENGAN PERTANYAAN TERAKHIR:
+{context}
+
+PERTANYAAN TERAKHIR DARI PENGGUNA: {question}
+
+INSTRUKSI UNTUK ANDA:
+1.  **Analisis**: Pahami pertanyaan terakhir pengguna dalam konteks riwayat percakapan.
+2.  **Penalaran (Chain-of-Thought)**: Secara internal, pikirkan langkah-langkah untuk menjawab. Pertama, rangkum informasi relevan dari riwayat dan konteks dokumen. Kedua, susun jawaban yang koheren dan logis.
+3.  **Jawaban**: Jawab pertanyaan pengguna HANYA berdasarkan informasi dari RIWAYAT dan KONTEKS. Jika informasi tidak cukup, katakan dengan jujur. Jawaban harus dalam bahasa Indonesia, jelas, dan ringkas.
+    
+    **PENTING: Aturan Pemformatan Jawaban**
+    - **Identifikasi Daftar**: Jika Anda menemukan daftar dalam KONTEKS (seperti daftar visi, misi, atau poin-poin), **WAJIB** format ulang menjadi daftar Markdown.
+    - **Gunakan Tanda Hubung**: Untuk daftar poin, gunakan tanda hubung (`- `) di awal setiap item. Contoh: `- Poin pertama.`
+    - **Gunakan Angka**: Untuk daftar bernomor, gunakan angka (`1. `, `2. `).
+    - **Gunakan Penekanan**: Gunakan `**teks tebal**` untuk judul atau istilah penting.
+
+4.  **Format Output**: Berikan output dalam format berikut (PENTING!):
+    *PEMIKIRAN:* [Tulis proses berpikir Anda di sini. Contoh: "Konteks berisi daftar misi. Saya akan memformatnya ulang menggunakan tanda hubung."]
+    *JAWABAN:* [Tulis jawaban akhir yang akan dibaca pengguna di sini, dalam format Markdown.]
+
+OUTPUT ANDA:"""
+rag_with_memory_and_cot_prompt = PromptTemplate(
+    template=rag_with_memory_and_cot_template,
+    input_variables=["chat_history", "context", "question"]
+)
+
+# Mode "direct": tanpa bagian PEMIKIRAN yang selalu dibuang; penanda *JAWABAN:* dipertahankan
+# agar extract_answer() dan AnswerStreamFilter bekerja sama untuk kedua mode.
+rag_with_memory_direct_template = """Anda adalah asisten AI Penjaminan Mutu. Jawab pertanyaan terakhir pengguna HANYA berdasarkan RIWAYAT dan KONTEKS di bawah. Jika informasi tidak cukup, katakan dengan jujur.
+
+RIWAYAT PERCAKAPAN:
+{chat_history}
+
+KONTEKS DOKUMEN:
+{context}
+
+PERTANYAAN TERAKHIR: {question}
+
+Aturan: bahasa Indonesia, jelas dan ringkas; format daftar dari KONTEKS sebagai daftar Markdown (`- ` atau `1. `); gunakan **teks tebal** untuk istilah penting. Jangan tuliskan proses berpikir. Mulai output dengan *JAWABAN:* lalu langsung jawaban akhir.
+
+OUTPUT ANDA:"""
+rag_with_memory_direct_prompt = PromptTemplate(
+    template=rag_with_memory_direct_template,
+    input_variables=["chat_history", "context", "question"]
+)
+rag_prompts = {"cot": rag_with_memory_and_cot_prompt, "direct": rag_with_memory_direct_prompt}
+
+async def score_sentences(query: str, sentences: List[str], sentence_ids: List[Optional[str]]) -> List[float]:
+    # reranker_service dibaca saat dipanggil agar penggantian lewat install_components() ikut terpakai
+    return await reranker_service.score(query, sentences, sentence_ids)
+
+context_builder = ContextBuilder(config.CONTEXT_TOKEN_BUDGET, score_sentences, config.CONTEXT_DEDUP_THRESHOLD)
+
+async def build_document_prompt(user_message: str, final_docs: List[Document], chat_history: str, timings: Optional[StageTimings] = None) -> tuple[str, List[str]]:
+    """Menyusun prompt RAG dari passage yang sudah dideduplikasi dan dipangkas sesuai anggaran token."""
+    passages, context_stats = await context_builder.build(user_message, final_docs)
+    formatted_prompt = rag_prompts.get(config.PROMPT_MODE, rag_with_memory_and_cot_prompt).format(
+        chat_history=chat_history,
+        context="\n\n---\n\n".join(passages),
+        question=user_message
+    )
+    if timings is not None:
+        timings.add_attribute("context.tokens_before", context_stats["tokens_before"])
+        timings.add_attribute("context.tokens_after", context_stats["tokens_after"])
+        timings.add_attribute("context.chunks_deduplicated", context_stats["chunks_deduplicated"])
+        timings.add_attribute("prompt.tokens", estimate_tokens(formatted_prompt))
+    return formatted_prompt, passages
+
+conversational_responder = ConversationalResponder()
+
+async def generate_conversational_response(user_message: str, timings: Optional[StageTimings] = None) -> str:
+    if config.CONVERSATIONAL_TEMPLATES_ENABLED:
+        templated_response = conversational_responder.respond(user_message)
+        if templated_response is not None:
+            return templated_response
+    formatted_prompt = conversational_prompt.format(user_message=user_message)
+    response = await run_stage("llm", llm_service.ainvoke(formatted_prompt), timings, timeout=config.LLM_TIMEOUT_SECONDS)
+    record_token_usage(timings, response)
+    return response.content.strip()
+
+async def hybrid_search(query: str, query_embedding: Optional[List[float]] = None) -> List[Document]:
+    try:
+        if query_embedding is None: query_embedding = await embedding_service.aembed_query(query)
+        return await run_blocking(retriever.hybrid, query, query_embedding, config.ALPHA, config.SEARCH_LIMIT)
+    except Exception as e:
+        logger.error(f"Error dalam hybrid search: {e}"); return []
+
+async def rerank_documents(query: str, documents: List[Document]) -> List[Document]:
+    if not documents: return []
+    scores = await reranker_service.score(query, [doc.page_content for doc in documents], [doc.metadata.get('weaviate_id') for doc in documents])
+    for doc, score in zip(documents, scores): doc.metadata['rerank_score'] = float(score)
+    return sorted(documents, key=lambda x: x.metadata['rerank_score'], reverse=True)
+
+def detect_query_pattern(message: str) -> ResponsePattern:
+    return ResponsePattern(conversational_responder.classifier.classify(message))
+
+pasal_index = PasalIndex(max_chunks_per_pasal=config.PASAL_MAX_CHUNKS)
+
+collection_version: Optional[str] = None
+
+def load_pasal_index() -> int:
+    """
+    Membaca seluruh objek koleksi (tanpa vektor), membangun ulang indeks pasal, dan
+    memperbarui versi koleksi: sidik jari ID + isi + metadata semua objek, sehingga
+    koreksi isi yang tidak mengubah jumlah objek tetap terdeteksi.
+    """
+    global collection_version
+    object_digests: List[bytes] = []
+
+    def fingerprinted(documents):
+        for doc in documents:
+            metadata = doc.metadata
+            object_digests.append(hashlib.sha1(f"{metadata.get('weaviate_id')}|{metadata.get('source')}|{metadata.get('page')}|{metadata.get('pasal')}|{doc.page_content}".encode("utf-8")).digest())
+            yield doc
+
+    pasal_count = pasal_index.rebuild(fingerprinted(retriever.iter_documents()))
+    collection_version = hashlib.sha1(b"".join(sorted(object_digests))).hexdigest()[:16]
+    return pasal_count
+
+async def refresh_pasal_index_forever() -> None:
+    while True:
+        try:
+            pasal_count = await run_blocking(load_pasal_index)
+            print(f"✅ Indeks pasal diperbarui: {pasal_count} pasal.")
+        except Exception as e:
+            print(f"⚠️ Gagal membangun indeks pasal: {e}")
+        await asyncio.sleep(config.PASAL_INDEX_REFRESH_SECONDS)
+
+async def fetch_pasal_documents(pasal_number: str, source: Optional[str] = None) -> List[Document]:
+    """Indeks in-memory lebih dulu; jika meleset, fetch berfilter ke retriever (tanpa vektor)."""
+    matched_docs = pasal_index.lookup(pasal_number, source)
+    if matched_docs is not None:
+        return matched_docs
+    properties = {"pasal": pasal_number}
+    if source: properties["source"] = source
+    return await run_blocking(retriever.fetch_by_properties, properties, config.PASAL_MAX_CHUNKS)
+
+async def search_pasal_specific(pasal_number: str, source: Optional[str] = None) -> Dict[str, Any]:
+    try:
+        matched_docs = await fetch_pasal_documents(pasal_number, source)
+        if matched_docs:
+            full_content = "\n\n".join([doc.page_content.strip() for doc in matched_docs if doc.page_content.strip()])
+            return ResponseFormatter.format_pasal_response(pasal_number, full_content, matched_docs)
+        return ResponseFormatter.format_pasal_response(pasal_number, "", [])
+    except Exception as e:
+        logger.error(f"Error dalam pencarian pasal spesifik: {e}"); return ResponseFormatter.format_out_of_context_response()
+
+async def search_pasal_numbers(pasal_numbers: List[str]) -> tuple[str, List[Any]]:
+    """Menjawab satu atau beberapa pasal sekaligus dalam satu respons."""
+    results = await asyncio.gather(*[search_pasal_specific(number) for number in pasal_numbers])
+    response = "\n\n".join(result["response"].strip() for result in results)
+    source_docs = [doc for result in results for doc in result["source_documents"]]
+    return response, source_docs
+
+# ============================================================================
+# 7. FUNGSI PROSESOR & EVALUASI
+# ============================================================================
+async def run_evaluation_query(user_message: str, timings: Optional[StageTimings] = None) -> Dict[str, Any]:
+    """
+    Alur RAG untuk evaluasi tanpa histori dan tanpa cache. Error diteruskan ke
+    pemanggil agar runner batch dapat melakukan retry.
+    """
+    final_docs = await run_stage("retrieval", retrieve_documents(user_message, timings=timings), timings)
+    if not final_docs:
+        return {"question": user_message, "answer": "Tidak ada dokumen yang ditemukan.", "contexts": []}
+
+    # Konteks yang dilaporkan adalah passage yang benar-benar dilihat LLM (setelah dedup dan pemangkasan)
+    formatted_prompt, contexts_list = await build_document_prompt(user_message, final_docs, NO_CHAT_HISTORY, timings)
+    llm_response = await run_stage("llm", llm_service.ainvoke(formatted_prompt, priority=Priority.BATCH), timings, timeout=config.LLM_TIMEOUT_SECONDS)
+    record_token_usage(timings, llm_response)
+    return {"question": user_message, "answer": extract_answer(llm_response.content), "contexts": contexts_list}
+
+async def process_query_for_evaluation(user_message: str) -> Dict[str, Any]:
+    """
+    Fungsi ini menjalankan alur RAG utama dan mengembalikan output mentah
+    yang dibutuhkan oleh RAGAS untuk evaluasi. TIDAK MENGGUNAKAN HISTORI.
+    """
+    try:
+        logger.info(f"🔬 [EVAL] Memproses: '{user_message}'")
+        return await run_evaluation_query(user_message)
+    except Exception as e:
+        logger.exception("❌ ERROR dalam proses evaluasi RAG"); 
+        return {"question": user_message, "answer": "Terjadi error saat pemrosesan.", "contexts": []}
+
+async def process_query(user_message: str, user_id: Optional[str] = None, chat_id: Optional[str] = None, timings: Optional[StageTimings] = None, session_id: Optional[str] = None) -> tuple[str, List[Any]]:
+    """
+    Titik masuk pipeline RAG async. Jumlah pertanyaan yang diproses bersamaan
+    dibatasi oleh MAX_CONCURRENT_QUERIES per worker.
+    """
+    async with query_semaphore:
+        return await _process_query(user_message, user_id, chat_id, timings, session_id)
+
+SYSTEM_ERROR_RESPONSE = "❌ *SISTEM ERROR*\n\nTerjadi kesalahan internal. Silakan coba lagi."
+SERVICE_BUSY_RESPONSE = "⏳ *LAYANAN SIBUK*\n\nLayanan AI sedang menerima terlalu banyak permintaan. Silakan coba lagi dalam beberapa saat."
+CONVERSATIONAL_PATTERNS: Set[ResponsePattern] = {
+    ResponsePattern.GREETING, ResponsePattern.GRATITUDE, ResponsePattern.FAREWELL, ResponsePattern.SMALL_TALK
+}
+
+NO_CHAT_HISTORY = "Tidak ada riwayat percakapan."
+
+async def get_recent_chat_messages(user_id: str, chat_id: str, limit: int) -> List[Dict[str, Any]]:
+    """Pesan terakhir dari cache jendela percakapan; Firestore hanya dibaca saat cold miss."""
+    cached_messages = conversation_cache.get_recent(user_id, chat_id, limit)
+    if cached_messages is not None:
+        return cached_messages
+    window_size = max(limit, config.CONVERSATION_WINDOW_SIZE)
+    messages = await run_blocking(ChatHistoryService.get_recent_messages, user_id, chat_id, limit=window_size)
+    messages = chat_writer.merge_recent(chat_id, messages or [])
+    conversation_cache.fill(user_id, chat_id, messages, total=len(messages) if len(messages) < window_size else None)
+    return messages[-limit:]
+
+async def fetch_chat_history(user_id: Optional[str], chat_id: Optional[str], timings: Optional[StageTimings] = None) -> str:
+    """Pesan terakhir disertakan utuh, pesan yang lebih lama diringkas dalam HISTORY_TOKEN_BUDGET."""
+    chat_history = NO_CHAT_HISTORY
+    if user_id and chat_id:
+        try:
+            history_messages = await get_recent_chat_messages(user_id, chat_id, config.HISTORY_MAX_MESSAGES)
+            if history_messages:
+                chat_history, history_stats = compress_history(history_messages, config.HISTORY_TOKEN_BUDGET, config.HISTORY_RECENT_MESSAGES)
+                if timings is not None:
+                    timings.add_attribute("history.tokens_before", history_stats["tokens_before"])
+                    timings.add_attribute("history.tokens_after", history_stats["tokens_after"])
+        except Exception as e:
+            logger.warning(f"⚠️ Gagal mengambil riwayat obrolan: {e}")
+    return chat_history
+
+async def lookup_semantic_cache(user_message: str, chat_id: Optional[str], timings: Optional[StageTimings] = None) -> tuple[Optional[List[float]], Optional[CacheEntry]]:
+    """
+    Menghitung embedding query sekali lalu mencari jawaban serupa di cache.
+    Follow-up dalam sesi yang sudah ada (chat_id terisi) bergantung pada histori,
+    sehingga selalu melewati cache.
+    """
+    if semantic_cache is None or chat_id:
+        return None, None
+    query_embedding = await run_stage("embed", embedding_service.aembed_query(user_message), timings)
+    # Backend disk melakukan I/O SQLite (clear/delete), jadi dijalankan di executor
+    await run_blocking(semantic_cache.ensure_collection_version, collection_version)
+    cached = await run_blocking(semantic_cache.lookup, query_embedding)
+    if cached and timings is not None:
+        timings.add_attribute("cache.hit", True)
+    return query_embedding, cached
+
+async def store_semantic_cache(user_message: str, query_embedding: Optional[List[float]], response: str, source_docs: List[Any]) -> None:
+    # Hanya jawaban yang didukung dokumen yang disimpan (bukan out-of-context / error)
+    if semantic_cache is None or query_embedding is None or not source_docs:
+        return
+    await run_blocking(semantic_cache.store, user_message, query_embedding, response, source_docs)
+
+async def retrieve_documents(user_message: str, query_embedding: Optional[List[float]] = None, timings: Optional[StageTimings] = None, session_id: Optional[str] = None) -> List[Document]:
+    """
+    Hybrid search lalu rerank. Jika reranker lambat/gagal, urutan hybrid search dipakai apa adanya.
+    Hasil prefetch sesi (lihat /prefetch) dipakai langsung bila query-nya cocok.
+    """
+    if prefetch_cache.has_pending(session_id):
+        prefetched_docs = await run_stage("prefetch_wait", prefetch_cache.take(session_id, user_message, query_embedding, embedding_service.aembed_query), timings)
+        if prefetched_docs:
+            if timings is not None: timings.add_attribute("prefetch.hit", True)
+            return prefetched_docs
+    initial_docs = await run_stage("hybrid_search", hybrid_search(user_message, query_embedding), timings)
+    if not initial_docs:
+        return []
+    reranked_docs = await run_stage("rerank", rerank_documents(user_message, initial_docs), timings,
+                                    timeout=config.RERANK_TIMEOUT_SECONDS, default=initial_docs)
+    return reranked_docs[:config.RERANK_TOP_K]
+
+async def prepare_document_prompt(user_message: str, user_id: Optional[str] = None, chat_id: Optional[str] = None, query_embedding: Optional[List[float]] = None, timings: Optional[StageTimings] = None, session_id: Optional[str] = None) -> Optional[tuple[str, List[Document]]]:
+    """
+    Menjalankan retrieval (+ reranking) dan pengambilan histori secara paralel, lalu
+    menyusun prompt RAG. Histori bersifat opsional: jika Firestore lambat, prompt
+    disusun tanpa histori. Mengembalikan None jika tidak ada dokumen yang ditemukan.
+    """
+    final_docs, chat_history = await asyncio.gather(
+        run_stage("retrieval", retrieve_documents(user_message, query_embedding, timings, session_id), timings, timeout=config.RETRIEVAL_TIMEOUT_SECONDS),
+        run_stage("history", fetch_chat_history(user_id, chat_id, timings), timings, timeout=config.HISTORY_TIMEOUT_SECONDS, default=NO_CHAT_HISTORY)
+    )
+    if not final_docs:
+        return None
+
+    formatted_prompt, _ = await build_document_prompt(user_message, final_docs, chat_history, timings)
+    return formatted_prompt, final_docs
+
+def extract_answer(llm_output: str) -> str:
+    answer_match = re.search(r"\*JAWABAN:\*([\s\S]*)", llm_output, re.IGNORECASE)
+    if answer_match:
+        return answer_match.group(1).strip()
+    logger.warning("⚠️ Peringatan: LLM tidak mengikuti format PEMIKIRAN/JAWABAN. Menggunakan output penuh.")
+    return llm_output.strip().removeprefix("*PEMIKIRAN:*").strip()
+
+def record_token_usage(timings: Optional[StageTimings], llm_response) -> None:
+    """Menyalin usage_metadata langchain (token input/output) ke atribut span request."""
+    usage = getattr(llm_response, "usage_metadata", None)
+    if timings is None or not usage:
+        return
+    timings.add_attribute("llm.input_tokens", usage.get("input_tokens", 0))
+    timings.add_attribute("llm.output_tokens", usage.get("output_tokens", 0))
+
+def record_request_telemetry(timings: StageTimings, name: str) -> None:
+    """Mengisi histogram per tahap/pola dan mengirim trace (ter-sampling) ke sink."""
+    observability.observe_timings(timings)
+    if trace_log.enabled: trace_log.emit(observability.timings_to_spans(timings, name))
+
+def finalize_document_answer(user_message: str, answer: str, final_docs: List[Document]) -> tuple[str, List[Any]]:
+    if any(phrase in answer.lower() for phrase in ["tidak ada dalam konteks", "tidak tersedia dalam dokumen", "maaf, informasi"]):
+        return ResponseFormatter.format_out_of_context_response()["response"], []
+
+    # Record evaluasi manual (kolom RAGAS question/answer/contexts) dikirim ke sink
+    # JSONL di thread latar belakang, bukan dicetak ke konsol pada jalur request
+    evaluation_log.emit({
+        "type": "evaluation",
+        "question": user_message,
+        "answer": answer,
+        "contexts": [doc.page_content for doc in final_docs] if final_docs else [],
+    })
+
+    result = ResponseFormatter.format_document_response(answer, final_docs)
+    return result["response"], result["source_documents"]
+
+async def _process_query(user_message: str, user_id: Optional[str] = None, chat_id: Optional[str] = None, timings: Optional[StageTimings] = None, session_id: Optional[str] = None) -> tuple[str, List[Any]]:
+    pattern = detect_query_pattern(user_message)
+    if timings is not None:
+        timings.pattern = pattern.value
+
+    if pattern in CONVERSATIONAL_PATTERNS:
+        return await generate_conversational_response(user_message, timings), []
+
+    elif pattern == ResponsePattern.PASAL_QUERY:
+        pasal_numbers = extract_pasal_numbers(user_message)
+        if not pasal_numbers:
+            match = re.search(r"(\d+)", user_message)
+            pasal_numbers = [match.group(1)] if match else []
+        if pasal_numbers:
+            return await search_pasal_numbers(pasal_numbers)
+
+    try:
+        query_embedding, cached = await lookup_semantic_cache(user_message, chat_id, timings)
+        if cached:
+            return cached.response, cached.source_documents()
+
+        prepared = await prepare_document_prompt(user_message, user_id, chat_id, query_embedding, timings, session_id)
+        if prepared is None:
+            return ResponseFormatter.format_out_of_context_response()["response"], []
+        formatted_prompt, final_docs = prepared
+
+        llm_response = await run_stage("llm", llm_service.ainvoke(formatted_prompt), timings, timeout=config.LLM_TIMEOUT_SECONDS)
+        record_token_usage(timings, llm_response)
+        answer = extract_answer(llm_response.content)
+        response_text, source_docs = finalize_document_answer(user_message, answer, final_docs)
+        await store_semantic_cache(user_message, query_embedding, response_text, source_docs)
+        return response_text, source_docs
+
+    except LLMUnavailableError as e:
+        logger.warning(f"⚠️ LLM tidak tersedia: {e}")
+        return SERVICE_BUSY_RESPONSE, []
+    except Exception as e:
+        logger.exception("❌ ERROR dalam proses RAG"); 
+        return SYSTEM_ERROR_RESPONSE, []
+
+# ============================================================================
+# 8. STREAMING JAWABAN (SERVER-SENT EVENTS)
+# ============================================================================
+class AnswerStreamFilter:
+    """
+    Menahan bagian *PEMIKIRAN:* di server dan hanya meneruskan token setelah
+    penanda *JAWABAN:*. Penanda bisa terpecah di beberapa token, jadi teks
+    ditampung sampai penanda ditemukan.
+    """
+    ANSWER_MARKER = re.compile(r"\*JAWABAN:\*", re.IGNORECASE)
+
+    def __init__(self):
+        self._buffer = ""
+        self._answer_started = False
+        self._pending_lstrip = True
+
+    def feed(self, chunk: str) -> str:
+        if not self._answer_started:
+            self._buffer += chunk
+            match = self.ANSWER_MARKER.search(self._buffer)
+            if not match:
+                return ""
+            self._answer_started = True
+            chunk = self._buffer[match.end():]
+            self._buffer = ""
+        if self._pending_lstrip:
+            chunk = chunk.lstrip()
+            self._pending_lstrip = not chunk
+        return chunk
+
+    def flush(self) -> str:
+        """Jika LLM tidak memakai format PEMIKIRAN/JAWABAN, kirim seluruh output yang tertahan."""
+        if self._answer_started:
+            return ""
+        held, self._buffer = self._buffer, ""
+        return held.strip().removeprefix("*PEMIKIRAN:*").strip()
+
+def format_sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def stream_query_events(user_message: str, user_id: Optional[str] = None, chat_id: Optional[str] = None, session_id: Optional[str] = None):
+    """
+    Generator SSE: event `token` berisi potongan JAWABAN, lalu satu event `done`
+    berisi respons final (dengan blok REFERENSI), chat_id, dan durasi per tahap.
+    """
+    timings = StageTimings()
+    async with query_semaphore:
+        try:
+            timings.pattern = detect_query_pattern(user_message).value
+            if timings.pattern != ResponsePattern.DOCUMENT_QUERY.value:
+                response_text, source_docs = await _process_query(user_message, user_id, chat_id, timings, session_id)
+                yield format_sse_event("token", {"text": response_text})
+            else:
+                query_embedding, cached = await lookup_semantic_cache(user_message, chat_id, timings)
+                prepared = None
+                if not cached:
+                    prepared = await prepare_document_prompt(user_message, user_id, chat_id, query_embedding, timings, session_id)
+
+                if cached:
+                    response_text, source_docs = cached.response, cached.source_documents()
+                    yield format_sse_event("token", {"text": response_text})
+                elif prepared is None:
+                    response_text, source_docs = ResponseFormatter.format_out_of_context_response()["response"], []
+                    yield format_sse_event("token", {"text": response_text})
+                else:
+                    formatted_prompt, final_docs = prepared
+                    stream_filter = AnswerStreamFilter()
+                    raw_chunks: List[str] = []
+                    llm_started = time.perf_counter()
+                    async for chunk in llm_service.astream(formatted_prompt):
+                        if not raw_chunks: timings.record("llm_first_token", time.perf_counter() - llm_started, llm_started)
+                        raw_chunks.append(chunk.content)
+                        record_token_usage(timings, chunk)
+                        visible_text = stream_filter.feed(chunk.content)
+                        if visible_text:
+                            yield format_sse_event("token", {"text": visible_text})
+                    timings.record("llm", time.perf_counter() - llm_started, llm_started)
+                    held_text = stream_filter.flush()
+                    if held_text:
+                        yield format_sse_event("token", {"text": held_text})
+                    answer = extract_answer("".join(raw_chunks))
+                    response_text, source_docs = finalize_document_answer(user_message, answer, final_docs)
+                    await store_semantic_cache(user_message, query_embedding, response_text, source_docs)
+        except LLMUnavailableError as e:
+            logger.warning(f"⚠️ LLM tidak tersedia: {e}")
+            yield format_sse_event("error", {"response": SERVICE_BUSY_RESPONSE, "chat_id": chat_id})
+            return
+        except Exception as e:
+            logger.exception("❌ ERROR dalam streaming RAG")
+            yield format_sse_event("error", {"response": SYSTEM_ERROR_RESPONSE, "chat_id": chat_id})
+            return
+
+    chat_id = await run_stage("persistence", save_chat_turn(user_id, chat_id, user_message, response_text, source_docs), timings)
+    _, _, references = response_text.partition("📚 *REFERENSI:*")
+    record_request_telemetry(timings, "POST /ask/stream")
+    yield format_sse_event("done", {"response": response_text, "references": references.strip("=\n "), "chat_id": chat_id, "timings_ms": {stage: round(seconds * 1000, 1) for stage, seconds in timings.stages.items()}})
+
+async def save_chat_turn(user_id: Optional[str], chat_id: Optional[str], user_message: str, answer: str, source_docs: List[Any]) -> Optional[str]:
+    """
+    Membuat sesi baru jika chat_id kosong (inline, karena chat_id harus dikembalikan
+    ke klien), lalu mengantrekan pesan pengguna dan jawaban asisten ke write-behind.
+    """
+    if not user_id:
+        return chat_id
+    try:
+        new_chat = not chat_id
+        if new_chat: chat_id = await run_blocking(ChatHistoryService.create_chat_session, user_id, user_message)
+        if chat_id:
+            source_metadata = [{"source": doc.metadata.get("source"), "page": doc.metadata.get("page"), "pasal": doc.metadata.get("pasal")} for doc in source_docs[:5]]
+            saved_at = dt.datetime.now(dt.timezone.utc).isoformat()
+            messages = [
+                {"content": user_message, "role": "user", "timestamp": saved_at},
+                {"content": answer, "role": "assistant", "metadata": {"sources": source_metadata}, "timestamp": saved_at},
+            ]
+            chat_writer.enqueue_turn(user_id, chat_id, messages)
+            conversation_cache.append(user_id, chat_id, messages, new_chat=new_chat)
+            conversation_cache.invalidate_chat_list(user_id)
+    except Exception as e:
+        logger.error(f"⚠ Gagal menyimpan riwayat obrolan: {e}")
+    return chat_id
+
+# ============================================================================
+# 9. MODEL DATA & ENDPOINTS API
+# ============================================================================
+class ChatRequest(BaseModel):
+    user_message: str
+    user_id: Optional[str] = None
+    chat_id: Optional[str] = None
+    session_id: Optional[str] = None
+
+class PrefetchRequest(BaseModel):
+    user_message: str
+    session_id: str
+
+class ContinueChatRequest(BaseModel):
+    user_id: str
+    chat_id: str
+    user_message: str
+
+class UpdateTitleRequest(BaseModel):
+    user_id: str
+    new_title: str
+
+class UserAuthRequest(BaseModel):
+    user_id: str
+
+class BatchEvaluationRequest(BaseModel):
+    input_path: str
+    output_path: str
+    concurrency: int = 4
+    max_retries: int = 3
+
+async def require_ready() -> None:
+    """Dependency endpoint pipeline: menunggu inisialisasi worker sebentar, lalu 503 jika belum siap."""
+    if not await readiness.wait(config.STARTUP_WAIT_SECONDS):
+        raise HTTPException(status_code=503, detail="Layanan sedang memulai, silakan coba lagi sebentar.", headers={"Retry-After": "5"})
+
+@app.post("/ask", tags=["Chat"], dependencies=[Depends(require_ready)])
+async def chat(request: ChatRequest, response: Response):
+    if not request.user_message.strip(): raise HTTPException(status_code=400, detail="Pesan tidak boleh kosong.")
+    timings = StageTimings()
+    answer, source_docs = await process_query(request.user_message.strip(), request.user_id, request.chat_id, timings, request.session_id)
+    chat_id = await run_stage("persistence", save_chat_turn(request.user_id, request.chat_id, request.user_message, answer, source_docs), timings)
+    response.headers["X-Stage-Timings"] = timings.as_header()
+    record_request_telemetry(timings, "POST /ask")
+    return {"response": answer, "chat_id": chat_id}
+
+@app.post("/ask/stream", tags=["Chat"], dependencies=[Depends(require_ready)])
+async def chat_stream(request: ChatRequest):
+    """Varian streaming dari /ask: token JAWABAN dikirim via Server-Sent Events."""
+    if not request.user_message.strip(): raise HTTPException(status_code=400, detail="Pesan tidak boleh kosong.")
+    return StreamingResponse(
+        stream_query_events(request.user_message.strip(), request.user_id, request.chat_id, request.session_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/prefetch", tags=["Chat"], status_code=202)
+async def prefetch(request: PrefetchRequest):
+    """
+    Retrieval spekulatif untuk query yang masih diketik (dipanggil frontend dengan debounce).
+    Dilewati bila worker belum siap, query terlalu pendek, bukan pertanyaan dokumen, semua slot query
+    /ask sedang dipakai, atau slot prefetch (PREFETCH_MAX_IN_FLIGHT) penuh.
+    """
+    query = request.user_message.strip()
+    if not config.PREFETCH_ENABLED or not readiness.serving or len(query) < config.PREFETCH_MIN_CHARS:
+        return {"status": "skipped"}
+    if detect_query_pattern(query) != ResponsePattern.DOCUMENT_QUERY or query_semaphore.locked():
+        return {"status": "skipped"}
+    return {"status": prefetch_cache.start(request.session_id, query, embedding_service.aembed_query, retrieve_documents)}
+
+CHAT_HISTORY_GROUPS = ["today", "yesterday", "last7days", "older"]
+
+@app.get("/api/chat/history/{user_id}", tags=["Chat History"])
+async def get_user_chat_history(user_id: str, limit: Optional[int] = None, offset: int = 0):
+    """
+    Daftar chat per kelompok waktu. Dengan `limit`, hasil dipaginasi lintas kelompok
+    (urutan today → older) dan `next_offset` ditambahkan ke respons.
+    """
+    try:
+        history = conversation_cache.get_chat_list(user_id)
+        if history is None:
+            history = await run_blocking(ChatHistoryService.get_chat_history, user_id)
+            conversation_cache.set_chat_list(user_id, history)
+        if limit is None and not offset:
+            return history
+        flattened = [(group, chat) for group in CHAT_HISTORY_GROUPS for chat in history.get(group, [])]
+        page, next_offset = paginate(flattened, offset, limit)
+        paged_history: Dict[str, Any] = {group: [] for group in CHAT_HISTORY_GROUPS}
+        for group, chat in page:
+            paged_history[group].append(chat)
+        return {**paged_history, "next_offset": next_offset}
+    except Exception as e:
+        logger.error(f"Error getting chat history: {e}"); raise HTTPException(status_code=500, detail="Gagal mengambil riwayat obrolan")
+
+@app.get("/api/chat/{chat_id}/messages", tags=["Chat History"])
+async def get_chat_messages(chat_id: str, user_id: str, limit: Optional[int] = None, offset: int = 0):
+    """Pesan chat (terlama → terbaru). Chat pendek dilayani dari cache jendela percakapan."""
+    try:
+        messages = conversation_cache.get_all(user_id, chat_id)
+        if messages is None:
+            messages = chat_writer.merge_recent(chat_id, await run_blocking(ChatHistoryService.get_chat_messages, user_id, chat_id) or [])
+            conversation_cache.fill(user_id, chat_id, messages, total=len(messages))
+        if limit is None and not offset:
+            return {"messages": messages}
+        page, next_offset = paginate(messages, offset, limit)
+        return {"messages": page, "total": len(messages), "next_offset": next_offset}
+    except Exception as e:
+        logger.error(f"Error getting chat messages: {e}"); raise HTTPException(status_code=500, detail="Gagal mengambil pesan obrolan")
+
+@app.post("/api/chat/continue", tags=["Chat History"], dependencies=[Depends(require_ready)])
+async def continue_chat(request: ContinueChatRequest, response: Response):
+    if not request.user_message.strip(): raise HTTPException(status_code=400, detail="Pesan tidak boleh kosong.")
+    timings = StageTimings()
+    answer, source_docs = await process_query(request.user_message.strip(), request.user_id, request.chat_id, timings)
+    await run_stage("persistence", save_chat_turn(request.user_id, request.chat_id, request.user_message, answer, source_docs), timings)
+    response.headers["X-Stage-Timings"] = timings.as_header()
+    record_request_telemetry(timings, "POST /api/chat/continue")
+    return {"response": answer}
+
+@app.delete("/api/chat/{chat_id}", tags=["Chat History"])
+async def delete_chat(chat_id: str, request: UserAuthRequest):
+    try:
+        chat_writer.discard_chat(chat_id)
+        conversation_cache.discard(chat_id)
+        conversation_cache.invalidate_chat_list(request.user_id)
+        success = await run_blocking(ChatHistoryService.delete_chat, request.user_id, chat_id)
+        if success: return {"message": "Obrolan berhasil dihapus"}
+        else: raise HTTPException(status_code=404, detail="Gagal menghapus obrolan.")
+    except Exception as e:
+        logger.error(f"Error deleting chat: {e}"); raise HTTPException(status_code=500, detail="Terjadi kesalahan saat menghapus obrolan")
+
+@app.put("/api/chat/{chat_id}/title", tags=["Chat History"])
+async def update_chat_title(chat_id: str, request: UpdateTitleRequest):
+    if not request.new_title.strip(): raise HTTPException(status_code=400, detail="Judul baru tidak boleh kosong.")
+    try:
+        success = await run_blocking(ChatHistoryService.update_chat_title, request.user_id, chat_id, request.new_title.strip())
+        conversation_cache.invalidate_chat_list(request.user_id)
+        if success: return {"message": "Judul obrolan berhasil diperbarui"}
+        else: raise HTTPException(status_code=404, detail="Gagal memperbarui judul.")
+    except Exception as e:
+        logger.error(f"Error updating chat title: {e}"); raise HTTPException(status_code=500, detail="Terjadi kesalahan saat memperbarui judul")
+
+evaluation_jobs: Dict[str, Dict[str, Any]] = {}
+
+def resolve_eval_path(path: str) -> str:
+    """Menyelesaikan path di dalam EVAL_DIR; path absolut, '..', atau symlink yang keluar dari EVAL_DIR ditolak."""
+    root = os.path.realpath(config.EVAL_DIR)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root or resolved == root:
+        raise HTTPException(status_code=400, detail="Path evaluasi harus berada di dalam EVAL_DIR.")
+    return resolved
+
+@app.post("/evaluation/batch", tags=["Evaluation"], dependencies=[Depends(require_ready)])
+async def start_batch_evaluation(request: BatchEvaluationRequest):
+    """Menjalankan evaluasi batch di latar belakang; hasil ditulis streaming ke output_path (JSONL) di dalam EVAL_DIR."""
+    input_path, output_path = resolve_eval_path(request.input_path), resolve_eval_path(request.output_path)
+    if not os.path.isfile(input_path): raise HTTPException(status_code=400, detail="File pertanyaan tidak ditemukan.")
+    if request.concurrency < 1: raise HTTPException(status_code=400, detail="Concurrency minimal 1.")
+    try:
+        questions = load_questions(input_path)
+    except Exception as e:
+        logger.error(f"Error reading evaluation set: {e}"); raise HTTPException(status_code=400, detail="Gagal membaca file pertanyaan.")
+
+    job_id = uuid.uuid4().hex
+    job = {"status": "running", "input_path": request.input_path, "output_path": request.output_path, "progress": {}}
+    evaluation_jobs[job_id] = job
+
+    async def _run_job():
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            await run_batch(run_evaluation_query, questions, output_path, request.concurrency, request.max_retries, job["progress"])
+            job["status"] = "completed"
+        except Exception as e:
+            logger.exception("❌ ERROR dalam evaluasi batch")
+            job["status"], job["error"] = "failed", str(e)
+
+    job["task"] = asyncio.create_task(_run_job())
+    return {"job_id": job_id, "total_questions": len(questions)}
+
+@app.get("/evaluation/batch/{job_id}", tags=["Evaluation"])
+async def get_batch_evaluation(job_id: str):
+    job = evaluation_jobs.get(job_id)
+    if job is None: raise HTTPException(status_code=404, detail="Job evaluasi tidak ditemukan.")
+    return {key: value for key, value in job.items() if key != "task"}
+
+@app.get("/", tags=["Status"])
+async def root():
+    return {"message": "Dynamic Legal RAG System API is running.", "version": "4.2.0-memory", "documentation": "/docs"}
+
+@app.get("/health", tags=["Status"])
+async def health_check():
+    return {
+        "status": "healthy",
+        "weaviate_connection": await run_blocking(client.is_ready) if client is not None else False,
+        "retriever": {"backend": type(retriever).__name__ if retriever is not None else None, "ready": retriever is not None and await run_blocking(retriever.is_ready)},
+        "firestore_connection": ChatHistoryService.db is not None,
+        "timestamp": dt.datetime.now(dt.timezone.utc).isoformat()
+    }
+
+@app.get("/ready", tags=["Status"])
+async def readiness_check(response: Response):
+    """Readiness probe: 200 setelah inisialisasi dan pemanasan selesai. /health tetap menjadi liveness probe."""
+    if not readiness.serving: response.status_code = 503
+    return readiness.snapshot()
+
+@app.get("/cache/stats", tags=["Cache"])
+async def get_cache_stats():
+    if semantic_cache is None: return {"enabled": False}
+    return {"enabled": True, **semantic_cache.stats()}
+
+@app.post("/cache/invalidate", tags=["Cache"])
+async def invalidate_cache():
+    """Dipanggil setelah koleksi Weaviate diperbarui agar jawaban lama tidak disajikan."""
+    if semantic_cache is not None: semantic_cache.invalidate()
+    return {"message": "Cache semantik dikosongkan"}
+
+@app.get("/patterns", tags=["Status"])
+async def get_response_patterns():
+    return {pattern.name: pattern.value for pattern in ResponsePattern}
+
+@app.get("/reranker/stats", tags=["Cache"])
+async def get_reranker_stats():
+    return reranker_service.stats()
+
+@app.get("/embeddings/stats", tags=["Cache"])
+async def get_embedding_stats():
+    return embedding_service.stats()
+
+@app.get("/pasal-index/stats", tags=["Cache"])
+async def get_pasal_index_stats():
+    return pasal_index.stats()
+
+def collect_component_stats() -> None:
+    """Menyalin statistik numerik cache/batching ke gauge tepat sebelum scrape."""
+    components = {"conversational": conversational_responder.stats(), "persistence": chat_writer.stats(), "conversation_cache": conversation_cache.stats(), "embeddings": embedding_service.stats(), "reranker": reranker_service.stats(), "pasal_index": pasal_index.stats(), "prefetch": prefetch_cache.stats(), "llm": llm_service.stats()}
+    if semantic_cache is not None: components["semantic_cache"] = semantic_cache.stats()
+    for component, stats in components.items():
+        for stat, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                observability.COMPONENT_STATS.set(value, component=component, stat=stat)
+
+observability.registry.add_collector(collect_component_stats)
+
+@app.get("/metrics", tags=["Status"])
+async def get_metrics():
+    """Metrik format eksposisi teks Prometheus (histogram per tahap per pola, token LLM, statistik cache)."""
+    return PlainTextResponse(observability.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+async def initialize_application() -> None:
+    if not config.OFFLINE_MODE:
+        await readiness.step("components", asyncio.to_thread(initialize_components))
+    # Indeks pasal dibangun dan diperbarui di latar belakang agar kesiapan tidak tertahan
+    app.state.pasal_index_task = asyncio.create_task(refresh_pasal_index_forever())
+
+async def warm_up_application() -> None:
+    """
+    Inferensi pemanasan sebelum worker melapor siap: koneksi HTTP/gRPC terbuka dan thread pool
+    torch/ONNX Runtime dibuat di proses worker itu sendiri (setelah fork). Kegagalan hanya dicatat.
+    """
+    if not config.WARMUP_ENABLED: return
+    query = config.WARMUP_QUERY
+    query_embedding = await readiness.step("warmup_embedding", embedding_service.aembed_query(query), required=False) if embeddings is not None else None
+    if retriever is not None: await readiness.step("warmup_retriever", hybrid_search(query, query_embedding), required=False)
+    if cross_encoder is not None: await readiness.step("warmup_reranker", reranker_service.score(query, [query]), required=False)
+    if config.WARMUP_LLM and llm is not None: await readiness.step("warmup_llm", llm_service.ainvoke(query), required=False)
+
+async def start_application() -> None:
+    """Inisialisasi berjalan di latar belakang: server langsung menerima koneksi, endpoint pipeline menunggu kesiapan."""
+    readiness.begin()
+    app.state.startup_task = asyncio.create_task(run_startup(readiness, initialize_application, warm_up_application))
+
+async def stop_application() -> None:
+    for task_name in ("startup_task", "pasal_index_task"):
+        task = getattr(app.state, task_name, None)
+        if task is not None: task.cancel()
+    await chat_writer.close()
+    io_executor.shutdown(wait=False, cancel_futures=True)
+    await reranker_service.close()
+    evaluation_log.close()
+    trace_log.close()
+    if client is not None: client.close()
+
+# ============================================================================
+# 10. EKSEKUSI APLIKASI
+# ============================================================================
+if __name__ == "__main__":
+    import uvicorn
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # Log INFO httpx berisi satu baris per panggilan Groq/Cohere
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    print("🎉 Sistem Siap! Menjalankan server Uvicorn di http://0.0.0.0:8000")
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,211 @@
+"""
+Runner evaluasi batch di atas alur RAG evaluasi (tanpa histori).
+
+Membaca kumpulan pertanyaan JSONL/CSV, menjalankan retrieval, reranking, dan
+generasi dengan paralelisme terbatas serta retry yang sadar rate-limit, lalu
+menulis hasil secara streaming ke JSONL yang kompatibel dengan RAGAS
+(question, answer, contexts, ground_truth) beserta kolom latensi per tahap.
+Run yang terputus dapat dilanjutkan: pertanyaan yang sudah sukses dilewati.
+
+Contoh:
+    python batch_evaluation.py pertanyaan.jsonl --output hasil.jsonl --concurrency 4
+    python batch_evaluation.py pertanyaan.jsonl --output hasil.jsonl --mode record --cassette kaset.json
+    python batch_evaluation.py pertanyaan.jsonl --output hasil.jsonl --mode replay --cassette kaset.json --stub-reranker
+    python batch_evaluation.py pertanyaan.jsonl --output hasil.jsonl --mode stub --corpus korpus.jsonl
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import random
+import time
+from typing import List, Dict, Any, Optional, Set, Callable, Awaitable
+
+from pipeline import StageTimings
+
+EvaluateFn = Callable[[str, StageTimings], Awaitable[Dict[str, Any]]]
+
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    """Membaca pertanyaan dari JSONL atau CSV. Kolom wajib: question; opsional: id, ground_truth."""
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    questions = []
+    for row in rows:
+        question = (row.get("question") or "").strip()
+        if not question:
+            continue
+        question_id = str(row.get("id") or hashlib.sha1(question.encode("utf-8")).hexdigest()[:12])
+        questions.append({"id": question_id, "question": question, "ground_truth": row.get("ground_truth")})
+    return questions
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """ID pertanyaan yang sudah sukses di file hasil sebelumnya (untuk melanjutkan run)."""
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # baris terakhir bisa terpotong saat proses dihentikan
+            if not row.get("error"):
+                done.add(row.get("id"))
+    return done
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return getattr(error, "status_code", None) == 429 or "429" in message or "rate limit" in message or "rate_limit" in message
+
+
+async def evaluate_question(evaluate: EvaluateFn, item: Dict[str, Any], max_retries: int = 3, base_backoff: float = 2.0) -> Dict[str, Any]:
+    attempt = 0
+    while True:
+        attempt += 1
+        timings = StageTimings()
+        try:
+            result = await evaluate(item["question"], timings)
+            error = None
+            break
+        except Exception as e:
+            if attempt > max_retries:
+                result, error = {"answer": "", "contexts": []}, f"{type(e).__name__}: {e}"
+                break
+            # Rate limit dapat bertahan lebih lama, jadi backoff-nya lebih panjang
+            backoff = base_backoff * (2 ** (attempt - 1)) * (3 if is_rate_limit_error(e) else 1)
+            await asyncio.sleep(backoff * random.uniform(0.8, 1.2))
+
+    row = {
+        "id": item["id"],
+        "question": item["question"],
+        "answer": result.get("answer", ""),
+        "contexts": result.get("contexts", []),
+        "ground_truth": item.get("ground_truth"),
+        "attempts": attempt,
+        "error": error,
+        "latency_total_ms": round(timings.total * 1000, 1),
+    }
+    for stage, seconds in timings.stages.items():
+        row[f"latency_{stage}_ms"] = round(seconds * 1000, 1)
+    return row
+
+
+async def run_batch(evaluate: EvaluateFn, questions: List[Dict[str, Any]], output_path: str, concurrency: int = 4,
+                    max_retries: int = 3, progress: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Menjalankan evaluasi; setiap hasil langsung ditambahkan ke output_path."""
+    done = completed_ids(output_path)
+    pending = [item for item in questions if item["id"] not in done]
+    progress = progress if progress is not None else {}
+    progress.update({"total": len(questions), "skipped": len(questions) - len(pending), "completed": 0, "failed": 0})
+    print(f"🔬 [EVAL] {len(pending)} pertanyaan diproses, {progress['skipped']} dilewati (sudah selesai).")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    write_lock = asyncio.Lock()
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as output_file:
+        async def _run(item: Dict[str, Any]) -> None:
+            async with semaphore:
+                row = await evaluate_question(evaluate, item, max_retries)
+            async with write_lock:
+                output_file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+                output_file.flush()
+                progress["failed" if row["error"] else "completed"] += 1
+
+        await asyncio.gather(*[_run(item) for item in pending])
+
+    progress["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+    return progress
+
+
+def write_parquet(jsonl_path: str, parquet_path: str) -> None:
+    """Konversi hasil JSONL ke Parquet (butuh pandas + pyarrow); baris terakhir per id yang dipakai."""
+    import pandas as pd
+    rows: Dict[str, Dict[str, Any]] = {}
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                if row["id"] not in rows or not row.get("error"):
+                    rows[row["id"]] = row
+    pd.DataFrame(list(rows.values())).to_parquet(parquet_path, index=False)
+
+
+def install_offline_components(rag, mode: str, cassette_path: Optional[str], corpus_path: Optional[str], stub_reranker: bool):
+    """Memasang klien perekam/pemutar ulang/stub ke modul Rag_weaviate sesuai mode."""
+    import local_stubs
+    cassette = local_stubs.Cassette(cassette_path) if cassette_path else None
+    reranker_model = local_stubs.StubCrossEncoder() if stub_reranker else None
+    if mode == "record":
+        rag.install_components(
+            llm_client=local_stubs.RecordingLLM(rag.llm, cassette),
+            embeddings_client=local_stubs.RecordingEmbeddings(rag.embeddings, cassette),
+            collection=local_stubs.RecordingCollection(rag.weaviate_collection, cassette),
+            reranker_model=reranker_model
+        )
+    elif mode == "replay":
+        rag.install_components(
+            llm_client=local_stubs.ReplayLLM(cassette),
+            embeddings_client=local_stubs.ReplayEmbeddings(cassette),
+            collection=local_stubs.ReplayCollection(cassette),
+            reranker_model=reranker_model or rag.load_cross_encoder(rag.config.CROSS_ENCODER_MODEL, rag.config.RERANK_BACKEND, rag.config.RERANK_ONNX_FILE)
+        )
+    elif mode == "stub":
+        stub_embeddings = local_stubs.HashEmbeddings()
+        rag.install_components(
+            llm_client=local_stubs.StubLLM(),
+            embeddings_client=stub_embeddings,
+            collection=local_stubs.InMemoryCollection.from_jsonl(corpus_path, stub_embeddings),
+            reranker_model=reranker_model or local_stubs.StubCrossEncoder()
+        )
+    return cassette
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Evaluasi batch RAG (output kompatibel RAGAS).")
+    parser.add_argument("questions", help="File pertanyaan .jsonl atau .csv (kolom: question, ground_truth, id)")
+    parser.add_argument("--output", required=True, help="File hasil .jsonl (ditambahkan; run dapat dilanjutkan)")
+    parser.add_argument("--parquet", help="Tulis juga hasil akhir ke file .parquet")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--mode", choices=["live", "record", "replay", "stub"], default="live",
+                        help="live: layanan asli; record: layanan asli + rekam ke kaset; replay: putar ulang kaset; stub: korpus lokal + stub")
+    parser.add_argument("--cassette", help="File kaset JSON untuk mode record/replay")
+    parser.add_argument("--corpus", help="Korpus JSONL (content, source, page, pasal) untuk mode stub")
+    parser.add_argument("--stub-reranker", action="store_true", help="Gunakan reranker stub alih-alih CrossEncoder")
+    args = parser.parse_args(argv)
+
+    if args.mode in ("record", "replay") and not args.cassette:
+        parser.error("--cassette wajib untuk mode record/replay")
+    if args.mode == "stub" and not args.corpus:
+        parser.error("--corpus wajib untuk mode stub")
+    if args.mode in ("replay", "stub"):
+        os.environ["RAG_OFFLINE_MODE"] = "true"
+
+    import Rag_weaviate as rag
+    if args.mode in ("live", "record"):
+        # Di server koneksi dan model dibuat oleh lifespan FastAPI; CLI memuatnya sendiri
+        rag.initialize_components()
+    cassette = install_offline_components(rag, args.mode, args.cassette, args.corpus, args.stub_reranker) if args.mode != "live" else None
+
+    questions = load_questions(args.questions)
+    summary = asyncio.run(run_batch(rag.run_evaluation_query, questions, args.output, args.concurrency, args.max_retries))
+    if cassette is not None and args.mode == "record":
+        cassette.save()
+    if args.parquet:
+        write_parquet(args.output, args.parquet)
+    print(f"✅ Evaluasi selesai: {json.dumps(summary)}")
+
+
+if __name__ == "__main__":
+    main()
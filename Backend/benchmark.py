@@ -0,0 +1,231 @@
+"""
+Benchmark performa backend tanpa layanan berbayar.
+
+Aplikasi FastAPI dari Rag_weaviate.py dijalankan in-process (ASGI) dengan pengganti
+lokal: koleksi in-memory untuk Weaviate, embedding deterministik untuk Cohere, LLM
+stub berlatensi terukur untuk Groq, dan riwayat obrolan in-memory untuk Firestore.
+Beban campuran (sapaan, PASAL_QUERY, DOCUMENT_QUERY, follow-up dengan histori)
+diputar ulang pada konkurensi target, lalu dilaporkan p50/p95/p99, request per
+detik, dan rincian per tahap (dari header X-Stage-Timings).
+
+Contoh:
+    python benchmark.py --requests 500 --concurrency 32 --save-baseline baseline.json
+    python benchmark.py --requests 500 --concurrency 32 --compare baseline.json --fail-on-regression
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import List, Dict, Any, Optional
+
+DEFAULT_MIX = {"greeting": 0.15, "pasal": 0.2, "document": 0.45, "followup": 0.2}
+GREETINGS = ["halo", "hai, selamat pagi", "terima kasih banyak", "sampai jumpa", "apa kabar?"]
+TOPICS = ["penjaminan mutu internal", "akreditasi program studi", "evaluasi diri", "standar pendidikan",
+          "audit mutu internal", "visi dan misi", "kurikulum", "penelitian dosen"]
+
+
+def generate_synthetic_corpus(pasal_count: int = 40, chunks_per_pasal: int = 3) -> List[Dict[str, Any]]:
+    corpus = []
+    for pasal in range(1, pasal_count + 1):
+        topic = TOPICS[pasal % len(TOPICS)]
+        for chunk in range(chunks_per_pasal):
+            corpus.append({
+                "content": f"Pasal {pasal} ayat {chunk + 1} mengatur {topic}. Ketentuan ini wajib dipenuhi oleh setiap program studi "
+                           f"dalam pelaksanaan {topic} sesuai pedoman nomor {pasal * 7 + chunk}.",
+                "source": f"Peraturan Mutu {pasal % 5 + 1}",
+                "page": pasal * 2 + chunk,
+                "pasal": str(pasal),
+            })
+    return corpus
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(latencies),
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def parse_stage_header(header: Optional[str]) -> Dict[str, float]:
+    stages = {}
+    for part in (header or "").split(";"):
+        if "=" in part:
+            stage, value = part.split("=", 1)
+            stages[stage] = float(value)
+    return stages
+
+
+def build_workload(corpus: List[Dict[str, Any]], total: int, mix: Dict[str, float], followup_chats: List[str], seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    pasal_numbers = sorted({doc["pasal"] for doc in corpus if doc.get("pasal") not in (None, "", "-")}) or ["1"]
+    kinds = rng.choices(list(mix.keys()), weights=list(mix.values()), k=total)
+    workload = []
+    for kind in kinds:
+        if kind == "greeting":
+            workload.append({"kind": kind, "body": {"user_message": rng.choice(GREETINGS)}})
+        elif kind == "pasal":
+            workload.append({"kind": kind, "body": {"user_message": f"apa isi pasal {rng.choice(pasal_numbers)}?"}})
+        elif kind == "document":
+            workload.append({"kind": kind, "body": {"user_message": f"bagaimana ketentuan tentang {rng.choice(TOPICS)} untuk program studi?"}})
+        else:
+            workload.append({"kind": kind, "body": {"user_message": f"lalu bagaimana dengan {rng.choice(TOPICS)} tersebut?",
+                                                    "user_id": "bench-user", "chat_id": rng.choice(followup_chats)}})
+    return workload
+
+
+def setup_app(args) -> Any:
+    """Mengimpor aplikasi dalam mode offline dan memasang pengganti lokal."""
+    os.environ["RAG_OFFLINE_MODE"] = "true"
+    os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "false" if args.no_semantic_cache else "true")
+    import Rag_weaviate as rag
+    import local_stubs
+
+    stub_embeddings = local_stubs.HashEmbeddings(latency=args.embed_latency_ms / 1000)
+    corpus = generate_synthetic_corpus()
+    if args.corpus:
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            corpus = [json.loads(line) for line in f if line.strip()]
+
+    rag.install_components(
+        llm_client=local_stubs.StubLLM(args.llm_first_token_ms / 1000, args.llm_per_token_ms / 1000),
+        embeddings_client=stub_embeddings,
+        collection=local_stubs.InMemoryCollection(corpus, stub_embeddings, latency=args.search_latency_ms / 1000),
+        reranker_model=local_stubs.StubCrossEncoder(),
+        chat_history_service=local_stubs.InMemoryChatHistory.configure(latency=args.history_latency_ms / 1000)
+    )
+    rag.load_pasal_index()
+    return rag, corpus
+
+
+async def run_benchmark(rag, workload: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    import httpx
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    stage_latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in workload:
+        queue.put_nowait(item)
+
+    transport = httpx.ASGITransport(app=rag.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as http:
+        async def worker():
+            while not queue.empty():
+                item = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    response = await http.post("/ask", json=item["body"])
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    if response.status_code != 200:
+                        errors[item["kind"]] += 1
+                        continue
+                    latencies[item["kind"]].append(elapsed_ms)
+                    for stage, value in parse_stage_header(response.headers.get("X-Stage-Timings")).items():
+                        stage_latencies[stage].append(value)
+                except Exception:
+                    errors[item["kind"]] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "overall": {**summarize(all_latencies), "errors": sum(errors.values()), "rps": round(len(all_latencies) / elapsed, 2), "elapsed_seconds": round(elapsed, 3)},
+        "by_kind": {kind: {**summarize(values), "errors": errors.get(kind, 0)} for kind, values in sorted(latencies.items())},
+        "stages": {stage: summarize(values) for stage, values in sorted(stage_latencies.items())},
+    }
+
+
+def compare_with_baseline(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Mengembalikan daftar regresi: latensi naik atau throughput turun melebihi toleransi."""
+    regressions = []
+    sections = [("overall", report["overall"], baseline.get("overall", {}))]
+    sections += [(f"by_kind.{kind}", stats, baseline.get("by_kind", {}).get(kind, {})) for kind, stats in report["by_kind"].items()]
+    for name, current, previous in sections:
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if previous.get(metric) and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {previous[metric]} -> {current[metric]}")
+    previous_rps = baseline.get("overall", {}).get("rps")
+    if previous_rps and report["overall"]["rps"] < previous_rps * (1 - tolerance):
+        regressions.append(f"overall.rps: {previous_rps} -> {report['overall']['rps']}")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    overall = report["overall"]
+    print(f"\n📊 {overall['count']} request | {overall['rps']} req/s | error: {overall['errors']}")
+    print(f"{'jenis':<16}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, stats in [("SEMUA", overall)] + list(report["by_kind"].items()):
+        print(f"{name:<16}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    print("\n⏱️ Per tahap (ms):")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<16}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark backend RAG dengan pengganti lokal untuk Weaviate, Cohere, dan Groq.")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default=json.dumps(DEFAULT_MIX), help="Bobot beban dalam JSON, kunci: greeting, pasal, document, followup")
+    parser.add_argument("--corpus", help="Korpus JSONL (content, source, page, pasal); default korpus sintetis")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-per-token-ms", type=float, default=5)
+    parser.add_argument("--embed-latency-ms", type=float, default=40)
+    parser.add_argument("--search-latency-ms", type=float, default=30)
+    parser.add_argument("--history-latency-ms", type=float, default=50)
+    parser.add_argument("--no-semantic-cache", action="store_true")
+    parser.add_argument("--output", help="Simpan laporan JSON ke file ini")
+    parser.add_argument("--save-baseline", help="Simpan laporan sebagai baseline")
+    parser.add_argument("--compare", help="Bandingkan dengan file baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Toleransi regresi relatif (default 10%%)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    rag, corpus = setup_app(args)
+    followup_chats = []
+    for i in range(8):
+        chat_id = rag.ChatHistoryService.create_chat_session("bench-user", f"sesi {i}")
+        rag.ChatHistoryService.save_message("bench-user", chat_id, f"jelaskan {TOPICS[i % len(TOPICS)]}", "user")
+        rag.ChatHistoryService.save_message("bench-user", chat_id, f"{TOPICS[i % len(TOPICS)]} diatur dalam pedoman.", "assistant")
+        followup_chats.append(chat_id)
+
+    workload = build_workload(corpus, args.requests, json.loads(args.mix), followup_chats, args.seed)
+    report = asyncio.run(run_benchmark(rag, workload, args.concurrency))
+    report["config"] = {key: value for key, value in vars(args).items() if key not in ("output", "save_baseline", "compare")}
+    print_report(report)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare_with_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\n❌ Regresi terhadap baseline:\n  " + "\n  ".join(regressions))
+            return 1 if args.fail_on_regression else 0
+        print("\n✅ Tidak ada regresi terhadap baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Penyusun konteks prompt dengan anggaran token.
+
+Chunk hasil rerank dideduplikasi (chunk yang isinya hampir sama dibuang), lalu
+anggaran token dibagi ke chunk (tetap dalam urutan relevansi). Chunk yang melebihi
+jatahnya dipangkas menjadi kalimat-kalimat dengan skor reranker tertinggi
+(urutan asli kalimat dipertahankan). Histori lama diringkas secara ekstraktif
+tanpa panggilan LLM; hanya pesan terakhir yang disertakan utuh.
+
+Jumlah token diperkirakan dari panjang karakter (tanpa tokenizer model),
+cukup untuk anggaran dan pelaporan sebelum/sesudah kompresi.
+"""
+import logging
+import math
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 3.5
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?;:])\s+|\n+")
+WORD_PATTERN = re.compile(r"\w+")
+REFERENCE_BLOCK_PATTERN = re.compile(r"\n*={10,}\n*📚[\s\S]*$")
+SUMMARY_MAX_WORDS = 25
+
+# (query, kalimat, id_kalimat) -> skor relevansi per kalimat
+SentenceScorer = Callable[[str, List[str], List[Optional[str]]], Awaitable[List[float]]]
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Memotong teks agar muat dalam anggaran token, di batas kata jika memungkinkan."""
+    max_chars = int(budget * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = cut.rfind(" ")
+    return (cut[:boundary] if boundary > 0 else cut).rstrip()
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in SENTENCE_SPLIT_PATTERN.split(text) if sentence and sentence.strip()]
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = WORD_PATTERN.findall(text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def deduplicate_chunks(documents: List[Document], threshold: float = 0.8) -> List[Document]:
+    """Membuang chunk yang sebagian besar isinya (containment shingle) sudah ada di chunk yang lebih relevan."""
+    kept: List[Tuple[Document, set]] = []
+    for doc in documents:
+        shingles = _shingles(doc.page_content)
+        duplicate = any(len(shingles & other) / max(1, min(len(shingles), len(other))) >= threshold for _, other in kept)
+        if not duplicate:
+            kept.append((doc, shingles))
+    return [doc for doc, _ in kept]
+
+
+def lexical_scores(query: str, sentences: List[str]) -> List[float]:
+    """Skor cadangan jika reranker tidak tersedia: proporsi kata query yang muncul di kalimat."""
+    query_words = set(WORD_PATTERN.findall(query.lower()))
+    return [len(query_words & set(WORD_PATTERN.findall(sentence.lower()))) / max(1, len(query_words)) for sentence in sentences]
+
+
+class ContextBuilder:
+    def __init__(self, token_budget: int, scorer: Optional[SentenceScorer] = None, dedup_threshold: float = 0.8):
+        self.token_budget = token_budget
+        self.scorer = scorer
+        self.dedup_threshold = dedup_threshold
+
+    async def build(self, query: str, documents: List[Document]) -> Tuple[List[str], Dict[str, int]]:
+        """Mengembalikan passage (sesuai urutan relevansi) yang muat dalam anggaran, beserta statistik token."""
+        tokens_before = sum(estimate_tokens(doc.page_content) for doc in documents)
+        unique_docs = deduplicate_chunks(documents, self.dedup_threshold)
+
+        # Water-filling: chunk kecil diambil utuh, sisa anggarannya dibagi ke chunk yang lebih panjang
+        sizes = [estimate_tokens(doc.page_content) for doc in unique_docs]
+        allocations = [0] * len(unique_docs)
+        remaining_budget = self.token_budget
+        by_size = sorted(range(len(unique_docs)), key=lambda i: sizes[i])
+        for position, index in enumerate(by_size):
+            allocations[index] = min(sizes[index], remaining_budget // (len(by_size) - position))
+            remaining_budget -= allocations[index]
+
+        passages: List[str] = []
+        for doc, size, allocation in zip(unique_docs, sizes, allocations):
+            passage = doc.page_content if size <= allocation else await self._trim(query, doc, allocation)
+            if passage:
+                passages.append(passage)
+
+        stats = {
+            "tokens_before": tokens_before,
+            "tokens_after": sum(estimate_tokens(passage) for passage in passages),
+            "chunks_deduplicated": len(documents) - len(unique_docs),
+        }
+        return passages, stats
+
+    async def _trim(self, query: str, doc: Document, budget: int) -> str:
+        sentences = split_sentences(doc.page_content)
+        if not sentences or budget <= 0:
+            return ""
+        scores = None
+        if self.scorer is not None:
+            doc_id = doc.metadata.get("weaviate_id")
+            sentence_ids = [f"{doc_id}#{i}" if doc_id else None for i in range(len(sentences))]
+            try:
+                scores = await self.scorer(query, sentences, sentence_ids)
+            except Exception as e:
+                logger.warning(f"⚠️ Skor kalimat gagal, memakai skor leksikal: {e}")
+        if scores is None:
+            scores = lexical_scores(query, sentences)
+
+        ranked = sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True)
+        selected, used = set(), 0
+        for index in ranked:
+            cost = estimate_tokens(sentences[index])
+            if used + cost <= budget:
+                selected.add(index)
+                used += cost
+        if not selected:
+            # Tidak ada kalimat yang muat utuh: potong kalimat terbaik pada batas anggaran
+            return truncate_to_tokens(sentences[ranked[0]], budget)
+        return " ".join(sentences[i] for i in sorted(selected))
+
+
+def _first_words(text: str, max_words: int) -> str:
+    sentences = split_sentences(text)
+    words = (sentences[0] if sentences else text).split()
+    return " ".join(words[:max_words]) + (" …" if len(words) > max_words else "")
+
+
+def compress_history(messages: List[Dict[str, Any]], token_budget: int, recent_messages: int = 2) -> Tuple[str, Dict[str, int]]:
+    """
+    Pesan terakhir disertakan utuh (tanpa blok REFERENSI); pesan yang lebih lama
+    diringkas menjadi satu baris per pesan. Baris ringkasan tertua dibuang lebih
+    dulu jika anggaran terlampaui.
+    """
+    def label(message: Dict[str, Any]) -> str:
+        return "Pengguna" if message.get("role") == "user" else "Asisten"
+
+    tokens_before = sum(estimate_tokens(message.get("content", "")) for message in messages)
+    older, recent = messages[:-recent_messages] if recent_messages else messages, messages[-recent_messages:] if recent_messages else []
+
+    # Pesan terakhir tetap utuh selama muat; jawaban yang sangat panjang dipotong agar anggaran tetap terjaga
+    max_recent_chars = int(token_budget * CHARS_PER_TOKEN / max(1, len(recent)))
+    recent_lines = []
+    for message in recent:
+        content = REFERENCE_BLOCK_PATTERN.sub("", message.get("content", "")).strip()
+        if len(content) > max_recent_chars:
+            content = content[:max_recent_chars].rsplit(" ", 1)[0] + " …"
+        recent_lines.append(f"{label(message)}: {content}")
+    summary_lines = [f"- {label(message)}: {_first_words(REFERENCE_BLOCK_PATTERN.sub('', message.get('content', '')), SUMMARY_MAX_WORDS)}" for message in older]
+
+    budget_left = token_budget - sum(estimate_tokens(line) for line in recent_lines)
+    while summary_lines and sum(estimate_tokens(line) for line in summary_lines) > budget_left:
+        summary_lines.pop(0)
+
+    parts = []
+    if summary_lines:
+        parts.append("Ringkasan percakapan sebelumnya:\n" + "\n".join(summary_lines))
+    parts.extend(recent_lines)
+    history = "\n".join(parts)
+    return history, {"tokens_before": tokens_before, "tokens_after": estimate_tokens(history)}
@@ -0,0 +1,182 @@
+"""
+Cache jendela percakapan in-process.
+
+Setiap chat menyimpan N pesan terakhir dalam ring buffer (deque) berbentuk
+tuple ringkas. Cache diperbarui saat backend menyimpan pesan, sehingga
+follow-up tidak perlu membaca ulang Firestore; Firestore hanya dibaca saat
+cold miss. Jendela kedaluwarsa setelah TTL sejak terakhir disegarkan: saat dibaca
+dari Firestore atau saat worker ini sendiri menambahkan pesan. Konsekuensinya,
+pada gunicorn multi-worker pesan yang disimpan worker lain untuk chat yang sama
+baru terlihat setelah jendela di worker ini menganggur selama TTL. Antar chat berlaku eviksi LRU
+dengan batas jumlah chat dan batas perkiraan memori. Daftar chat per pengguna juga di-cache singkat (TTL) dan
+dibuang saat sesi dibuat, dihapus, atau diganti judulnya.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# (role, content, timestamp, metadata)
+CompactMessage = Tuple[str, str, Any, Optional[Dict[str, Any]]]
+MESSAGE_OVERHEAD_BYTES = 120
+
+
+def _message_size(message: CompactMessage) -> int:
+    return sys.getsizeof(message[1]) + MESSAGE_OVERHEAD_BYTES + (len(str(message[3])) if message[3] else 0)
+
+
+class ChatWindow:
+    __slots__ = ("user_id", "messages", "total", "size_bytes", "loaded_at")
+
+    def __init__(self, user_id: str, window_size: int, total: Optional[int]):
+        self.user_id = user_id
+        # Waktu terakhir jendela disegarkan (dibaca dari Firestore atau ditulis worker ini)
+        self.loaded_at = time.monotonic()
+        self.messages: Deque[CompactMessage] = deque(maxlen=window_size)
+        # Jumlah seluruh pesan chat jika diketahui; None berarti hanya ekor chat yang diketahui
+        self.total = total
+        self.size_bytes = 0
+
+    @property
+    def complete(self) -> bool:
+        """True jika seluruh isi chat ada di buffer (cukup untuk melayani daftar pesan lengkap)."""
+        return self.total is not None and self.total <= len(self.messages)
+
+    def extend(self, messages: List[CompactMessage]) -> None:
+        for message in messages:
+            if len(self.messages) == self.messages.maxlen:
+                self.size_bytes -= _message_size(self.messages[0])
+            self.messages.append(message)
+            self.size_bytes += _message_size(message)
+        if self.total is not None:
+            self.total += len(messages)
+
+
+class ConversationWindowCache:
+    def __init__(self, window_size: int = 8, max_chats: int = 10000, max_bytes: int = 64 * 1024 * 1024, chat_list_ttl: float = 30.0,
+                 window_ttl: float = 300.0):
+        self.window_size = window_size
+        self.window_ttl = window_ttl
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self.chat_list_ttl = chat_list_ttl
+        self._chats: "OrderedDict[str, ChatWindow]" = OrderedDict()
+        self._chat_lists: Dict[str, Tuple[float, Any]] = {}
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, int] = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "chat_list_hits": 0, "chat_list_misses": 0}
+
+    @staticmethod
+    def _compact(message: Dict[str, Any]) -> CompactMessage:
+        return (message.get("role", ""), message.get("content", ""), message.get("timestamp"), message.get("metadata") or None)
+
+    @staticmethod
+    def _expand(message: CompactMessage) -> Dict[str, Any]:
+        return {"role": message[0], "content": message[1], "timestamp": message[2], "metadata": message[3] or {}}
+
+    def _get_window(self, user_id: str, chat_id: str) -> Optional[ChatWindow]:
+        window = self._chats.get(chat_id)
+        if window is None or window.user_id != user_id:
+            self.metrics["misses"] += 1
+            return None
+        if time.monotonic() - window.loaded_at > self.window_ttl:
+            self._remove(chat_id)
+            self.metrics["expired"] += 1
+            self.metrics["misses"] += 1
+            return None
+        self._chats.move_to_end(chat_id)
+        self.metrics["hits"] += 1
+        return window
+
+    def get_recent(self, user_id: str, chat_id: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """`limit` pesan terakhir, atau None jika chat belum di-cache (cold miss)."""
+        with self._lock:
+            window = self._get_window(user_id, chat_id)
+            if window is None or (limit > len(window.messages) and not window.complete):
+                return None
+            return [self._expand(message) for message in list(window.messages)[-limit:]]
+
+    def get_all(self, user_id: str, chat_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Seluruh pesan chat jika semuanya muat di buffer; selain itu None."""
+        with self._lock:
+            window = self._get_window(user_id, chat_id)
+            if window is None or not window.complete:
+                return None
+            return [self._expand(message) for message in window.messages]
+
+    def fill(self, user_id: str, chat_id: str, messages: List[Dict[str, Any]], total: Optional[int] = None) -> None:
+        """Mengisi buffer dari hasil baca Firestore. `total` diisi jika `messages` adalah isi chat lengkap."""
+        with self._lock:
+            self._remove(chat_id)
+            window = ChatWindow(user_id, self.window_size, None)
+            window.extend([self._compact(message) for message in messages])
+            window.total = total
+            self._insert(chat_id, window)
+
+    def append(self, user_id: str, chat_id: str, messages: List[Dict[str, Any]], new_chat: bool = False) -> None:
+        """Menambahkan pesan yang baru disimpan. Chat lama yang belum di-cache dibiarkan (diisi saat cold miss)."""
+        with self._lock:
+            window = self._chats.get(chat_id)
+            if window is None:
+                if not new_chat:
+                    return
+                window = ChatWindow(user_id, self.window_size, 0)
+                self._insert(chat_id, window)
+            self._size_bytes -= window.size_bytes
+            window.extend([self._compact(message) for message in messages])
+            window.loaded_at = time.monotonic()
+            self._size_bytes += window.size_bytes
+            self._chats.move_to_end(chat_id)
+            self._evict()
+
+    def discard(self, chat_id: str) -> None:
+        with self._lock:
+            self._remove(chat_id)
+
+    def _insert(self, chat_id: str, window: ChatWindow) -> None:
+        self._chats[chat_id] = window
+        self._size_bytes += window.size_bytes
+        self._evict()
+
+    def _remove(self, chat_id: str) -> None:
+        window = self._chats.pop(chat_id, None)
+        if window is not None:
+            self._size_bytes -= window.size_bytes
+
+    def _evict(self) -> None:
+        while self._chats and (len(self._chats) > self.max_chats or self._size_bytes > self.max_bytes):
+            _, window = self._chats.popitem(last=False)
+            self._size_bytes -= window.size_bytes
+            self.metrics["evictions"] += 1
+
+    def get_chat_list(self, user_id: str) -> Optional[Any]:
+        with self._lock:
+            cached = self._chat_lists.get(user_id)
+            if cached is None or time.monotonic() - cached[0] > self.chat_list_ttl:
+                self.metrics["chat_list_misses"] += 1
+                return None
+            self.metrics["chat_list_hits"] += 1
+            return cached[1]
+
+    def set_chat_list(self, user_id: str, chat_list: Any) -> None:
+        with self._lock:
+            if len(self._chat_lists) >= self.max_chats:
+                self._chat_lists.pop(next(iter(self._chat_lists)))
+            self._chat_lists[user_id] = (time.monotonic(), chat_list)
+
+    def invalidate_chat_list(self, user_id: str) -> None:
+        with self._lock:
+            self._chat_lists.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.metrics, "chats": len(self._chats), "size_bytes": self._size_bytes, "chat_lists": len(self._chat_lists)}
+
+
+def paginate(items: List[Any], offset: int, limit: Optional[int]) -> Tuple[List[Any], Optional[int]]:
+    """Potongan [offset, offset+limit) dan offset halaman berikutnya (None jika sudah habis)."""
+    if limit is None:
+        return items[offset:], None
+    page = items[offset:offset + limit]
+    return page, offset + limit if offset + limit < len(items) else None
@@ -0,0 +1,133 @@
+"""
+Klasifikasi pola pesan dan responder percakapan lokal tanpa LLM.
+
+Semua aturan pola digabung menjadi satu regex terkompilasi: alternatif dicoba
+berurutan dari awal pesan (aturan "di mana saja" memakai lookahead), sehingga
+prioritas aturan tetap sama seperti rangkaian re.search sebelumnya tetapi cukup
+satu kali pencocokan per pesan. Sapaan, ucapan terima kasih, salam perpisahan,
+dan small talk yang dikenali dijawab dari template dalam hitungan mikrodetik;
+hanya small talk yang ambigu yang diteruskan ke LLM.
+"""
+import random
+import re
+from typing import Dict, List, Optional, Tuple
+
+# (label, pola, hanya_di_awal) — urutan = prioritas
+PATTERN_RULES: List[Tuple[str, str, bool]] = [
+    ("greeting", r"(?:hai|hello|hi|halo|selamat\s+(?:pagi|siang|sore|malam)|apa\s+kabar)\b", True),
+    ("gratitude", r"terima\s+kasih|thank\s+you|makasih", False),
+    ("farewell", r"sampai\s+jumpa|goodbye|bye", False),
+    ("pasal_query", r"pasal\s+\d+|ps\s*\.?\s*\d+|pasal\s+ke[\s-]*\d+", False),
+]
+
+SMALL_TALK_MAX_WORDS = 3
+SMALL_TALK_MAX_CHARS = 20
+# Sisa kata di luar frasa sapaan/terima kasih yang masih dianggap basa-basi
+TEMPLATE_MAX_EXTRA_WORDS = 3
+
+
+class PatternClassifier:
+    """Klasifikasi pola pesan dengan satu regex terkompilasi."""
+
+    def __init__(self, rules: List[Tuple[str, str, bool]] = PATTERN_RULES, default: str = "document_query"):
+        alternatives = [f"(?P<{label}>{pattern})" if anchored else f"(?=.*?(?P<{label}>{pattern}))"
+                        for label, pattern, anchored in rules]
+        self._regex = re.compile("^(?:" + "|".join(alternatives) + ")", re.DOTALL)
+        self.default = default
+
+    def match(self, message: str) -> Tuple[str, Optional[Tuple[int, int]], str]:
+        """Mengembalikan (label, span frasa yang cocok, pesan ternormalisasi)."""
+        message_lower = message.lower().strip()
+        match = self._regex.match(message_lower)
+        if match:
+            return match.lastgroup, match.span(match.lastgroup), message_lower
+        if len(message_lower.split()) <= SMALL_TALK_MAX_WORDS and len(message_lower) <= SMALL_TALK_MAX_CHARS:
+            return "small_talk", None, message_lower
+        return self.default, None, message_lower
+
+    def classify(self, message: str) -> str:
+        return self.match(message)[0]
+
+
+GREETING_TEMPLATES = [
+    "{salam}! 👋 Saya asisten Penjaminan Mutu. Ada yang bisa saya bantu terkait dokumen atau peraturan mutu?",
+    "{salam}! Senang bisa membantu. Silakan tanyakan apa saja seputar penjaminan mutu dan peraturannya.",
+    "{salam}! 😊 Saya siap membantu mencari informasi dari dokumen penjaminan mutu. Apa yang ingin Anda ketahui?",
+]
+HOW_ARE_YOU_TEMPLATES = [
+    "Kabar saya baik, terima kasih sudah bertanya! 😊 Ada yang bisa saya bantu terkait penjaminan mutu?",
+    "Baik sekali, terima kasih! Silakan sampaikan pertanyaan Anda tentang dokumen atau peraturan mutu.",
+]
+GRATITUDE_TEMPLATES = [
+    "Sama-sama! 😊 Jika ada pertanyaan lain seputar penjaminan mutu, jangan ragu untuk bertanya.",
+    "Dengan senang hati! Semoga informasinya bermanfaat.",
+    "Terima kasih kembali! Saya siap membantu kapan saja.",
+]
+FAREWELL_TEMPLATES = [
+    "Sampai jumpa! 👋 Semoga harinya menyenangkan.",
+    "Terima kasih sudah menggunakan layanan ini. Sampai jumpa lagi!",
+    "Sampai jumpa! Jangan ragu kembali jika ada pertanyaan seputar penjaminan mutu.",
+]
+SMALL_TALK_INTENTS: List[Tuple[str, List[str]]] = [
+    (r"siapa\s+(?:kamu|anda|namamu)|kamu\s+siapa|anda\s+siapa", [
+        "Saya asisten AI Penjaminan Mutu yang menjawab pertanyaan berdasarkan dokumen dan peraturan mutu yang tersedia.",
+        "Saya asisten virtual Penjaminan Mutu. Tanyakan isi pasal atau ketentuan dokumen mutu, saya bantu carikan.",
+    ]),
+    (r"bisa\s+apa|bisa\s+bantu\s+apa|fungsi(?:mu)?\b", [
+        "Saya dapat menjelaskan isi pasal, ketentuan, dan prosedur dalam dokumen penjaminan mutu. Contoh: \"apa isi pasal 5?\"",
+    ]),
+    (r"^(?:ok|oke|okay|okey|baik|siap|sip|mantap|oh|ooh|paham|mengerti)\b", [
+        "Baik! Silakan lanjutkan jika ada pertanyaan lain. 😊",
+        "Siap! Saya tunggu pertanyaan berikutnya.",
+    ]),
+    (r"^(?:tes|test|ping)\b", [
+        "Sistem aktif dan siap menjawab. Silakan ajukan pertanyaan Anda.",
+    ]),
+]
+
+
+class ConversationalResponder:
+    """
+    Menjawab pola percakapan dari template. respond() mengembalikan None jika
+    pesan ambigu (mis. sapaan yang disertai kalimat panjang atau small talk yang
+    tidak dikenali) sehingga pemanggil perlu meneruskannya ke LLM.
+    """
+
+    def __init__(self, classifier: Optional[PatternClassifier] = None, seed: Optional[int] = None):
+        self.classifier = classifier or PatternClassifier()
+        self._random = random.Random(seed)
+        self._small_talk = [(re.compile(pattern), templates) for pattern, templates in SMALL_TALK_INTENTS]
+        self.metrics: Dict[str, int] = {"templated": 0, "fallback": 0}
+
+    def respond(self, message: str) -> Optional[str]:
+        label, span, message_lower = self.classifier.match(message)
+        response = None
+        if label == "small_talk":
+            response = self._respond_small_talk(message_lower)
+        elif label in ("greeting", "gratitude", "farewell") and self._is_short_remainder(message_lower, span):
+            if label == "greeting":
+                response = self._respond_greeting(message_lower[span[0]:span[1]])
+            else:
+                response = self._random.choice(GRATITUDE_TEMPLATES if label == "gratitude" else FAREWELL_TEMPLATES)
+        self.metrics["templated" if response is not None else "fallback"] += 1
+        return response
+
+    @staticmethod
+    def _is_short_remainder(message_lower: str, span: Tuple[int, int]) -> bool:
+        remainder = re.sub(r"[^\w\s]", " ", message_lower[:span[0]] + " " + message_lower[span[1]:])
+        return len(remainder.split()) <= TEMPLATE_MAX_EXTRA_WORDS
+
+    def _respond_greeting(self, phrase: str) -> str:
+        if phrase.startswith("apa"):
+            return self._random.choice(HOW_ARE_YOU_TEMPLATES)
+        salam = " ".join(phrase.split()).capitalize() if phrase.startswith("selamat") else "Halo"
+        return self._random.choice(GREETING_TEMPLATES).format(salam=salam)
+
+    def _respond_small_talk(self, message_lower: str) -> Optional[str]:
+        for regex, templates in self._small_talk:
+            if regex.search(message_lower):
+                return self._random.choice(templates)
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.metrics)
@@ -0,0 +1,152 @@
+"""
+Lapisan embedding di atas CohereEmbeddings.
+
+- Memoization per teks ter-normalisasi (LRU terbatas + store SQLite opsional).
+- Micro-batching: panggilan embed_query yang datang bersamaan dari request paralel
+  digabung menjadi satu panggilan Cohere dalam jendela waktu singkat.
+"""
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+import numpy as np
+
+
+class EmbeddingStore:
+    """Store embedding persisten (SQLite lokal) yang dipisahkan per model."""
+
+    def __init__(self, path: str, model: str):
+        self.model = model
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (model TEXT, key TEXT, vector BLOB, PRIMARY KEY (model, key))")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE model = ? AND key = ?", (self.model, key)).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32).tolist() if row else None
+
+    def put_many(self, items: List[Tuple[str, List[float]]]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(self.model, key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+            )
+            self._conn.commit()
+
+
+class EmbeddingService:
+    """Pembungkus CohereEmbeddings dengan memoization dan micro-batching query."""
+
+    def __init__(self, embeddings, max_cache_entries: int = 4096, store: Optional[EmbeddingStore] = None,
+                 batch_window_ms: float = 10, max_batch_size: int = 96):
+        self._embeddings = embeddings
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._max_cache_entries = max_cache_entries
+        self._store = store
+        self._batch_window = batch_window_ms / 1000
+        self._max_batch_size = max_batch_size
+        self._pending: "OrderedDict[str, Tuple[str, asyncio.Future]]" = OrderedDict()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._full_flushes: Set[asyncio.Task] = set()
+        self.metrics = {"hits": 0, "store_hits": 0, "misses": 0, "batches": 0, "batched_texts": 0}
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return " ".join(text.split())
+
+    @classmethod
+    def cache_key(cls, text: str) -> str:
+        return cls.normalize_text(text).casefold()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._max_cache_entries:
+            self._cache.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+            self.metrics["hits"] += 1
+        return vector
+
+    def _remember_from_store(self, key: str, vector: Optional[List[float]]) -> Optional[List[float]]:
+        if vector is not None:
+            self._remember(key, vector)
+            self.metrics["store_hits"] += 1
+        return vector
+
+    def embed_query(self, text: str) -> List[float]:
+        """Varian sinkron (tanpa batching) untuk pemanggil di luar event loop."""
+        key = self.cache_key(text)
+        vector = self._lookup(key)
+        if vector is None and self._store is not None:
+            vector = self._remember_from_store(key, self._store.get(key))
+        if vector is None:
+            self.metrics["misses"] += 1
+            vector = self._embeddings.embed_query(self.normalize_text(text))
+            self._remember(key, vector)
+            if self._store is not None: self._store.put_many([(key, vector)])
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self.cache_key(text)
+        vector = self._lookup(key)
+        if vector is None and self._store is not None and key not in self._pending:
+            # Store SQLite dibaca di thread agar miss L1 tidak memblokir event loop
+            vector = self._remember_from_store(key, await asyncio.to_thread(self._store.get, key))
+        if vector is not None:
+            return vector
+
+        # Teks yang sama dan sedang menunggu batch cukup menunggu future yang sama
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key][1])
+
+        self.metrics["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = (self.normalize_text(text), future)
+        if len(self._pending) >= self._max_batch_size:
+            # Sama seperti jalur timer, flush berjalan sebagai task sendiri: bila pemanggil ini
+            # dibatalkan, batch tetap dikirim dan pemanggil lain tidak menunggu selamanya
+            task = asyncio.create_task(self._flush())
+            self._full_flushes.add(task)
+            task.add_done_callback(self._full_flushes.discard)
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+        return await asyncio.shield(future)
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self._batch_window)
+        self._flush_task = None
+        await self._flush()
+
+    async def _flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, OrderedDict()
+        keys = list(batch.keys())
+        texts = [batch[k][0] for k in keys]
+        self.metrics["batches"] += 1
+        self.metrics["batched_texts"] += len(texts)
+        try:
+            # input_type tetap "search_query" agar vektor identik dengan embed_query
+            vectors = await self._embeddings.aembed(texts, input_type="search_query")
+        except Exception as e:
+            for _, future in batch.values():
+                if not future.done(): future.set_exception(e)
+            return
+
+        for key, vector in zip(keys, vectors):
+            self._remember(key, vector)
+            future = batch[key][1]
+            if not future.done(): future.set_result(vector)
+        if self._store is not None:
+            await asyncio.to_thread(self._store.put_many, list(zip(keys, vectors)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.metrics, "cached_entries": len(self._cache), "pending": len(self._pending)}
@@ -0,0 +1,42 @@
+"""
+Konfigurasi gunicorn untuk menjalankan beberapa worker yang berbagi model reranker.
+
+    gunicorn -c gunicorn.conf.py Rag_weaviate:app
+
+Dengan preload_app, Rag_weaviate diimpor sekali di proses master; RERANK_PRELOAD
+membuat CrossEncoder dimuat saat import sehingga bobotnya dibagi copy-on-write ke
+semua worker hasil fork (RSS per worker turun, cold start worker tidak memuat model
+lagi). Koneksi Weaviate/Cohere/Groq, koneksi SQLite (cache semantik, store
+embedding), dan inferensi pemanasan tetap dibuat per worker di lifespan setelah
+fork: klien gRPC/HTTP, koneksi SQLite, dan thread pool torch/OpenMP tidak aman
+dibagi lintas fork. `uvicorn --workers` tidak memakai preload, sehingga setiap
+worker memuat modelnya sendiri.
+"""
+import gc
+import os
+
+os.environ.setdefault("RERANK_PRELOAD", "true")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Inisialisasi berjalan di latar belakang lifespan, jadi timeout tidak perlu menampung waktu startup
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+
+def when_ready(server):
+    # Objek yang dibuat saat import dipindah ke generasi permanen: GC di worker tidak
+    # menulis ke header objek tersebut, sehingga halaman memori bersama tidak tersalin
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    threads = os.getenv("RERANK_TORCH_THREADS")
+    if threads:
+        try:
+            import torch
+            torch.set_num_threads(int(threads))
+        except ImportError:
+            pass
@@ -0,0 +1,357 @@
+"""
+Pipeline ingestion offline untuk koleksi dokumen hukum di Weaviate.
+
+Dokumen PDF/DOCX (dan TXT/MD) dibaca per halaman secara streaming, dipotong
+dengan memperhatikan batas pasal (properti: content, source, page, pasal,
+chunk_index), di-embed dalam batch besar dengan cache embedding persisten
+(chunk yang tidak berubah tidak pernah di-embed ulang), lalu di-upsert lewat
+batch import Weaviate dengan paralelisme terbatas.
+
+Re-ingestion bersifat inkremental: UUID objek diturunkan (uuid5) dari sumber,
+halaman, pasal, dan hash isi chunk. Manifest lokal mencatat hash file, UUID, dan
+urutan chunk (chunk_index) per file, dikunci path relatif terhadap folder input,
+sehingga file yang tidak berubah dilewati, hanya chunk baru (atau yang urutannya
+bergeser) yang di-upsert, dan chunk lama yang sudah tidak ada dihapus. Nama
+sumber default adalah path relatif tanpa ekstensi, mis. "2024/uu".
+
+Contoh:
+    python ingest.py dokumen/ --manifest ingest_manifest.json
+    python ingest.py dokumen/peraturan_mutu.pdf --source "Peraturan Mutu 2024"
+    python ingest.py dokumen/ --dry-run
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from embedding_service import EmbeddingStore
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt", ".md")
+PASAL_HEADING_PATTERN = re.compile(r"^\s*pasal\s+(\d+[a-z]?)\s*$", re.IGNORECASE)
+NO_PASAL = "-"
+NAMESPACE = uuid.UUID("3f1c2d7e-5b8a-4c1e-9f4a-6d2b8e0a7c51")
+COHERE_EMBEDDING_MODEL = "embed-multilingual-v3.0"
+COHERE_MAX_BATCH_SIZE = 96
+
+
+# ============================================================================
+# PEMBACAAN DOKUMEN (STREAMING PER HALAMAN)
+# ============================================================================
+def iter_pdf_pages(path: str) -> Iterator[Tuple[int, str]]:
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    for page_number, page in enumerate(reader.pages, 1):
+        yield page_number, page.extract_text() or ""
+
+
+def iter_docx_pages(path: str) -> Iterator[Tuple[int, str]]:
+    """DOCX tidak menyimpan nomor halaman; halaman dihitung dari page break eksplisit."""
+    import docx
+    page_number, lines = 1, []
+    for paragraph in docx.Document(path).paragraphs:
+        breaks = paragraph._p.xpath('.//w:br[@w:type="page"]')
+        lines.append(paragraph.text)
+        if breaks:
+            yield page_number, "\n".join(lines)
+            page_number, lines = page_number + 1, []
+    if lines:
+        yield page_number, "\n".join(lines)
+
+
+def iter_text_pages(path: str) -> Iterator[Tuple[int, str]]:
+    """Teks biasa; form feed (\\f) dianggap pemisah halaman."""
+    with open(path, "r", encoding="utf-8") as f:
+        for page_number, page in enumerate(f.read().split("\f"), 1):
+            yield page_number, page
+
+
+def iter_pages(path: str) -> Iterator[Tuple[int, str]]:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        return iter_pdf_pages(path)
+    if extension == ".docx":
+        return iter_docx_pages(path)
+    return iter_text_pages(path)
+
+
+# ============================================================================
+# CHUNKING SADAR PASAL
+# ============================================================================
+def chunk_pages(pages: Iterable[Tuple[int, str]], source: str, max_chars: int = 1500) -> Iterator[Dict[str, Any]]:
+    """
+    Memotong teks di setiap judul "Pasal N" sehingga satu chunk tidak pernah
+    mencampur dua pasal. Pasal yang panjang dipecah per baris/ayat hingga
+    max_chars. Nomor halaman chunk adalah halaman tempat chunk dimulai.
+    """
+    pasal, buffer, start_page = NO_PASAL, [], None
+
+    def emit():
+        content = "\n".join(buffer).strip()
+        if content:
+            yield {"content": content, "source": source, "page": start_page, "pasal": pasal}
+
+    for page_number, text in pages:
+        for line in text.splitlines():
+            heading = PASAL_HEADING_PATTERN.match(line)
+            if heading:
+                yield from emit()
+                pasal, buffer = heading.group(1), []
+            elif buffer and sum(len(part) + 1 for part in buffer) + len(line) > max_chars:
+                yield from emit()
+                buffer = []
+            if not line.strip() and not buffer:
+                continue
+            if not buffer:
+                start_page = page_number
+            buffer.append(line.strip())
+    yield from emit()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def chunk_uuid(chunk: Dict[str, Any]) -> str:
+    return str(uuid.uuid5(NAMESPACE, f"{chunk['source']}|{chunk['page']}|{chunk['pasal']}|{content_hash(chunk['content'])}"))
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ============================================================================
+# EMBEDDING BATCH DENGAN CACHE PERSISTEN
+# ============================================================================
+class DocumentEmbedder:
+    """embed_documents dalam batch besar; vektor disimpan per hash isi di EmbeddingStore."""
+
+    def __init__(self, embeddings, store: Optional[EmbeddingStore], batch_size: int = COHERE_MAX_BATCH_SIZE, concurrency: int = 4):
+        self._embeddings = embeddings
+        self._store = store
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.metrics = {"cached": 0, "embedded": 0, "batches": 0}
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        keys = [content_hash(text) for text in texts]
+        vectors: List[Optional[List[float]]] = [self._store.get(key) if self._store else None for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        self.metrics["cached"] += len(texts) - len(missing)
+
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            results = executor.map(lambda batch: self._embeddings.embed_documents([texts[i] for i in batch]), batches)
+            for batch, batch_vectors in zip(batches, results):
+                for i, vector in zip(batch, batch_vectors):
+                    vectors[i] = vector
+                if self._store:
+                    self._store.put_many([(keys[i], vectors[i]) for i in batch])
+                self.metrics["embedded"] += len(batch)
+                self.metrics["batches"] += 1
+        return vectors
+
+
+# ============================================================================
+# MANIFEST & SINKRONISASI KE WEAVIATE
+# ============================================================================
+def load_manifest(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"sources": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: Dict[str, Any], path: str) -> None:
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def ensure_collection(client, name: str):
+    """Membuat koleksi (vektor disediakan sendiri) jika belum ada."""
+    from weaviate.classes.config import Configure, DataType, Property, Tokenization
+    if not client.collections.exists(name):
+        client.collections.create(
+            name,
+            vectorizer_config=Configure.Vectorizer.none(),
+            properties=[
+                Property(name="content", data_type=DataType.TEXT),
+                Property(name="source", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+                Property(name="page", data_type=DataType.INT),
+                Property(name="pasal", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+                Property(name="chunk_index", data_type=DataType.INT),
+            ]
+        )
+        print(f"✅ Koleksi '{name}' dibuat.")
+    collection = client.collections.get(name)
+    if not any(prop.name == "chunk_index" for prop in collection.config.get().properties):
+        collection.config.add_property(Property(name="chunk_index", data_type=DataType.INT))
+        print(f"✅ Properti 'chunk_index' ditambahkan ke koleksi '{name}'.")
+    return collection
+
+
+def upsert_chunks(collection, chunks: List[Dict[str, Any]], vectors: List[List[float]], batch_size: int, concurrent_requests: int) -> int:
+    """Batch import Weaviate dengan ukuran batch tetap dan jumlah request paralel terbatas."""
+    with collection.batch.fixed_size(batch_size=batch_size, concurrent_requests=concurrent_requests) as batch:
+        for chunk, vector in zip(chunks, vectors):
+            batch.add_object(
+                properties={"content": chunk["content"], "source": chunk["source"], "page": chunk["page"], "pasal": chunk["pasal"], "chunk_index": chunk["chunk_index"]},
+                uuid=chunk["uuid"],
+                vector=vector
+            )
+    failed = collection.batch.failed_objects
+    for failure in failed[:5]:
+        print(f"⚠️ Gagal upsert: {failure.message}")
+    return len(failed)
+
+
+def delete_objects(collection, object_ids: List[str], batch_size: int = 500) -> None:
+    from weaviate.classes.query import Filter
+    for i in range(0, len(object_ids), batch_size):
+        collection.data.delete_many(where=Filter.by_id().contains_any(object_ids[i:i + batch_size]))
+
+
+def find_manifest_entry(manifest: Dict[str, Any], key: str, path: str) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Entri manifest untuk file; entri format lama (dikunci nama sumber) dicocokkan lewat path absolutnya."""
+    if key in manifest["sources"]:
+        return key, manifest["sources"][key]
+    absolute_path = os.path.abspath(path)
+    for legacy_key, entry in manifest["sources"].items():
+        if "source" not in entry and entry.get("path") == absolute_path:
+            return legacy_key, entry
+    return None, {}
+
+
+def ingest_file(path: str, key: str, source: str, collection, embedder: Optional[DocumentEmbedder], manifest: Dict[str, Any],
+                max_chars: int = 1500, batch_size: int = 200, concurrent_requests: int = 2, force: bool = False, dry_run: bool = False) -> Dict[str, Any]:
+    """Sinkronisasi satu file (kunci manifest: path relatif `key`) ke koleksi; mengembalikan ringkasan perubahan."""
+    started = time.perf_counter()
+    digest = file_hash(path)
+    previous_key, previous = find_manifest_entry(manifest, key, path)
+    if previous_key == key and previous.get("file_hash") == digest and previous.get("source") == source and not force:
+        return {"file": key, "source": source, "status": "unchanged", "seconds": round(time.perf_counter() - started, 2)}
+
+    chunks_by_id: Dict[str, Dict[str, Any]] = {}
+    for chunk_index, chunk in enumerate(chunk_pages(iter_pages(path), source, max_chars)):
+        chunk["uuid"], chunk["chunk_index"] = chunk_uuid(chunk), chunk_index
+        # Chunk identik (sumber, halaman, pasal, isi) cukup disimpan sekali, pada posisi pertamanya
+        chunks_by_id.setdefault(chunk["uuid"], chunk)
+    chunks = list(chunks_by_id.values())
+
+    previous_ids = set(previous.get("object_ids", []))
+    previous_indexes = previous.get("chunk_indexes", {})
+    current_ids = {chunk["uuid"] for chunk in chunks}
+    # Chunk yang isinya tetap tetapi urutannya bergeser ikut di-upsert; vektornya diambil dari cache embedding
+    new_chunks = [chunk for chunk in chunks if force or chunk["uuid"] not in previous_ids or previous_indexes.get(chunk["uuid"]) != chunk["chunk_index"]]
+    stale_ids = sorted(previous_ids - current_ids)
+    summary = {"file": key, "source": source, "status": "dry-run" if dry_run else "updated", "chunks": len(chunks),
+               "upserted": len(new_chunks), "deleted": len(stale_ids), "failed": 0}
+
+    if not dry_run:
+        vectors = embedder.embed([chunk["content"] for chunk in new_chunks]) if new_chunks else []
+        if new_chunks:
+            summary["failed"] = upsert_chunks(collection, new_chunks, vectors, batch_size, concurrent_requests)
+        if stale_ids:
+            delete_objects(collection, stale_ids)
+        if not summary["failed"]:
+            # Manifest hanya diperbarui jika semua objek masuk, agar run berikutnya mengulang yang gagal
+            if previous_key is not None and previous_key != key:
+                del manifest["sources"][previous_key]
+            manifest["sources"][key] = {"source": source, "file_hash": digest, "path": os.path.abspath(path), "object_ids": sorted(current_ids),
+                                        "chunk_indexes": {chunk["uuid"]: chunk["chunk_index"] for chunk in chunks}, "ingested_at": time.time()}
+
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def discover_files(paths: List[str]) -> List[Tuple[str, str]]:
+    """Pasangan (path, kunci); kunci adalah path relatif terhadap folder input (atau nama file untuk input berupa file)."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                        file_path = os.path.join(root, name)
+                        files.append((file_path, os.path.relpath(file_path, path).replace(os.sep, "/")))
+        else:
+            files.append((path, os.path.basename(path)))
+    return files
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Ingestion dokumen PDF/DOCX ke koleksi Weaviate (inkremental, berbasis hash isi).")
+    parser.add_argument("paths", nargs="+", help="File atau folder dokumen (.pdf, .docx, .txt, .md)")
+    parser.add_argument("--source", help="Nama sumber (default: path relatif tanpa ekstensi); hanya untuk satu file")
+    parser.add_argument("--collection", default=None, help="Nama koleksi (default: WEAVIATE_CLASS_NAME)")
+    parser.add_argument("--manifest", default="ingest_manifest.json")
+    parser.add_argument("--embedding-cache", default="document_embeddings.sqlite3", help="Store SQLite embedding dokumen")
+    parser.add_argument("--max-chars", type=int, default=1500, help="Panjang maksimum chunk di dalam satu pasal")
+    parser.add_argument("--embed-batch-size", type=int, default=COHERE_MAX_BATCH_SIZE)
+    parser.add_argument("--embed-concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=200, help="Ukuran batch import Weaviate")
+    parser.add_argument("--concurrent-requests", type=int, default=2, help="Request batch Weaviate paralel")
+    parser.add_argument("--force", action="store_true", help="Proses ulang meski hash file tidak berubah")
+    parser.add_argument("--prune", action="store_true", help="Hapus objek sumber yang ada di manifest tetapi filenya tidak ikut diproses")
+    parser.add_argument("--dry-run", action="store_true", help="Hanya parsing dan chunking, tanpa embedding/upsert")
+    args = parser.parse_args(argv)
+
+    files = discover_files(args.paths)
+    if args.source and len(files) != 1:
+        parser.error("--source hanya dapat dipakai untuk satu file")
+
+    load_dotenv()
+    manifest = load_manifest(args.manifest)
+    client = collection = embedder = None
+    if not args.dry_run:
+        import weaviate
+        from weaviate.classes.init import Auth
+        from langchain_cohere import CohereEmbeddings
+        client = weaviate.connect_to_weaviate_cloud(cluster_url=os.getenv("WEAVIATE_URL"), auth_credentials=Auth.api_key(os.getenv("WEAVIATE_API_KEY")))
+        collection = ensure_collection(client, args.collection or os.getenv("WEAVIATE_CLASS_NAME"))
+        embeddings = CohereEmbeddings(cohere_api_key=os.getenv("COHERE_API_KEY"), model=COHERE_EMBEDDING_MODEL)
+        store = EmbeddingStore(args.embedding_cache, f"{COHERE_EMBEDDING_MODEL}:search_document") if args.embedding_cache else None
+        embedder = DocumentEmbedder(embeddings, store, args.embed_batch_size, args.embed_concurrency)
+
+    try:
+        processed_keys = set()
+        for path, key in files:
+            source = args.source or os.path.splitext(key)[0]
+            processed_keys.add(key)
+            summary = ingest_file(path, key, source, collection, embedder, manifest, args.max_chars, args.batch_size,
+                                  args.concurrent_requests, args.force, args.dry_run)
+            print(f"📄 {json.dumps(summary, ensure_ascii=False)}")
+            if not args.dry_run:
+                save_manifest(manifest, args.manifest)
+
+        if args.prune and not args.dry_run:
+            for key in sorted(set(manifest["sources"]) - processed_keys):
+                delete_objects(collection, manifest["sources"][key]["object_ids"])
+                print(f"🗑️ Sumber dihapus dari koleksi: {manifest['sources'][key].get('source', key)}")
+                del manifest["sources"][key]
+            save_manifest(manifest, args.manifest)
+    finally:
+        if client is not None:
+            client.close()
+
+    if embedder is not None:
+        print(f"✅ Selesai. Embedding: {json.dumps(embedder.metrics)}")
+    # Cache semantik backend mendeteksi perubahan isi koleksi pada pembaruan indeks pasal berikutnya
+    # (PASAL_INDEX_REFRESH_SECONDS); panggil POST /cache/invalidate untuk membuangnya segera.
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+"""
+Siklus hidup aplikasi: status kesiapan (readiness) worker.
+
+Koneksi dan model dimuat di lifespan FastAPI (di latar belakang), lalu worker
+menjalankan inferensi pemanasan sebelum melapor siap lewat /ready. Selama itu
+proses sudah menerima koneksi (liveness /health tetap menjawab), sedangkan
+endpoint pipeline menunggu sebentar dan menjawab 503 jika worker belum siap.
+Jika lifespan tidak dijalankan (mis. ASGI transport di benchmark/tes dengan
+install_components), gerbang kesiapan tidak menahan request.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class Readiness:
+    NOT_STARTED, STARTING, WARMING, READY, FAILED = "not_started", "starting", "warming", "ready", "failed"
+
+    def __init__(self):
+        self.state = self.NOT_STARTED
+        self.error: Optional[str] = None
+        self.steps: Dict[str, float] = {}
+        self._event: Optional[asyncio.Event] = None
+        self._started = 0.0
+        self.ready_after: Optional[float] = None
+
+    def begin(self) -> None:
+        self.state, self.error, self.steps = self.STARTING, None, {}
+        self._event = asyncio.Event()
+        self._started = time.perf_counter()
+
+    async def step(self, name: str, awaitable: Awaitable, required: bool = True) -> Any:
+        """Menjalankan satu langkah startup dan mencatat durasinya. Langkah opsional yang gagal hanya dicatat."""
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        except Exception as e:
+            if required:
+                raise
+            print(f"⚠️ Langkah startup '{name}' gagal, dilewati: {e}")
+        finally:
+            self.steps[name] = round(time.perf_counter() - started, 3)
+
+    def mark_warming(self) -> None:
+        self.state = self.WARMING
+
+    def mark_ready(self) -> None:
+        self.state = self.READY
+        self.ready_after = round(time.perf_counter() - self._started, 3)
+        self._event.set()
+
+    def mark_failed(self, error: Exception) -> None:
+        self.state, self.error = self.FAILED, f"{type(error).__name__}: {error}"
+        self._event.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == self.READY
+
+    @property
+    def serving(self) -> bool:
+        """True jika request boleh diproses sekarang (siap, atau lifespan tidak dipakai)."""
+        return self.state in (self.READY, self.NOT_STARTED)
+
+    async def wait(self, timeout: float) -> bool:
+        """Seperti `serving`, tetapi menunggu hingga `timeout` detik bila startup masih berjalan."""
+        if self.state in (self.STARTING, self.WARMING):
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return self.serving
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"status": self.state, "ready_after_seconds": self.ready_after, "steps_seconds": self.steps, "error": self.error}
+
+
+async def run_startup(readiness: Readiness, initialize: Callable[[], Awaitable[None]], warm_up: Callable[[], Awaitable[None]]) -> None:
+    """Inisialisasi lalu pemanasan; status kesiapan diperbarui di setiap fase."""
+    try:
+        await initialize()
+        readiness.mark_warming()
+        await warm_up()
+        readiness.mark_ready()
+        print(f"✅ Worker siap dalam {readiness.ready_after:.2f} detik.")
+    except Exception as e:
+        print(f"❌ Inisialisasi gagal: {e}")
+        readiness.mark_failed(e)
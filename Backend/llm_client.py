@@ -0,0 +1,473 @@
+"""
+Lapisan klien LLM/embedding yang tahan gangguan.
+
+- Rate limiter token bucket per backend (request/menit dan token/menit). Respons
+  429 dari provider juga menahan bucket selama Retry-After.
+- Circuit breaker per backend: setelah beberapa kegagalan transien berturut-turut
+  backend dilewati sampai masa reset habis, lalu satu request percobaan
+  (half-open) menentukan apakah circuit ditutup kembali.
+- Antrean prioritas terbatas: panggilan interaktif (/ask) selalu didahulukan
+  dari evaluasi batch; jika antrean penuh, request langsung ditolak.
+- Fallback: jika backend utama gagal atau circuit-nya terbuka, panggilan
+  berpindah ke model cadangan (bila dikonfigurasi).
+- Hedging (opsional, nonaktif secara default): panggilan interaktif yang belum
+  menjawab setelah ambang latensi dikirim juga ke model cadangan; yang pertama
+  selesai dipakai. Untuk streaming, perlombaan dihitung sampai token pertama.
+
+Kedalaman antrean, waktu tunggu, dan hasil per backend diekspor ke /metrics.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from enum import IntEnum
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import observability
+from context_builder import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+LLM_QUEUE_DEPTH = observability.registry.register(observability.Gauge(
+    "rag_llm_queue_depth", "Jumlah panggilan yang menunggu slot di antrean prioritas.", ("queue", "priority")))
+LLM_QUEUE_WAIT = observability.registry.register(observability.Histogram(
+    "rag_llm_queue_wait_seconds", "Waktu tunggu di antrean prioritas sebelum panggilan dimulai.", ("queue", "priority")))
+LLM_RATE_LIMIT_WAIT = observability.registry.register(observability.Histogram(
+    "rag_llm_rate_limit_wait_seconds", "Waktu tunggu token bucket per backend.", ("backend",)))
+LLM_CALLS_TOTAL = observability.registry.register(observability.Counter(
+    "rag_llm_calls_total", "Panggilan ke backend LLM/embedding per hasil.", ("backend", "outcome")))
+LLM_HEDGES_TOTAL = observability.registry.register(observability.Counter(
+    "rag_llm_hedges_total", "Panggilan yang di-hedge ke backend cadangan.", ("backend",)))
+
+DEFAULT_RATE_LIMIT_PAUSE = 2.0
+# Error jaringan/timeout tanpa status HTTP yang layak dicoba ulang; error lain (mis. TypeError) adalah bug
+TRANSIENT_ERROR_TYPES: tuple = (asyncio.TimeoutError, TimeoutError, ConnectionError)
+try:
+    import httpx
+    TRANSIENT_ERROR_TYPES += (httpx.TransportError,)
+except ImportError:
+    pass
+# SDK provider (groq, cohere, openai) tidak berbagi base class untuk error koneksinya
+TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "ServiceUnavailableError"}
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+class LLMUnavailableError(RuntimeError):
+    """Tidak ada backend yang dapat melayani panggilan (circuit terbuka atau semua percobaan gagal)."""
+
+
+class QueueFullError(LLMUnavailableError):
+    """Antrean prioritas penuh; request ditolak alih-alih menunggu tanpa batas."""
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or "RateLimit" in type(error).__name__
+
+
+def is_transient(error: Exception) -> bool:
+    """429, 5xx, timeout, dan error jaringan dihitung circuit breaker dan dicoba ulang; error lain tidak."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, TRANSIENT_ERROR_TYPES) or any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def retry_after_seconds(error: Exception) -> float:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return DEFAULT_RATE_LIMIT_PAUSE
+
+
+# ============================================================================
+# RATE LIMITER & CIRCUIT BREAKER
+# ============================================================================
+class TokenBucket:
+    """Bucket dengan laju `per_minute`; 0 berarti tanpa batas (hanya jeda 429 yang berlaku)."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self._tokens = per_minute
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Menunggu sampai `amount` token tersedia (FIFO); mengembalikan lama menunggu."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self.rate <= 0:
+                    break
+                self._refill(now)
+                amount = min(amount, self.capacity)
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    break
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+        return time.monotonic() - started
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    async def acquire(self, token_count: int) -> float:
+        return await self.requests.acquire(1) + await self.tokens.acquire(token_count)
+
+    def pause(self, seconds: float) -> None:
+        self.requests.pause(seconds)
+
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        return self.state != self.OPEN
+
+    def record_success(self) -> None:
+        self.state, self._failures, self._probe_in_flight = self.CLOSED, 0, False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"⚠️ Circuit breaker terbuka setelah {self._failures} kegagalan.")
+            self.state, self._opened_at = self.OPEN, time.monotonic()
+
+    def release_probe(self) -> None:
+        """Dipanggil jika panggilan percobaan dibatalkan sebelum selesai."""
+        self._probe_in_flight = False
+
+
+class Backend:
+    """Satu endpoint model (mis. groq:llama-3.3-70b-versatile) dengan limiter dan breaker sendiri."""
+
+    def __init__(self, name: str, model, limiter: Optional[RateLimiter] = None, breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.model = model
+        self.limiter = limiter or RateLimiter()
+        self.breaker = breaker or CircuitBreaker()
+
+    async def acquire(self, token_count: int) -> None:
+        LLM_RATE_LIMIT_WAIT.observe(await self.limiter.acquire(token_count), backend=self.name)
+
+    def record_failure(self, error: Exception) -> None:
+        rate_limited = is_rate_limited(error)
+        if rate_limited:
+            self.limiter.pause(retry_after_seconds(error))
+        if is_transient(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+        LLM_CALLS_TOTAL.inc(backend=self.name, outcome="rate_limited" if rate_limited else "error")
+
+    def record_success(self) -> None:
+        self.breaker.record_success()
+        LLM_CALLS_TOTAL.inc(backend=self.name, outcome="success")
+
+    def record_cancelled(self) -> None:
+        self.breaker.release_probe()
+        LLM_CALLS_TOTAL.inc(backend=self.name, outcome="cancelled")
+
+
+# ============================================================================
+# ANTREAN PRIORITAS
+# ============================================================================
+class PriorityScheduler:
+    """Slot konkurensi yang dibagikan menurut prioritas (lalu urutan datang), dengan antrean terbatas."""
+
+    def __init__(self, name: str, max_concurrency: int = 16, max_queue: int = 256):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._active = 0
+        self._waiters: List[tuple] = []
+        self._sequence = itertools.count()
+        self.metrics: Dict[str, int] = {"granted": 0, "rejected": 0}
+
+    def _update_depth(self) -> None:
+        for priority in Priority:
+            LLM_QUEUE_DEPTH.set(sum(1 for waiter in self._waiters if waiter[0] == priority), queue=self.name, priority=priority.name.lower())
+
+    async def acquire(self, priority: Priority) -> None:
+        started = time.monotonic()
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                self.metrics["rejected"] += 1
+                raise QueueFullError(f"Antrean {self.name} penuh ({self.max_queue} menunggu).")
+            future = asyncio.get_running_loop().create_future()
+            waiter = (int(priority), next(self._sequence), future)
+            heapq.heappush(self._waiters, waiter)
+            self._update_depth()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.release()  # slot sudah diberikan tepat sebelum pembatalan
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    heapq.heapify(self._waiters)
+                    self._update_depth()
+                raise
+        self.metrics["granted"] += 1
+        LLM_QUEUE_WAIT.observe(time.monotonic() - started, queue=self.name, priority=priority.name.lower())
+
+    def release(self) -> None:
+        self._active -= 1
+        while self._waiters and self._active < self.max_concurrency:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._active += 1
+                future.set_result(None)
+        self._update_depth()
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.metrics, "active": self._active, "waiting": len(self._waiters)}
+
+
+# ============================================================================
+# KLIEN LLM
+# ============================================================================
+class ResilientLLM:
+    """
+    Pengganti langsung objek chat model langchain (ainvoke/astream) di atas daftar
+    backend berurutan: backend pertama adalah model utama, sisanya cadangan. Jika
+    tidak ada cadangan tersisa, error transien (429, 5xx, jaringan) dicoba ulang di
+    backend yang sama setelah Retry-After/backoff, paling banyak `max_retries` kali.
+    """
+
+    def __init__(self, backends: List[Backend], scheduler: PriorityScheduler, hedge_after: Optional[float] = None,
+                 expected_output_tokens: int = 512, max_retries: int = 2, base_backoff: float = 0.5, max_retry_wait: float = 10.0):
+        self.backends = backends
+        self.scheduler = scheduler
+        self.hedge_after = hedge_after
+        self.expected_output_tokens = expected_output_tokens
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_retry_wait = max_retry_wait
+        self.metrics: Dict[str, int] = {"hedged": 0, "fallbacks": 0, "retries": 0, "unavailable": 0}
+
+    def _token_estimate(self, prompt: Any) -> int:
+        return estimate_tokens(str(prompt)) + self.expected_output_tokens
+
+    async def _wait_before_retry(self, backend: Backend, error: Exception, attempt: int) -> bool:
+        """Menunggu sebelum mencoba ulang `backend`; False jika error tidak layak dicoba ulang."""
+        if attempt > self.max_retries or not is_transient(error):
+            return False
+        if is_rate_limited(error):
+            # Limiter backend sudah dijeda selama Retry-After oleh record_failure; acquire berikutnya menunggunya
+            return retry_after_seconds(error) <= self.max_retry_wait and backend.breaker.allow()
+        await asyncio.sleep(min(self.max_retry_wait, self.base_backoff * (2 ** (attempt - 1)) * random.uniform(0.8, 1.2)))
+        return backend.breaker.allow()
+
+    async def _race(self, start: Callable[[Backend], Awaitable[Any]], priority: Priority,
+                    discard: Optional[Callable[[Any], Awaitable[None]]] = None) -> Any:
+        """
+        Menjalankan `start` di backend utama; hedge ke cadangan setelah `hedge_after`
+        (hanya interaktif), dan berpindah ke cadangan berikutnya jika gagal. Hasil
+        sukses yang kalah balapan (selesai bersamaan) diserahkan ke `discard`.
+        """
+        candidates = iter(self.backends)
+        pending: Dict[asyncio.Task, Backend] = {}
+        errors: List[Exception] = []
+        retries = 0
+        hedge_after = self.hedge_after if priority == Priority.INTERACTIVE and len(self.backends) > 1 else None
+
+        def launch_next() -> bool:
+            for backend in candidates:
+                if backend.breaker.allow():
+                    pending[asyncio.create_task(start(backend))] = backend
+                    return True
+            return False
+
+        if not launch_next():
+            self.metrics["unavailable"] += 1
+            raise LLMUnavailableError("Semua backend LLM sedang tidak tersedia (circuit terbuka).")
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge_after = None  # hanya satu hedge per panggilan
+                    if launch_next():
+                        self.metrics["hedged"] += 1
+                        LLM_HEDGES_TOTAL.inc(backend=list(pending.values())[-1].name)
+                    continue
+                failed_backend = None
+                for task in done:
+                    backend = pending.pop(task)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                        failed_backend = backend
+                winners = [task.result() for task in done if task.exception() is None]
+                if winners:
+                    for result in winners[1:]:
+                        if discard is not None: await discard(result)
+                    return winners[0]
+                if pending:
+                    continue
+                if launch_next():
+                    self.metrics["fallbacks"] += 1
+                elif await self._wait_before_retry(failed_backend, errors[-1], retries + 1):
+                    retries += 1
+                    self.metrics["retries"] += 1
+                    pending[asyncio.create_task(start(failed_backend))] = failed_backend
+        finally:
+            for task in pending:
+                task.cancel()
+        self.metrics["unavailable"] += 1
+        raise LLMUnavailableError(f"Semua backend LLM gagal: {errors[-1] if errors else 'tidak ada backend'}")
+
+    async def ainvoke(self, prompt: Any, priority: Priority = Priority.INTERACTIVE, **kwargs) -> Any:
+        token_count = self._token_estimate(prompt)
+
+        async def call(backend: Backend) -> Any:
+            try:
+                await backend.acquire(token_count)
+                response = await backend.model.ainvoke(prompt, **kwargs)
+            except asyncio.CancelledError:
+                backend.record_cancelled()
+                raise
+            except Exception as e:
+                backend.record_failure(e)
+                raise
+            backend.record_success()
+            return response
+
+        await self.scheduler.acquire(priority)
+        try:
+            return await self._race(call, priority)
+        finally:
+            self.scheduler.release()
+
+    async def astream(self, prompt: Any, priority: Priority = Priority.INTERACTIVE, **kwargs) -> AsyncIterator[Any]:
+        """Perlombaan hedging/fallback berlaku sampai token pertama; setelah itu stream tidak berpindah backend."""
+        token_count = self._token_estimate(prompt)
+
+        async def open_stream(backend: Backend) -> tuple:
+            iterator = None
+            try:
+                await backend.acquire(token_count)
+                iterator = backend.model.astream(prompt, **kwargs).__aiter__()
+                first_chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                first_chunk = None
+            except asyncio.CancelledError:
+                backend.record_cancelled()
+                if iterator is not None: await iterator.aclose()
+                raise
+            except Exception as e:
+                backend.record_failure(e)
+                raise
+            return backend, iterator, first_chunk
+
+        async def discard_stream(opened: tuple) -> None:
+            opened[0].record_success()
+            await opened[1].aclose()
+
+        await self.scheduler.acquire(priority)
+        try:
+            backend, iterator, first_chunk = await self._race(open_stream, priority, discard_stream)
+            completed = False
+            try:
+                if first_chunk is not None:
+                    yield first_chunk
+                    async for chunk in iterator:
+                        yield chunk
+                completed = True
+            except Exception as e:
+                backend.record_failure(e)
+                raise
+            finally:
+                # Stream yang dihentikan pemanggil (mis. klien SSE terputus) tidak dihitung gagal
+                if completed: backend.record_success()
+                else: backend.breaker.release_probe()
+                await iterator.aclose()
+        finally:
+            self.scheduler.release()
+
+    def stats(self) -> Dict[str, Any]:
+        states = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+        circuits = {f"circuit_{backend.name}": states[backend.breaker.state] for backend in self.backends}
+        return {**self.metrics, **self.scheduler.stats(), **circuits}
+
+
+# ============================================================================
+# KLIEN EMBEDDING
+# ============================================================================
+class ResilientEmbeddings:
+    """
+    Pembungkus klien embedding: rate limiter, circuit breaker, dan retry dengan
+    backoff untuk aembed. Tanpa fallback model, karena vektor dari model lain
+    tidak sebanding dengan vektor di koleksi.
+    """
+
+    def __init__(self, embeddings, backend_name: str = "embeddings", limiter: Optional[RateLimiter] = None,
+                 breaker: Optional[CircuitBreaker] = None, max_retries: int = 2, base_backoff: float = 0.5):
+        self._embeddings = embeddings
+        self.backend = Backend(backend_name, embeddings, limiter, breaker)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._embeddings, name)
+
+    async def aembed(self, texts: List[str], **kwargs) -> List[List[float]]:
+        attempt = 0
+        while True:
+            if not self.backend.breaker.allow():
+                raise LLMUnavailableError(f"Backend {self.backend.name} sedang tidak tersedia (circuit terbuka).")
+            try:
+                await self.backend.acquire(sum(estimate_tokens(text) for text in texts))
+                vectors = await self._embeddings.aembed(texts, **kwargs)
+            except asyncio.CancelledError:
+                self.backend.record_cancelled()
+                raise
+            except Exception as e:
+                self.backend.record_failure(e)
+                attempt += 1
+                if attempt > self.max_retries or not is_transient(e):
+                    raise
+                await asyncio.sleep(self.base_backoff * (2 ** (attempt - 1)) * random.uniform(0.8, 1.2))
+                continue
+            self.backend.record_success()
+            return vectors
@@ -0,0 +1,452 @@
+"""
+Pengganti lokal untuk Groq, Cohere, dan Weaviate.
+
+Dipakai untuk evaluasi dan benchmark yang harus bisa diulang tanpa memanggil
+layanan berbayar:
+- Recording*: membungkus klien asli dan merekam setiap respons ke kaset JSON.
+- Replay*: memutar ulang respons dari kaset (error jika tidak ada rekaman).
+- Stub*/HashEmbeddings/InMemoryCollection: implementasi deterministik tanpa jaringan.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, Iterable
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+# ============================================================================
+# KASET REKAMAN
+# ============================================================================
+class Cassette:
+    """Penyimpanan rekaman respons (JSON) yang dikunci per jenis panggilan dan masukan."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records: Dict[str, Any] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._records = json.load(f)
+
+    @staticmethod
+    def key(kind: str, payload: Any) -> str:
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return f"{kind}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+    def get(self, kind: str, payload: Any) -> Optional[Any]:
+        return self._records.get(self.key(kind, payload))
+
+    def require(self, kind: str, payload: Any) -> Any:
+        value = self.get(kind, payload)
+        if value is None:
+            raise KeyError(f"Tidak ada rekaman '{kind}' untuk masukan ini di kaset {self.path}")
+        return value
+
+    def put(self, kind: str, payload: Any, value: Any) -> None:
+        with self._lock:
+            self._records[self.key(kind, payload)] = value
+
+    def save(self) -> None:
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._records, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, self.path)
+
+
+# ============================================================================
+# LLM
+# ============================================================================
+def _llm_message(content: str) -> SimpleNamespace:
+    return SimpleNamespace(content=content, usage_metadata=None)
+
+
+class RecordingLLM:
+    def __init__(self, llm, cassette: Cassette):
+        self._llm = llm
+        self._cassette = cassette
+
+    async def ainvoke(self, prompt: str, **kwargs):
+        response = await self._llm.ainvoke(prompt, **kwargs)
+        self._cassette.put("llm", prompt, response.content)
+        return response
+
+    async def astream(self, prompt: str, **kwargs):
+        chunks = []
+        async for chunk in self._llm.astream(prompt, **kwargs):
+            chunks.append(chunk.content)
+            yield chunk
+        self._cassette.put("llm", prompt, "".join(chunks))
+
+
+class ReplayLLM:
+    def __init__(self, cassette: Cassette):
+        self._cassette = cassette
+
+    async def ainvoke(self, prompt: str, **kwargs):
+        return _llm_message(self._cassette.require("llm", prompt))
+
+    async def astream(self, prompt: str, **kwargs):
+        for word in re.split(r"(\s+)", self._cassette.require("llm", prompt)):
+            if word:
+                yield _llm_message(word)
+
+
+class StubLLM:
+    """
+    LLM deterministik dengan latensi yang dapat diatur: jeda awal (time-to-first-token)
+    ditambah jeda per token. Jawaban diambil dari kalimat pertama konteks dokumen.
+    """
+
+    def __init__(self, first_token_latency: float = 0.0, per_token_latency: float = 0.0):
+        self.first_token_latency = first_token_latency
+        self.per_token_latency = per_token_latency
+
+    @staticmethod
+    def _answer_for(prompt: str) -> str:
+        context_match = re.search(r"KONTEKS DOKUMEN[^\n]*:\n(.+?)(?:\n\n|$)", prompt, re.DOTALL)
+        if context_match:
+            first_sentence = re.split(r"(?<=[.!?])\s", context_match.group(1).strip(), maxsplit=1)[0]
+            return f"*PEMIKIRAN:* Konteks tersedia.\n*JAWABAN:* {first_sentence}"
+        return "Halo! Ada yang bisa saya bantu terkait penjaminan mutu?"
+
+    async def ainvoke(self, prompt: str, **kwargs):
+        content = self._answer_for(prompt)
+        await asyncio.sleep(self.first_token_latency + self.per_token_latency * len(content.split()))
+        return _llm_message(content)
+
+    async def astream(self, prompt: str, **kwargs):
+        await asyncio.sleep(self.first_token_latency)
+        for word in re.split(r"(\s+)", self._answer_for(prompt)):
+            if word:
+                if self.per_token_latency and not word.isspace():
+                    await asyncio.sleep(self.per_token_latency)
+                yield _llm_message(word)
+
+
+# ============================================================================
+# EMBEDDING
+# ============================================================================
+class HashEmbeddings:
+    """Embedding deterministik berbasis hashing token (bag-of-words), dinormalisasi L2."""
+
+    def __init__(self, dimensions: int = 256, latency: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in tokenize(text):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] % 2 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed(self, texts: List[str], *, input_type: Optional[str] = None) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    async def aembed(self, texts: List[str], *, input_type: Optional[str] = None) -> List[List[float]]:
+        if self.latency: await asyncio.sleep(self.latency)
+        return self.embed(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed([text]))[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed(texts)
+
+
+class RecordingEmbeddings:
+    def __init__(self, embeddings, cassette: Cassette):
+        self._embeddings = embeddings
+        self._cassette = cassette
+
+    async def aembed(self, texts: List[str], *, input_type: Optional[str] = None) -> List[List[float]]:
+        vectors = await self._embeddings.aembed(texts, input_type=input_type)
+        for text, vector in zip(texts, vectors):
+            self._cassette.put("embedding", [input_type, text], vector)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._embeddings.embed_query(text)
+        self._cassette.put("embedding", ["search_query", text], vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed([text], input_type="search_query"))[0]
+
+
+class ReplayEmbeddings:
+    def __init__(self, cassette: Cassette):
+        self._cassette = cassette
+
+    async def aembed(self, texts: List[str], *, input_type: Optional[str] = None) -> List[List[float]]:
+        return [self._cassette.require("embedding", [input_type, text]) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._cassette.require("embedding", ["search_query", text])
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.embed_query(text)
+
+
+# ============================================================================
+# RERANKER
+# ============================================================================
+class StubCrossEncoder:
+    """Skor relevansi sederhana: proporsi token query yang muncul di passage."""
+
+    def predict(self, pairs: List[List[str]]) -> List[float]:
+        scores = []
+        for query, passage in pairs:
+            query_tokens = set(tokenize(query))
+            passage_tokens = set(tokenize(passage))
+            scores.append(len(query_tokens & passage_tokens) / len(query_tokens) if query_tokens else 0.0)
+        return scores
+
+
+# ============================================================================
+# RIWAYAT OBROLAN
+# ============================================================================
+class InMemoryChatHistory:
+    """Pengganti ChatHistoryService (Firestore) dengan latensi yang dapat diatur."""
+
+    latency = 0.0
+    db = None
+    _chats: Dict[str, Dict[str, Any]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, latency: float = 0.0) -> "type[InMemoryChatHistory]":
+        cls.latency = latency
+        cls._chats = {}
+        return cls
+
+    @classmethod
+    def _wait(cls) -> None:
+        if cls.latency: time.sleep(cls.latency)
+
+    @classmethod
+    def create_chat_session(cls, user_id: str, first_message: str) -> str:
+        cls._wait()
+        chat_id = uuid.uuid4().hex
+        with cls._lock:
+            cls._chats[chat_id] = {"user_id": user_id, "title": first_message[:50], "messages": []}
+        return chat_id
+
+    @classmethod
+    def save_message(cls, user_id: str, chat_id: str, content: str, role: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        cls._wait()
+        with cls._lock:
+            chat = cls._chats.setdefault(chat_id, {"user_id": user_id, "title": content[:50], "messages": []})
+            chat["messages"].append({"role": role, "content": content, "metadata": metadata or {}, "timestamp": time.time()})
+
+    @classmethod
+    def save_messages_batch(cls, writes: List[Dict[str, Any]]) -> None:
+        """Satu round-trip untuk banyak pesan (setara satu WriteBatch Firestore)."""
+        cls._wait()
+        with cls._lock:
+            for write in writes:
+                chat = cls._chats.setdefault(write["chat_id"], {"user_id": write["user_id"], "title": write["content"][:50], "messages": []})
+                chat["messages"].append({"role": write["role"], "content": write["content"], "metadata": write.get("metadata") or {}, "timestamp": write.get("timestamp", time.time()), "message_id": write.get("message_id")})
+
+    @classmethod
+    def get_recent_messages(cls, user_id: str, chat_id: str, limit: int = 4) -> List[Dict[str, Any]]:
+        cls._wait()
+        with cls._lock:
+            return list(cls._chats.get(chat_id, {}).get("messages", [])[-limit:])
+
+    @classmethod
+    def get_chat_messages(cls, user_id: str, chat_id: str) -> List[Dict[str, Any]]:
+        cls._wait()
+        with cls._lock:
+            return list(cls._chats.get(chat_id, {}).get("messages", []))
+
+    @classmethod
+    def get_chat_history(cls, user_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        cls._wait()
+        with cls._lock:
+            chats = [{"id": chat_id, "title": chat["title"]} for chat_id, chat in cls._chats.items() if chat["user_id"] == user_id]
+        return {"today": chats, "yesterday": [], "last7days": [], "older": []}
+
+    @classmethod
+    def delete_chat(cls, user_id: str, chat_id: str) -> bool:
+        with cls._lock:
+            return cls._chats.pop(chat_id, None) is not None
+
+    @classmethod
+    def update_chat_title(cls, user_id: str, chat_id: str, new_title: str) -> bool:
+        with cls._lock:
+            if chat_id not in cls._chats:
+                return False
+            cls._chats[chat_id]["title"] = new_title
+            return True
+
+
+# ============================================================================
+# WEAVIATE
+# ============================================================================
+def _stub_object(properties: Dict[str, Any], object_uuid: str, score: Optional[float] = None, vector: Optional[List[float]] = None) -> SimpleNamespace:
+    return SimpleNamespace(properties=properties, uuid=object_uuid, metadata=SimpleNamespace(score=score), vector=vector)
+
+
+def _serialize_objects(response) -> List[Dict[str, Any]]:
+    return [
+        {"properties": obj.properties, "uuid": str(obj.uuid), "score": getattr(obj.metadata, "score", None) if obj.metadata else None}
+        for obj in response.objects
+    ]
+
+
+def _deserialize_objects(records: List[Dict[str, Any]]) -> SimpleNamespace:
+    return SimpleNamespace(objects=[_stub_object(r["properties"], r["uuid"], r.get("score")) for r in records])
+
+
+def _filter_payload(filters) -> Any:
+    """Representasi filter Weaviate (Filter.by_property(...).equal(...), digabung dengan &) yang stabil."""
+    if filters is None:
+        return None
+    if getattr(filters, "filters", None) is not None:
+        return [_filter_payload(f) for f in filters.filters]
+    return [str(getattr(filters, "target", "")), str(getattr(filters, "value", ""))]
+
+
+def _matches_filter(properties: Dict[str, Any], filters) -> bool:
+    if filters is None:
+        return True
+    if getattr(filters, "filters", None) is not None:
+        return all(_matches_filter(properties, f) for f in filters.filters)
+    return str(properties.get(str(getattr(filters, "target", "")))) == str(getattr(filters, "value", ""))
+
+
+class RecordingCollection:
+    """Membungkus koleksi Weaviate asli; hasil query direkam ke kaset."""
+
+    def __init__(self, collection, cassette: Cassette):
+        self._collection = collection
+        self._cassette = cassette
+        self.query = self
+        self.aggregate = collection.aggregate
+
+    def hybrid(self, query: str, vector=None, alpha: float = 0.5, limit: int = 5, filters=None, **kwargs):
+        response = self._collection.query.hybrid(query=query, vector=vector, alpha=alpha, limit=limit, filters=filters, **kwargs)
+        self._cassette.put("weaviate.hybrid", [query, alpha, limit, _filter_payload(filters)], _serialize_objects(response))
+        return response
+
+    def fetch_objects(self, filters=None, limit: int = 5, **kwargs):
+        response = self._collection.query.fetch_objects(filters=filters, limit=limit, **kwargs)
+        self._cassette.put("weaviate.fetch_objects", [_filter_payload(filters), limit], _serialize_objects(response))
+        return response
+
+    def near_vector(self, near_vector, limit: int = 5, filters=None, **kwargs):
+        return self._collection.query.near_vector(near_vector=near_vector, limit=limit, filters=filters, **kwargs)
+
+    def iterator(self, **kwargs):
+        return self._collection.iterator(**kwargs)
+
+
+class ReplayCollection:
+    """Memutar ulang hasil query Weaviate yang direkam oleh RecordingCollection."""
+
+    def __init__(self, cassette: Cassette):
+        self._cassette = cassette
+        self.query = self
+        self.aggregate = SimpleNamespace(over_all=lambda **kwargs: SimpleNamespace(total_count=0))
+
+    def hybrid(self, query: str, vector=None, alpha: float = 0.5, limit: int = 5, filters=None, **kwargs):
+        return _deserialize_objects(self._cassette.require("weaviate.hybrid", [query, alpha, limit, _filter_payload(filters)]))
+
+    def fetch_objects(self, filters=None, limit: int = 5, **kwargs):
+        return _deserialize_objects(self._cassette.get("weaviate.fetch_objects", [_filter_payload(filters), limit]) or [])
+
+    def near_vector(self, near_vector, limit: int = 5, filters=None, **kwargs):
+        return SimpleNamespace(objects=[])
+
+    def iterator(self, **kwargs):
+        return iter(())
+
+
+class InMemoryCollection:
+    """
+    Koleksi in-memory yang meniru query.hybrid / near_vector / fetch_objects Weaviate.
+    Skor hybrid memakai relative score fusion: skor vektor dan skor keyword
+    dinormalisasi min-max lalu digabung dengan bobot alpha.
+    """
+
+    def __init__(self, objects: List[Dict[str, Any]], embeddings, latency: float = 0.0):
+        self.latency = latency
+        self._objects = []
+        vectors = embeddings.embed([obj.get("content", "") for obj in objects], input_type="search_document")
+        for obj, vector in zip(objects, vectors):
+            properties = {key: obj.get(key) for key in ("content", "source", "page", "pasal")}
+            object_uuid = obj.get("uuid") or str(uuid.uuid5(uuid.NAMESPACE_URL, json.dumps(properties, sort_keys=True, default=str)))
+            self._objects.append(_stub_object(properties, object_uuid, vector=vector))
+        self._token_counts = [Counter(tokenize(obj.properties.get("content") or "")) for obj in self._objects]
+        self.query = self
+        self.aggregate = SimpleNamespace(over_all=lambda **kwargs: SimpleNamespace(total_count=len(self._objects)))
+
+    @classmethod
+    def from_jsonl(cls, path: str, embeddings, latency: float = 0.0) -> "InMemoryCollection":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls([json.loads(line) for line in f if line.strip()], embeddings, latency)
+
+    def _wait(self) -> None:
+        if self.latency: time.sleep(self.latency)
+
+    @staticmethod
+    def _normalize_scores(scores: List[float]) -> List[float]:
+        if not scores:
+            return scores
+        low, high = min(scores), max(scores)
+        return [(s - low) / (high - low) if high > low else (1.0 if high > 0 else 0.0) for s in scores]
+
+    def _vector_scores(self, vector: List[float], candidates: List[int]) -> List[float]:
+        return [sum(a * b for a, b in zip(vector, self._objects[i].vector)) for i in candidates]
+
+    def _keyword_scores(self, query: str, candidates: List[int]) -> List[float]:
+        query_tokens = set(tokenize(query))
+        return [float(sum(self._token_counts[i][t] for t in query_tokens)) for i in candidates]
+
+    def _result(self, ranked: List[tuple], limit: int) -> SimpleNamespace:
+        objects = [_stub_object(self._objects[i].properties, self._objects[i].uuid, score) for i, score in ranked[:limit]]
+        return SimpleNamespace(objects=objects)
+
+    def hybrid(self, query: str, vector=None, alpha: float = 0.5, limit: int = 5, filters=None, **kwargs):
+        self._wait()
+        candidates = [i for i, obj in enumerate(self._objects) if _matches_filter(obj.properties, filters)]
+        vector_scores = self._normalize_scores(self._vector_scores(vector, candidates)) if vector is not None else [0.0] * len(candidates)
+        keyword_scores = self._normalize_scores(self._keyword_scores(query, candidates))
+        fused = [(i, alpha * v + (1 - alpha) * k) for i, v, k in zip(candidates, vector_scores, keyword_scores)]
+        return self._result(sorted(fused, key=lambda item: item[1], reverse=True), limit)
+
+    def near_vector(self, near_vector, limit: int = 5, filters=None, **kwargs):
+        self._wait()
+        candidates = [i for i, obj in enumerate(self._objects) if _matches_filter(obj.properties, filters)]
+        scored = list(zip(candidates, self._vector_scores(near_vector, candidates)))
+        return self._result(sorted(scored, key=lambda item: item[1], reverse=True), limit)
+
+    def fetch_objects(self, filters=None, limit: int = 5, **kwargs):
+        self._wait()
+        matched = [(i, None) for i, obj in enumerate(self._objects) if _matches_filter(obj.properties, filters)]
+        return self._result(matched, limit)
+
+    def iterator(self, return_properties: Optional[Iterable[str]] = None, include_vector: bool = False, **kwargs):
+        for obj in self._objects:
+            properties = {k: obj.properties.get(k) for k in return_properties} if return_properties else obj.properties
+            yield _stub_object(properties, obj.uuid, vector=obj.vector if include_vector else None)
@@ -0,0 +1,254 @@
+"""
+Observabilitas backend: metrik format Prometheus, span bergaya OpenTelemetry,
+dan sink log terstruktur yang asinkron, ter-sampling, dan tidak memblokir.
+
+Tidak ada dependensi tambahan: eksposisi teks Prometheus ditulis langsung,
+sehingga endpoint /metrics dapat di-scrape oleh Prometheus/Grafana Agent apa pun.
+"""
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = ['%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " "))
+             for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# ============================================================================
+# METRIK
+# ============================================================================
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.documentation, self.labelnames = name, documentation, labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.documentation, self.labelnames, self.buckets = name, documentation, labelnames, buckets
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            # [count per bucket..., sum, count]
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+                inf_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf_labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Callback yang memperbarui gauge tepat sebelum scrape (mis. statistik cache)."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"⚠️ Collector metrik gagal: {e}")
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+registry = MetricsRegistry()
+STAGE_DURATION = registry.register(Histogram(
+    "rag_stage_duration_seconds", "Durasi setiap tahap pipeline RAG.", ("stage", "pattern")))
+REQUEST_DURATION = registry.register(Histogram(
+    "rag_http_request_duration_seconds", "Durasi total request HTTP.", ("method", "path", "status")))
+QUERIES_TOTAL = registry.register(Counter(
+    "rag_queries_total", "Jumlah pertanyaan per pola respons.", ("pattern",)))
+DEGRADED_STAGES_TOTAL = registry.register(Counter(
+    "rag_degraded_stages_total", "Tahap yang dilewati karena timeout/error.", ("stage",)))
+LLM_TOKENS_TOTAL = registry.register(Counter(
+    "rag_llm_tokens_total", "Jumlah token LLM.", ("direction", "pattern")))
+PROMPT_TOKENS_ESTIMATED = registry.register(Counter(
+    "rag_prompt_tokens_estimated_total", "Perkiraan token konteks/histori sebelum dan sesudah kompresi.", ("part", "phase")))
+LOG_RECORDS_DROPPED = registry.register(Counter(
+    "rag_log_records_dropped_total", "Record log yang dibuang karena antrean sink penuh.", ("sink",)))
+COMPONENT_STATS = registry.register(Gauge(
+    "rag_component_stat", "Statistik internal komponen (cache, batching).", ("component", "stat")))
+
+
+def observe_timings(timings) -> None:
+    """Memasukkan StageTimings satu request ke histogram per tahap dan pola."""
+    pattern = timings.pattern or "unknown"
+    QUERIES_TOTAL.inc(pattern=pattern)
+    for stage, seconds in timings.stages.items():
+        STAGE_DURATION.observe(seconds, stage=stage, pattern=pattern)
+    for stage in timings.degraded:
+        DEGRADED_STAGES_TOTAL.inc(stage=stage)
+    for part in ("context", "history"):
+        for phase in ("before", "after"):
+            tokens = timings.attributes.get(f"{part}.tokens_{phase}")
+            if tokens:
+                PROMPT_TOKENS_ESTIMATED.inc(tokens, part=part, phase=phase)
+    for direction in ("input", "output"):
+        tokens = timings.attributes.get(f"llm.{direction}_tokens")
+        if tokens:
+            LLM_TOKENS_TOTAL.inc(tokens, direction=direction, pattern=pattern)
+
+
+# ============================================================================
+# SINK LOG TERSTRUKTUR
+# ============================================================================
+class StructuredLogSink:
+    """
+    Sink JSON-lines yang ditulis oleh thread latar belakang. emit() tidak pernah
+    memblokir: record di-sampling, dan jika antrean penuh record dibuang (dan dihitung).
+    Tanpa `path` sink nonaktif (no-op). File dirotasi setelah `max_bytes`
+    (path.1 ... path.N); worker lain yang masih menulis ke file lama membuka ulang path.
+    """
+
+    def __init__(self, name: str, path: Optional[str] = None, sample_rate: float = 1.0, max_queue: int = 10000,
+                 max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5):
+        self.name = name
+        self.path = path
+        self.sample_rate = sample_rate if path else 0.0
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._max_queue = max_queue
+        self._thread: Optional[threading.Thread] = None
+        if not self.enabled:
+            return
+        self._start_writer()
+        # Thread tidak ikut ter-fork (mis. gunicorn preload_app): proses anak memulai writer sendiri
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._start_writer)
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def _start_writer(self) -> None:
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=self._max_queue)
+        self._thread = threading.Thread(target=self._write_loop, name=f"log-sink-{self.name}", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        if not self.enabled or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return
+        try:
+            self._queue.put_nowait({"ts": time.time(), **record})
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(sink=self.name)
+
+    def _rotate_if_needed(self, output):
+        """Merotasi file yang melewati max_bytes; membuka ulang path jika file sudah dirotasi proses lain."""
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            current = None
+        if current is not None and current.st_size >= self.max_bytes and self.max_bytes > 0:
+            output.close()
+            for index in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{index}"):
+                    os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+            if self.backup_count > 0:
+                os.replace(self.path, f"{self.path}.1")
+            else:
+                os.remove(self.path)
+            return open(self.path, "a", encoding="utf-8")
+        if current is None or not os.path.samestat(current, os.fstat(output.fileno())):
+            output.close()
+            return open(self.path, "a", encoding="utf-8")
+        return output
+
+    def _write_loop(self) -> None:
+        output = open(self.path, "a", encoding="utf-8")
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            output.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            # Flush (dan cek rotasi) hanya saat antrean kosong agar burst ditulis sekaligus
+            if self._queue.empty():
+                output.flush()
+                output = self._rotate_if_needed(output)
+        output.close()
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+def timings_to_spans(timings, name: str) -> Dict[str, Any]:
+    """Mengubah StageTimings menjadi trace bergaya OpenTelemetry: satu root span dan child span per tahap."""
+    root_span_id = f"{random.getrandbits(64):016x}"
+    spans = [{
+        "trace_id": timings.trace_id, "span_id": root_span_id, "parent_span_id": None, "name": name,
+        "start_time": timings.started_at, "duration_ms": round(timings.total * 1000, 2),
+        "attributes": {"rag.pattern": timings.pattern, **timings.attributes},
+    }]
+    for span in timings.spans:
+        spans.append({
+            "trace_id": timings.trace_id, "span_id": f"{random.getrandbits(64):016x}", "parent_span_id": root_span_id,
+            "name": span["stage"], "start_time": timings.started_at + span["offset"], "duration_ms": round(span["duration"] * 1000, 2),
+            "attributes": {"rag.degraded": span["stage"] in timings.degraded},
+        })
+    return {"type": "trace", "spans": spans}
@@ -0,0 +1,86 @@
+"""
+Indeks pasal in-memory.
+
+Memetakan nomor pasal (dan opsional nama dokumen sumber) ke potongan-potongan
+dokumennya yang sudah terurut, sehingga PASAL_QUERY cukup dijawab dengan lookup
+dictionary tanpa embedding maupun vector search.
+"""
+import re
+import time
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Iterable
+
+from langchain.schema import Document
+
+PASAL_NUMBER_PATTERN = re.compile(r"(?:pasal\s+(?:ke[\s-]*)?|ps\s*\.?\s*)(\d+(?:\s*(?:,|dan|&)\s*\d+)*)", re.IGNORECASE)
+
+
+def extract_pasal_numbers(message: str) -> List[str]:
+    """Mengambil semua nomor pasal dari pesan, mis. "pasal 5 dan 7, pasal 9" -> ["5", "7", "9"]."""
+    numbers: List[str] = []
+    for group in PASAL_NUMBER_PATTERN.findall(message):
+        for number in re.findall(r"\d+", group):
+            if number not in numbers:
+                numbers.append(number)
+    return numbers
+
+
+def _page_sort_key(page: Any) -> tuple:
+    page_text = str(page)
+    return (0, int(page_text), "") if page_text.isdigit() else (1, 0, page_text)
+
+
+def _chunk_sort_key(doc: Document) -> tuple:
+    """Urutan dokumen: sumber, halaman, lalu chunk_index dari ingest (objek lama tanpa chunk_index di akhir halaman)."""
+    chunk_index = doc.metadata.get("chunk_index")
+    return (str(doc.metadata.get("source", "")), _page_sort_key(doc.metadata.get("page", "")),
+            (0, int(chunk_index)) if chunk_index is not None else (1, 0))
+
+
+class PasalIndex:
+    """Pemetaan pasal -> potongan terurut, dibangun ulang secara berkala di latar belakang."""
+
+    def __init__(self, max_chunks_per_pasal: int = 5):
+        self.max_chunks_per_pasal = max_chunks_per_pasal
+        self._index: Dict[str, List[Document]] = {}
+        self.built_at: Optional[float] = None
+        self.metrics = {"hits": 0, "misses": 0, "builds": 0}
+
+    @property
+    def is_ready(self) -> bool:
+        return self.built_at is not None
+
+    @staticmethod
+    def normalize_pasal(pasal: Any) -> str:
+        return str(pasal).strip().lstrip("0") or "0"
+
+    def rebuild(self, documents: Iterable[Document]) -> int:
+        grouped: Dict[str, List[Document]] = defaultdict(list)
+        for doc in documents:
+            pasal = doc.metadata.get("pasal")
+            if pasal is None or str(pasal).strip() in ("", "-"):
+                continue
+            grouped[self.normalize_pasal(pasal)].append(doc)
+
+        for docs in grouped.values():
+            docs.sort(key=_chunk_sort_key)
+
+        # Pertukaran referensi atomik: pembaca lama tetap melihat indeks yang konsisten
+        self._index = dict(grouped)
+        self.built_at = time.time()
+        self.metrics["builds"] += 1
+        return len(self._index)
+
+    def lookup(self, pasal_number: str, source: Optional[str] = None) -> Optional[List[Document]]:
+        """Mengembalikan potongan pasal, atau None jika indeks belum siap / pasal tidak dikenal."""
+        docs = self._index.get(self.normalize_pasal(pasal_number)) if self.is_ready else None
+        if docs and source:
+            docs = [doc for doc in docs if doc.metadata.get("source") == source]
+        if not docs:
+            self.metrics["misses"] += 1
+            return None
+        self.metrics["hits"] += 1
+        return docs[:self.max_chunks_per_pasal]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.metrics, "pasal_count": len(self._index), "built_at": self.built_at}
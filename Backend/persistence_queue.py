@@ -0,0 +1,156 @@
+"""
+Write-behind untuk riwayat obrolan.
+
+Pesan pengguna dan asisten dimasukkan ke antrean dan request langsung kembali;
+task latar belakang mengumpulkan tulisan dari banyak request dalam satu jendela
+singkat lalu menyimpannya sekaligus: save_messages_batch jika layanan riwayat
+menyediakannya, selain itu save_message berurutan di dalam satu job worker
+(satu hop thread per batch, bukan per pesan). Setiap pesan mendapat message_id
+sendiri (disimpan di metadata) agar overlay dapat mengenali pesan yang sudah
+terbaca dari Firestore tanpa membandingkan isi. Penulisan yang gagal
+di-retry dengan backoff eksponensial. Selama belum tersimpan, pesan tetap
+terlihat lewat overlay read-your-writes sehingga follow-up di chat yang sama
+tetap mendapat histori lengkap.
+"""
+import asyncio
+import logging
+import random
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RunBlocking = Callable[..., Awaitable[Any]]
+
+
+def message_id_of(message: Dict[str, Any]) -> Optional[str]:
+    """message_id pesan hasil baca; save_message menyimpannya di metadata."""
+    return message.get("message_id") or (message.get("metadata") or {}).get("message_id")
+
+
+def save_messages_sequentially(service, writes: List[Dict[str, Any]]) -> None:
+    """
+    Menyimpan batch lewat save_message layanan riwayat dalam satu job worker, sehingga
+    efek samping layanan (mis. pembaruan sesi chat) tetap terjadi untuk setiap pesan.
+    """
+    for write in writes:
+        if write.get("saved"):
+            continue  # sudah tersimpan pada percobaan sebelumnya, jangan ditulis ulang saat retry
+        metadata = {**(write["metadata"] or {}), "message_id": write["message_id"]}
+        service.save_message(write["user_id"], write["chat_id"], write["content"], write["role"], metadata)
+        write["saved"] = True
+
+
+class ChatWriteBehindQueue:
+    def __init__(self, get_service: Callable[[], Any], run_blocking: RunBlocking, flush_interval_ms: float = 50,
+                 max_batch_size: int = 200, max_retries: int = 5, base_backoff: float = 0.5):
+        self._get_service = get_service
+        self._run_blocking = run_blocking
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self._pending: List[Dict[str, Any]] = []
+        self._overlay: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.metrics: Dict[str, int] = {"enqueued": 0, "flushed": 0, "batches": 0, "retries": 0, "failed": 0}
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    def enqueue_turn(self, user_id: str, chat_id: str, messages: List[Dict[str, Any]]) -> None:
+        """messages: daftar {"content", "role", "metadata"} dalam urutan penyimpanan."""
+        self._ensure_started()
+        for message in messages:
+            write = {"user_id": user_id, "chat_id": chat_id, "content": message["content"], "role": message["role"],
+                     "metadata": message.get("metadata"), "timestamp": message.get("timestamp") or time.time(),
+                     "message_id": message.get("message_id") or uuid.uuid4().hex}
+            self._pending.append(write)
+            self._overlay[chat_id].append(write)
+        self.metrics["enqueued"] += len(messages)
+        self._wakeup.set()
+
+    def merge_recent(self, chat_id: str, persisted: List[Dict[str, Any]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Menambahkan pesan yang belum tersimpan ke hasil baca dari layanan riwayat."""
+        unflushed = self._overlay.get(chat_id)
+        if not unflushed:
+            return persisted
+        # Batch yang sedang ditulis bisa sudah terbaca dari Firestore; kenali lewat message_id, bukan isi,
+        # agar pesan berulang yang sah (mis. "ya" dua kali) tidak ikut terbuang
+        persisted_ids = {message_id_of(msg) for msg in persisted[-len(unflushed):]}
+        extra = [{"role": write["role"], "content": write["content"], "metadata": write["metadata"] or {}, "timestamp": write["timestamp"], "message_id": write["message_id"]}
+                 for write in unflushed if write["message_id"] not in persisted_ids]
+        merged = list(persisted) + extra
+        return merged[-limit:] if limit else merged
+
+    def discard_chat(self, chat_id: str) -> None:
+        """Membatalkan tulisan yang belum tersimpan untuk chat yang dihapus."""
+        self._pending = [write for write in self._pending if write["chat_id"] != chat_id]
+        self._overlay.pop(chat_id, None)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if not self._closing:
+                # Jendela singkat agar tulisan dari request-request bersamaan tergabung dalam satu batch
+                await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            await self._drain()
+            if self._closing:
+                return
+
+    async def _flush_batch(self) -> None:
+        batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+        attempt = 0
+        while True:
+            try:
+                await self._write(batch)
+                break
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    logger.error(f"⚠ Gagal menyimpan {len(batch)} pesan riwayat obrolan setelah {self.max_retries} retry: {e}")
+                    self.metrics["failed"] += len(batch)
+                    break
+                self.metrics["retries"] += 1
+                await asyncio.sleep(self.base_backoff * (2 ** (attempt - 1)) * random.uniform(0.8, 1.2))
+        flushed_ids = {id(write) for write in batch}
+        for chat_id in {write["chat_id"] for write in batch}:
+            remaining = [write for write in self._overlay.get(chat_id, []) if id(write) not in flushed_ids]
+            if remaining:
+                self._overlay[chat_id] = remaining
+            else:
+                self._overlay.pop(chat_id, None)
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        service = self._get_service()
+        if hasattr(service, "save_messages_batch"):
+            await self._run_blocking(service.save_messages_batch, batch)
+        else:
+            await self._run_blocking(save_messages_sequentially, service, batch)
+        self.metrics["flushed"] += len(batch)
+        self.metrics["batches"] += 1
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Menulis semua sisa antrean (termasuk batch yang sedang ditulis) saat shutdown."""
+        self._closing = True
+        running = self._task is not None and not self._task.done()
+        if running:
+            self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task) if running else self._drain(), timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠ {len(self._pending)} pesan riwayat obrolan belum tersimpan saat shutdown.")
+
+    async def _drain(self) -> None:
+        while self._pending:
+            await self._flush_batch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.metrics, "pending": len(self._pending), "overlay_chats": len(self._overlay)}
@@ -0,0 +1,83 @@
+"""
+Utilitas pipeline bertahap: setiap tahap dijalankan dengan batas waktu sendiri,
+waktunya dicatat, dan tahap yang boleh gagal diganti nilai default
+(graceful degradation) alih-alih menggagalkan seluruh request.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_NO_DEFAULT = object()
+
+
+class StageTimings:
+    """
+    Catatan durasi per tahap (dalam detik) untuk satu request, beserta pola respons,
+    atribut (mis. jumlah token LLM), dan offset mulai tiap tahap untuk span tracing.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.degraded: List[str] = []
+        self.pattern: Optional[str] = None
+        self.attributes: Dict[str, Any] = {}
+        self.spans: List[Dict[str, Any]] = []
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+
+    def record(self, stage: str, seconds: float, started: Optional[float] = None) -> None:
+        """`started` adalah nilai time.perf_counter() saat tahap dimulai (opsional)."""
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        offset = (started if started is not None else time.perf_counter() - seconds) - self._started
+        self.spans.append({"stage": stage, "offset": offset, "duration": seconds})
+
+    def add_attribute(self, key: str, value: Any) -> None:
+        """Atribut numerik dijumlahkan (mis. token dari beberapa panggilan LLM)."""
+        if isinstance(value, (int, float)) and isinstance(self.attributes.get(key), (int, float)):
+            value = self.attributes[key] + value
+        self.attributes[key] = value
+
+    def mark_degraded(self, stage: str) -> None:
+        self.degraded.append(stage)
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self._started
+
+    def as_header(self) -> str:
+        """Format ringkas untuk header X-Stage-Timings, mis. "retrieval=412.3;history=88.1" (ms)."""
+        return ";".join(f"{stage}={seconds * 1000:.1f}" for stage, seconds in self.stages.items())
+
+    def summary(self) -> str:
+        parts = [f"{stage}: {seconds:.3f}s" for stage, seconds in self.stages.items()]
+        if self.degraded:
+            parts.append(f"terdegradasi: {', '.join(self.degraded)}")
+        return " | ".join(parts)
+
+
+async def run_stage(stage: str, awaitable: Awaitable, timings: Optional[StageTimings] = None,
+                    timeout: Optional[float] = None, default: Any = _NO_DEFAULT) -> Any:
+    """
+    Menjalankan satu tahap pipeline. Jika `default` diberikan, timeout atau error
+    pada tahap ini tidak menggagalkan request: nilai default dikembalikan dan
+    tahap ditandai terdegradasi.
+    """
+    start = time.perf_counter()
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except Exception as e:
+        if default is _NO_DEFAULT:
+            raise
+        reason = "timeout" if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}"
+        logger.warning(f"⚠️ Tahap '{stage}' dilewati ({reason}), melanjutkan tanpa hasilnya.")
+        if timings is not None:
+            timings.mark_degraded(stage)
+        return default
+    finally:
+        if timings is not None:
+            timings.record(stage, time.perf_counter() - start, start)
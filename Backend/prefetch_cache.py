@@ -0,0 +1,150 @@
+"""
+Cache retrieval spekulatif per sesi.
+
+Selagi pengguna mengetik, frontend mengirim potongan query (debounce) ke
+/prefetch. Hybrid search + rerank dijalankan di latar belakang dan hasilnya
+disimpan singkat (TTL) per sesi. Saat /ask datang dengan query yang sama atau
+embedding-nya cukup mirip dengan query prefetch, dokumen hasil prefetch dipakai
+langsung dan pipeline lanjut ke pembuatan jawaban. Satu sesi hanya menyimpan
+satu prefetch (yang terbaru); prefetch lama yang masih berjalan dibatalkan.
+Jumlah prefetch yang berjalan bersamaan dibatasi `max_in_flight`; prefetch baru
+saat semua slot terpakai ditolak (bukan diantrekan) agar tidak bersaing dengan /ask.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import numpy as np
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+EmbedQuery = Callable[[str], Awaitable[List[float]]]
+RetrieveDocuments = Callable[[str, List[float]], Awaitable[List[Document]]]
+
+
+def _normalize(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class PrefetchEntry:
+    __slots__ = ("query", "embedding", "task", "created_at")
+
+    def __init__(self, query: str):
+        self.query = query
+        # Diisi begitu embedding selesai, sebelum retrieval rampung
+        self.embedding: Optional[np.ndarray] = None
+        self.task: Optional[asyncio.Task] = None
+        self.created_at = time.monotonic()
+
+
+class PrefetchCache:
+    def __init__(self, ttl_seconds: float = 30.0, similarity_threshold: float = 0.9, max_sessions: int = 10000,
+                 max_in_flight: int = 4):
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.max_sessions = max_sessions
+        self.max_in_flight = max_in_flight
+        self._entries: "OrderedDict[str, PrefetchEntry]" = OrderedDict()
+        self._running: Set[asyncio.Task] = set()
+        self.metrics: Dict[str, int] = {"started": 0, "deduplicated": 0, "rejected": 0, "cancelled": 0, "hits": 0, "misses": 0, "expired": 0, "failed": 0}
+
+    def start(self, session_id: str, query: str, embed_query: EmbedQuery, retrieve: RetrieveDocuments) -> str:
+        """
+        Menjadwalkan prefetch. Mengembalikan "scheduled", "duplicate" (query yang sama untuk
+        sesi ini masih segar), atau "busy" (semua slot prefetch sedang berjalan).
+        """
+        current = self._entries.get(session_id)
+        if current is not None and _normalize(current.query) == _normalize(query) and not self._expired(current):
+            self.metrics["deduplicated"] += 1
+            return "duplicate"
+        self._drop(session_id)
+        self._discard_expired()
+        if len(self._running) >= self.max_in_flight:
+            self.metrics["rejected"] += 1
+            return "busy"
+        entry = PrefetchEntry(query)
+        entry.task = asyncio.create_task(self._run(entry, embed_query, retrieve))
+        self._running.add(entry.task)
+        entry.task.add_done_callback(self._running.discard)
+        self._entries[session_id] = entry
+        while len(self._entries) > self.max_sessions:
+            self._drop(next(iter(self._entries)))
+        self.metrics["started"] += 1
+        return "scheduled"
+
+    async def _run(self, entry: PrefetchEntry, embed_query: EmbedQuery, retrieve: RetrieveDocuments) -> Optional[List[Document]]:
+        try:
+            embedding = await embed_query(entry.query)
+            entry.embedding = np.asarray(embedding, dtype=np.float32)
+            return await retrieve(entry.query, embedding)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Prefetch retrieval gagal: {e}")
+            self.metrics["failed"] += 1
+            return None
+
+    def has_pending(self, session_id: Optional[str]) -> bool:
+        return bool(session_id) and session_id in self._entries
+
+    async def take(self, session_id: str, query: str, embedding: Optional[List[float]] = None, embed_query: Optional[EmbedQuery] = None) -> Optional[List[Document]]:
+        """
+        Mengambil (dan mengonsumsi) hasil prefetch sesi jika query cocok. Prefetch yang
+        cocok tetapi masih berjalan ditunggu karena sebagian kerjanya sudah selesai.
+        Embedding query hanya dihitung (lewat `embed_query`) bila teksnya tidak sama persis.
+        """
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            self.metrics["expired"] += 1
+            entry.task.cancel()
+            return None
+        if embedding is None and embed_query is not None and entry.embedding is not None and _normalize(entry.query) != _normalize(query):
+            embedding = await embed_query(query)
+        if not self._matches(entry, query, embedding):
+            self.metrics["misses"] += 1
+            entry.task.cancel()
+            return None
+        try:
+            documents = await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            if not entry.task.cancelled():
+                raise  # request /ask sendiri yang dibatalkan
+            documents = None
+        if not documents:
+            self.metrics["misses"] += 1
+            return None
+        self.metrics["hits"] += 1
+        return documents
+
+    def _matches(self, entry: PrefetchEntry, query: str, embedding: Optional[List[float]]) -> bool:
+        if _normalize(entry.query) == _normalize(query):
+            return True
+        if entry.embedding is None or embedding is None:
+            return False
+        query_vector = np.asarray(embedding, dtype=np.float32)
+        denominator = float(np.linalg.norm(entry.embedding) * np.linalg.norm(query_vector))
+        return denominator > 0 and float(entry.embedding @ query_vector) / denominator >= self.similarity_threshold
+
+    def _expired(self, entry: PrefetchEntry) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def _drop(self, session_id: str) -> None:
+        entry = self._entries.pop(session_id, None)
+        if entry is not None and entry.task is not None and not entry.task.done():
+            entry.task.cancel()
+            self._running.discard(entry.task)  # slot langsung bebas; task berhenti di await berikutnya
+            self.metrics["cancelled"] += 1
+
+    def _discard_expired(self) -> None:
+        # Entri tersusun menurut waktu dibuat, jadi yang kedaluwarsa selalu di depan
+        while self._entries and self._expired(next(iter(self._entries.values()))):
+            self._drop(next(iter(self._entries)))
+            self.metrics["expired"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.metrics, "sessions": len(self._entries), "in_flight": len(self._running)}
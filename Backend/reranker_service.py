@@ -0,0 +1,114 @@
+"""
+Layanan reranking dengan dynamic micro-batching untuk CrossEncoder.
+
+Pasangan (query, passage) dari request yang datang bersamaan dikumpulkan ke
+satu batch bersama (dibatasi ukuran maksimum dan waktu tunggu maksimum), lalu
+diskor sekaligus di satu thread worker khusus. Skor yang sudah pernah dihitung
+disimpan per (hash query, weaviate_id) sehingga passage yang sama tidak diskor ulang.
+"""
+import asyncio
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+
+def load_cross_encoder(model_name: str, backend: str = "torch", onnx_file: Optional[str] = None):
+    """
+    Memuat CrossEncoder. Backend "onnx" memakai ONNX Runtime di CPU; onnx_file dapat
+    menunjuk model terkuantisasi, mis. "onnx/model_qint8_avx512_vnni.onnx".
+    """
+    from sentence_transformers import CrossEncoder
+    if backend == "torch":
+        return CrossEncoder(model_name)
+    model_kwargs = {"file_name": onnx_file} if onnx_file else None
+    return CrossEncoder(model_name, backend=backend, model_kwargs=model_kwargs)
+
+
+class RerankerService:
+    """Mengumpulkan pasangan dari banyak pemanggil dan menjalankannya sebagai satu batch."""
+
+    def __init__(self, cross_encoder, max_batch_size: int = 64, max_wait_ms: float = 5, score_cache_size: int = 10000):
+        self._cross_encoder = cross_encoder
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-rerank")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_task: Optional[asyncio.Task] = None
+        self._score_cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._score_cache_size = score_cache_size
+        self.metrics = {"batches": 0, "scored_pairs": 0, "cache_hits": 0, "max_batch_seen": 0}
+
+    @staticmethod
+    def query_hash(query: str) -> str:
+        return hashlib.sha1(" ".join(query.split()).casefold().encode("utf-8")).hexdigest()
+
+    def _ensure_worker(self) -> None:
+        if self._worker_task is None or self._worker_task.done():
+            self._queue = asyncio.Queue()
+            self._worker_task = asyncio.create_task(self._batch_loop())
+
+    async def score(self, query: str, passages: List[str], passage_ids: Optional[List[Optional[str]]] = None) -> List[float]:
+        """Mengembalikan skor CrossEncoder untuk setiap passage, sesuai urutan masukan."""
+        if not passages:
+            return []
+        passage_ids = passage_ids or [None] * len(passages)
+        qhash = self.query_hash(query)
+        scores: List[Optional[float]] = [None] * len(passages)
+        futures = []
+        loop = asyncio.get_running_loop()
+        self._ensure_worker()
+
+        for i, (passage, passage_id) in enumerate(zip(passages, passage_ids)):
+            cache_key = (qhash, passage_id) if passage_id else None
+            if cache_key and cache_key in self._score_cache:
+                self._score_cache.move_to_end(cache_key)
+                scores[i] = self._score_cache[cache_key]
+                self.metrics["cache_hits"] += 1
+                continue
+            future = loop.create_future()
+            self._queue.put_nowait(((query, passage), future))
+            futures.append((i, cache_key, future))
+
+        for i, cache_key, future in futures:
+            scores[i] = await future
+            if cache_key:
+                self._score_cache[cache_key] = scores[i]
+                while len(self._score_cache) > self._score_cache_size:
+                    self._score_cache.popitem(last=False)
+        return scores
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(batch) < self._max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            pairs = [list(pair) for pair, _ in batch]
+            self.metrics["batches"] += 1
+            self.metrics["scored_pairs"] += len(pairs)
+            self.metrics["max_batch_seen"] = max(self.metrics["max_batch_seen"], len(pairs))
+            try:
+                batch_scores = await loop.run_in_executor(self._executor, self._cross_encoder.predict, pairs)
+                for (_, future), score in zip(batch, batch_scores):
+                    if not future.done(): future.set_result(float(score))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done(): future.set_exception(e)
+
+    def stats(self) -> Dict[str, Any]:
+        avg_batch = self.metrics["scored_pairs"] / self.metrics["batches"] if self.metrics["batches"] else 0.0
+        return {**self.metrics, "avg_batch_size": avg_batch, "score_cache_entries": len(self._score_cache)}
+
+    async def close(self) -> None:
+        if self._worker_task is not None:
+            self._worker_task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
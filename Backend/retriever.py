@@ -0,0 +1,253 @@
+"""
+Antarmuka retriever yang dapat diganti: Weaviate Cloud atau indeks lokal in-process.
+
+WeaviateRetriever membungkus koleksi Weaviate (atau pengganti dengan API yang sama).
+LocalRetriever memuat snapshot koleksi ke memori: matriks vektor float32 yang
+di-memory-map dan indeks terbalik BM25, lalu mereproduksi hybrid search Weaviate
+(fusi relativeScore berbobot alpha) serta filter kesamaan properti, tanpa
+round-trip jaringan. Snapshot diekspor dari koleksi Weaviate:
+
+    python retriever.py export weaviate_snapshot/
+"""
+import abc
+import json
+import math
+import os
+import re
+import shutil
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain.schema import Document
+
+PROPERTIES = ["content", "source", "page", "pasal", "chunk_index"]
+# Properti teks yang ikut diindeks BM25 (Weaviate mencari di semua properti teks)
+KEYWORD_PROPERTIES = ["content", "source", "pasal"]
+TOKEN_PATTERN = re.compile(r"\w+")
+# Jumlah kandidat per sub-pencarian sebelum fusi, mengikuti batas default hybrid Weaviate
+HYBRID_CANDIDATES = 100
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _to_document(properties: Dict[str, Any], object_id: str, score: Optional[float] = None) -> Document:
+    metadata = {**properties, "weaviate_id": object_id}
+    if score is not None:
+        metadata["hybrid_score"] = score
+    return Document(page_content=properties.get("content", ""), metadata=metadata)
+
+
+class Retriever(abc.ABC):
+    """Kontrak retriever. Semua metode sinkron; pemanggil async menjalankannya lewat run_blocking."""
+
+    @abc.abstractmethod
+    def hybrid(self, query: str, vector: List[float], alpha: float, limit: int, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        ...
+
+    @abc.abstractmethod
+    def fetch_by_properties(self, properties: Dict[str, Any], limit: int) -> List[Document]:
+        ...
+
+    @abc.abstractmethod
+    def iter_documents(self) -> Iterator[Document]:
+        ...
+
+    @abc.abstractmethod
+    def count(self) -> int:
+        ...
+
+    def is_ready(self) -> bool:
+        return True
+
+
+class WeaviateRetriever(Retriever):
+    def __init__(self, collection):
+        self.collection = collection
+
+    @staticmethod
+    def _filters(properties: Optional[Dict[str, Any]]):
+        from weaviate.classes.query import Filter
+        filters = None
+        for name, value in (properties or {}).items():
+            condition = Filter.by_property(name).equal(value)
+            filters = condition if filters is None else filters & condition
+        return filters
+
+    def hybrid(self, query: str, vector: List[float], alpha: float, limit: int, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        from weaviate.classes.query import MetadataQuery
+        response = self.collection.query.hybrid(query=query, vector=vector, alpha=alpha, limit=limit, filters=self._filters(filters), return_metadata=MetadataQuery(score=True))
+        return [_to_document(obj.properties, str(obj.uuid), obj.metadata.score if obj.metadata else 0) for obj in response.objects]
+
+    def fetch_by_properties(self, properties: Dict[str, Any], limit: int) -> List[Document]:
+        response = self.collection.query.fetch_objects(filters=self._filters(properties), limit=limit)
+        return [_to_document(obj.properties, str(obj.uuid)) for obj in response.objects]
+
+    def iter_documents(self) -> Iterator[Document]:
+        for obj in self.collection.iterator(return_properties=PROPERTIES):
+            yield _to_document(obj.properties, str(obj.uuid))
+
+    def count(self) -> int:
+        return self.collection.aggregate.over_all(total_count=True).total_count
+
+
+class BM25Index:
+    """Indeks terbalik BM25 (k1=1.2, b=0.75 seperti default Weaviate)."""
+
+    def __init__(self, texts: List[str]):
+        self._postings: Dict[str, List[tuple]] = defaultdict(list)
+        lengths = []
+        for doc_index, text in enumerate(texts):
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                self._postings[term].append((doc_index, frequency))
+        self._lengths = np.asarray(lengths, dtype=np.float32)
+        self._avg_length = float(self._lengths.mean()) if len(lengths) else 0.0
+        self._count = len(texts)
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self._count, dtype=np.float32)
+        for term in set(TOKEN_PATTERN.findall(query.lower())):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (self._count - len(postings) + 0.5) / (len(postings) + 0.5))
+            doc_indexes = np.fromiter((doc for doc, _ in postings), dtype=np.int64, count=len(postings))
+            frequencies = np.fromiter((freq for _, freq in postings), dtype=np.float32, count=len(postings))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc_indexes] / max(self._avg_length, 1e-9))
+            scores[doc_indexes] += idf * frequencies * (BM25_K1 + 1) / (frequencies + norm)
+        return scores
+
+
+class LocalRetriever(Retriever):
+    """Retriever in-process dari snapshot (objects.jsonl + vectors.f32 + meta.json)."""
+
+    def __init__(self, object_ids: List[str], properties: List[Dict[str, Any]], vectors: np.ndarray):
+        self.object_ids = object_ids
+        self.properties = properties
+        self.vectors = vectors
+        norms = np.linalg.norm(vectors, axis=1) if len(vectors) else np.zeros(0, dtype=np.float32)
+        self._inverse_norms = np.where(norms > 0, 1.0 / np.maximum(norms, 1e-12), 0.0).astype(np.float32)
+        self.bm25 = BM25Index([" ".join(str(props.get(name, "")) for name in KEYWORD_PROPERTIES) for props in properties])
+        self.loaded_at = time.time()
+
+    @classmethod
+    def load(cls, path: str) -> "LocalRetriever":
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        object_ids, properties = [], []
+        with open(os.path.join(path, "objects.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                object_ids.append(row["id"])
+                properties.append(row["properties"])
+        shape = (meta["count"], meta["dimensions"])
+        vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r", shape=shape) if meta["count"] else np.zeros(shape, dtype=np.float32)
+        print(f"✅ Snapshot retriever lokal dimuat: {meta['count']} objek, dimensi {meta['dimensions']}.")
+        return cls(object_ids, properties, vectors)
+
+    def _mask(self, properties: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not properties:
+            return None
+        return np.fromiter((all(str(props.get(name)) == str(value) for name, value in properties.items()) for props in self.properties),
+                           dtype=bool, count=len(self.properties))
+
+    @staticmethod
+    def _relative_scores(scores: np.ndarray, candidates: np.ndarray) -> Dict[int, float]:
+        """Normalisasi min-max per sub-pencarian (relativeScoreFusion Weaviate)."""
+        if len(candidates) == 0:
+            return {}
+        values = scores[candidates]
+        low, high = float(values.min()), float(values.max())
+        spread = high - low
+        return {int(i): (float(scores[i]) - low) / spread if spread > 0 else 1.0 for i in candidates}
+
+    def _top(self, scores: np.ndarray, mask: Optional[np.ndarray], limit: int, positive_only: bool = False) -> np.ndarray:
+        scores = np.where(mask, scores, -np.inf) if mask is not None else scores
+        valid = np.flatnonzero(scores > 0) if positive_only else np.flatnonzero(np.isfinite(scores))
+        if len(valid) > limit:
+            valid = valid[np.argpartition(-scores[valid], limit - 1)[:limit]]
+        return valid[np.argsort(-scores[valid])]
+
+    def hybrid(self, query: str, vector: List[float], alpha: float, limit: int, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        if not self.object_ids:
+            return []
+        mask = self._mask(filters)
+        candidates = max(limit, HYBRID_CANDIDATES)
+        fused: Dict[int, float] = defaultdict(float)
+        if alpha > 0 and vector is not None:
+            query_vector = np.asarray(vector, dtype=np.float32)
+            # Skor vektor = 1 - jarak cosine = kemiripan cosine
+            vector_scores = (self.vectors @ query_vector) * self._inverse_norms / max(float(np.linalg.norm(query_vector)), 1e-12)
+            for index, score in self._relative_scores(vector_scores, self._top(vector_scores, mask, candidates)).items():
+                fused[index] += alpha * score
+        if alpha < 1:
+            keyword_scores = self.bm25.scores(query)
+            for index, score in self._relative_scores(keyword_scores, self._top(keyword_scores, mask, candidates, positive_only=True)).items():
+                fused[index] += (1 - alpha) * score
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [_to_document(self.properties[index], self.object_ids[index], score) for index, score in ranked]
+
+    def fetch_by_properties(self, properties: Dict[str, Any], limit: int) -> List[Document]:
+        mask = self._mask(properties)
+        indexes = np.flatnonzero(mask)[:limit] if mask is not None else range(min(limit, len(self.object_ids)))
+        return [_to_document(self.properties[i], self.object_ids[i]) for i in indexes]
+
+    def iter_documents(self) -> Iterator[Document]:
+        for object_id, properties in zip(self.object_ids, self.properties):
+            yield _to_document(properties, object_id)
+
+    def count(self) -> int:
+        return len(self.object_ids)
+
+
+def export_snapshot(collection, path: str) -> int:
+    """Menulis seluruh objek koleksi (properti + vektor) ke snapshot; diganti secara atomik."""
+    temp_path = f"{path.rstrip(os.sep)}.tmp"
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    count, dimensions = 0, 0
+    with open(os.path.join(temp_path, "objects.jsonl"), "w", encoding="utf-8") as objects_file, \
+            open(os.path.join(temp_path, "vectors.f32"), "wb") as vectors_file:
+        for obj in collection.iterator(include_vector=True, return_properties=PROPERTIES):
+            vector = obj.vector.get("default") if isinstance(obj.vector, dict) else obj.vector
+            vector = np.asarray(vector, dtype=np.float32)
+            if dimensions and len(vector) != dimensions:
+                raise ValueError(f"Dimensi vektor tidak konsisten pada objek {obj.uuid}")
+            dimensions = len(vector)
+            vectors_file.write(vector.tobytes())
+            objects_file.write(json.dumps({"id": str(obj.uuid), "properties": {name: obj.properties.get(name) for name in PROPERTIES}}, ensure_ascii=False, default=str) + "\n")
+            count += 1
+    with open(os.path.join(temp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"count": count, "dimensions": dimensions, "properties": PROPERTIES, "exported_at": time.time()}, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(temp_path, path)
+    return count
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Utilitas snapshot retriever lokal.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Ekspor koleksi Weaviate ke snapshot lokal")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--collection", default=None, help="Nama koleksi (default: WEAVIATE_CLASS_NAME)")
+    args = parser.parse_args(argv)
+
+    import weaviate
+    from dotenv import load_dotenv
+    from weaviate.classes.init import Auth
+    load_dotenv()
+    client = weaviate.connect_to_weaviate_cloud(cluster_url=os.getenv("WEAVIATE_URL"), auth_credentials=Auth.api_key(os.getenv("WEAVIATE_API_KEY")))
+    try:
+        count = export_snapshot(client.collections.get(args.collection or os.getenv("WEAVIATE_CLASS_NAME")), args.path)
+    finally:
+        client.close()
+    print(f"✅ Snapshot ditulis ke {args.path}: {count} objek.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,237 @@
+"""
+Cache jawaban semantik untuk cabang DOCUMENT_QUERY.
+
+Pertanyaan yang hampir sama (mis. "visi misi prodi" vs "apa visi dan misi prodi")
+dikenali lewat cosine similarity terhadap embedding query yang memang sudah
+dihitung untuk hybrid search, sehingga hit cache melewati Weaviate, reranker,
+dan LLM sekaligus. Embedding entri disimpan di matriks berkapasitas yang
+ditambah per baris; baris entri yang dibuang dikosongkan lalu dipadatkan
+sesekali, sehingga store() tidak membangun ulang matriks.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Iterable
+
+import numpy as np
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    question: str
+    embedding: np.ndarray
+    response: str
+    sources: List[Dict[str, Any]]
+    collection_version: Optional[str]
+    created_at: float = field(default_factory=time.time)
+
+    def source_documents(self) -> List[Document]:
+        return [Document(page_content=src.get("page_content", ""), metadata=src.get("metadata", {})) for src in self.sources]
+
+
+# ============================================================================
+# BACKEND PENYIMPANAN
+# ============================================================================
+class InMemoryCacheBackend:
+    """Backend in-process: tidak ada persistensi, isi cache hilang saat restart."""
+
+    def load(self) -> Iterable[CacheEntry]:
+        return []
+
+    def save(self, entry: CacheEntry) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+class DiskCacheBackend:
+    """Backend on-disk berbasis SQLite lokal agar cache bertahan setelah restart worker."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_cache ("
+            "key TEXT PRIMARY KEY, question TEXT, embedding BLOB, response TEXT, "
+            "sources TEXT, collection_version TEXT, created_at REAL)"
+        )
+        self._conn.commit()
+
+    def load(self) -> Iterable[CacheEntry]:
+        rows = self._conn.execute(
+            "SELECT key, question, embedding, response, sources, collection_version, created_at "
+            "FROM semantic_cache ORDER BY created_at"
+        ).fetchall()
+        for key, question, embedding, response, sources, version, created_at in rows:
+            yield CacheEntry(key, question, np.frombuffer(embedding, dtype=np.float32), response, json.loads(sources), version, created_at)
+
+    def save(self, entry: CacheEntry) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO semantic_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (entry.key, entry.question, entry.embedding.astype(np.float32).tobytes(), entry.response,
+             json.dumps(entry.sources, ensure_ascii=False, default=str), entry.collection_version, entry.created_at)
+        )
+        self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        self._conn.execute("DELETE FROM semantic_cache WHERE key = ?", (key,))
+        self._conn.commit()
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM semantic_cache")
+        self._conn.commit()
+
+
+# ============================================================================
+# CACHE SEMANTIK
+# ============================================================================
+class SemanticCache:
+    """
+    Cache jawaban berbasis kemiripan embedding dengan eviction TTL + LRU.
+    Semua entri dibuang saat versi koleksi Weaviate berubah.
+    """
+
+    def __init__(self, backend, similarity_threshold: float = 0.95, ttl_seconds: float = 86400, max_entries: int = 1000):
+        self.backend = backend
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        # Baris matriks [0, len(_row_keys)) terpakai; baris entri yang dibuang bernilai nol dengan kunci None
+        self._matrix: Optional[np.ndarray] = None
+        self._row_keys: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._dead_rows = 0
+        self._collection_version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+        for entry in backend.load():
+            if time.time() - entry.created_at < ttl_seconds:
+                self._entries[entry.key] = entry
+                self._collection_version = entry.collection_version
+        while len(self._entries) > max_entries:
+            self._entries.popitem(last=False)
+        for entry in self._entries.values():
+            self._append_row(entry)
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _append_row(self, entry: CacheEntry) -> None:
+        used = len(self._row_keys)
+        if self._matrix is None or self._matrix.shape[1] != len(entry.embedding):
+            self._matrix, self._row_keys, self._rows, self._dead_rows, used = None, [], {}, 0, 0
+            self._matrix = np.zeros((max(16, self.max_entries // 4), len(entry.embedding)), dtype=np.float32)
+        elif used == len(self._matrix):
+            if self._dead_rows * 2 >= used:
+                self._compact()
+                used = len(self._row_keys)
+            if used == len(self._matrix):
+                self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+        self._matrix[used] = entry.embedding
+        self._rows[entry.key] = used
+        self._row_keys.append(entry.key)
+
+    def _drop_row(self, key: str) -> None:
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._matrix[row] = 0
+            self._row_keys[row] = None
+            self._dead_rows += 1
+
+    def _compact(self) -> None:
+        live = [row for row, key in enumerate(self._row_keys) if key is not None]
+        self._matrix[:len(live)] = self._matrix[live]
+        self._matrix[len(live):] = 0
+        self._row_keys = [self._row_keys[row] for row in live]
+        self._rows = {key: row for row, key in enumerate(self._row_keys)}
+        self._dead_rows = 0
+
+    def _remove(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self._drop_row(key)
+        self.backend.delete(key)
+
+    def ensure_collection_version(self, version: Optional[str]) -> None:
+        """Membuang seluruh cache jika koleksi dokumen telah berubah sejak entri disimpan."""
+        with self._lock:
+            if version is None or version == self._collection_version:
+                return
+            if self._entries:
+                self.metrics["invalidations"] += 1
+                logger.info(f"♻️ Koleksi berubah ({self._collection_version} -> {version}), cache semantik dikosongkan.")
+            self._clear_locked()
+            self._collection_version = version
+
+    def _clear_locked(self) -> None:
+        self._entries.clear()
+        self._matrix, self._row_keys, self._rows, self._dead_rows = None, [], {}, 0
+        self.backend.clear()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.metrics["invalidations"] += 1
+            self._clear_locked()
+
+    def lookup(self, embedding: List[float]) -> Optional[CacheEntry]:
+        with self._lock:
+            if not self._entries:
+                self.metrics["misses"] += 1
+                return None
+            similarities = self._matrix[:len(self._row_keys)] @ self._normalize(embedding)
+            best_index = int(np.argmax(similarities))
+            best_key = self._row_keys[best_index]
+            entry = self._entries.get(best_key) if best_key is not None else None
+
+            if entry is None or similarities[best_index] < self.similarity_threshold:
+                self.metrics["misses"] += 1
+                return None
+            if time.time() - entry.created_at >= self.ttl_seconds:
+                self._remove(best_key)
+                self.metrics["expirations"] += 1
+                self.metrics["misses"] += 1
+                return None
+
+            self._entries.move_to_end(best_key)
+            self.metrics["hits"] += 1
+            return entry
+
+    def store(self, question: str, embedding: List[float], response: str, source_docs: List[Document]) -> None:
+        sources = [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in source_docs]
+        entry = CacheEntry(uuid.uuid4().hex, question, self._normalize(embedding), response, sources, self._collection_version)
+        with self._lock:
+            self._entries[entry.key] = entry
+            self._append_row(entry)
+            self.backend.save(entry)
+            while len(self._entries) > self.max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._drop_row(evicted_key)
+                self.backend.delete(evicted_key)
+                self.metrics["evictions"] += 1
+            self.metrics["stores"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.metrics["hits"] + self.metrics["misses"]
+            return {
+                **self.metrics,
+                "entries": len(self._entries),
+                "hit_rate": self.metrics["hits"] / lookups if lookups else 0.0,
+                "collection_version": self._collection_version,
+            }
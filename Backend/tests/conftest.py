@@ -0,0 +1,38 @@
+"""
+Fixture bersama untuk test backend.
+
+Semua test berjalan tanpa layanan cloud: modul Backend diimpor dari folder induk,
+aplikasi dijalankan dalam mode offline, dan komponen eksternal diganti dengan
+pengganti deterministik dari local_stubs.
+"""
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ["RAG_OFFLINE_MODE"] = "true"
+os.environ.setdefault("SEMANTIC_CACHE_BACKEND", "memory")
+os.environ.setdefault("EVAL_LOG_PATH", "")
+os.environ.setdefault("TRACE_LOG_PATH", "")
+
+
+@pytest.fixture(scope="session")
+def rag():
+    """Modul Rag_weaviate dengan korpus sintetis benchmark, embedding hash, dan LLM stub."""
+    import Rag_weaviate
+    import local_stubs
+    from benchmark import generate_synthetic_corpus
+
+    stub_embeddings = local_stubs.HashEmbeddings()
+    Rag_weaviate.install_components(
+        llm_client=local_stubs.StubLLM(),
+        embeddings_client=stub_embeddings,
+        collection=local_stubs.InMemoryCollection(generate_synthetic_corpus(), stub_embeddings),
+        reranker_model=local_stubs.StubCrossEncoder(),
+        chat_history_service=local_stubs.InMemoryChatHistory.configure()
+    )
+    Rag_weaviate.load_pasal_index()
+    return Rag_weaviate
@@ -0,0 +1,73 @@
+import asyncio
+
+from langchain.schema import Document
+
+from context_builder import ContextBuilder, compress_history, deduplicate_chunks, estimate_tokens, truncate_to_tokens
+
+
+def doc(content, doc_id=None):
+    return Document(page_content=content, metadata={"weaviate_id": doc_id} if doc_id else {})
+
+
+def test_deduplicate_drops_near_duplicate_chunks():
+    base = "Program studi wajib melaksanakan audit mutu internal setiap tahun akademik sesuai pedoman."
+    documents = [doc(base), doc(base + " Tambahan kecil."), doc("Kurikulum ditinjau ulang setiap empat tahun.")]
+    assert [d.page_content for d in deduplicate_chunks(documents)] == [base, "Kurikulum ditinjau ulang setiap empat tahun."]
+
+
+def test_build_respects_budget_and_keeps_relevance_order():
+    long_text = " ".join(f"Kalimat {i} membahas audit mutu dan akreditasi program studi." for i in range(40))
+    documents = [doc("Audit mutu dilakukan setiap tahun."), doc(long_text), doc("Akreditasi berlaku lima tahun.")]
+    passages, stats = asyncio.run(ContextBuilder(token_budget=120).build("audit mutu", documents))
+
+    assert passages[0] == "Audit mutu dilakukan setiap tahun."
+    assert passages[2] == "Akreditasi berlaku lima tahun."
+    assert stats["tokens_after"] <= 120 < stats["tokens_before"]
+
+
+def test_trim_uses_scorer_and_keeps_sentence_order():
+    sentences = ["Satu tidak relevan.", "Dua membahas audit.", "Tiga tidak relevan.", "Empat membahas audit."]
+
+    async def scorer(query, candidates, ids):
+        assert ids == [f"d1#{i}" for i in range(len(candidates))]
+        return [1.0 if "audit" in sentence else 0.0 for sentence in candidates]
+
+    budget = estimate_tokens(sentences[1]) + estimate_tokens(sentences[3])
+    passages, _ = asyncio.run(ContextBuilder(token_budget=budget, scorer=scorer).build("audit", [doc(" ".join(sentences), "d1")]))
+    assert passages == ["Dua membahas audit. Empat membahas audit."]
+
+
+def test_trim_falls_back_to_lexical_scores_when_scorer_fails():
+    async def failing_scorer(query, candidates, ids):
+        raise RuntimeError("reranker mati")
+
+    text = "Kurikulum ditinjau ulang. Audit mutu wajib dilaksanakan."
+    passages, _ = asyncio.run(ContextBuilder(token_budget=estimate_tokens("Audit mutu wajib dilaksanakan."), scorer=failing_scorer).build("audit mutu", [doc(text)]))
+    assert passages == ["Audit mutu wajib dilaksanakan."]
+
+
+def test_trim_hard_truncates_sentence_longer_than_budget():
+    text = "pasal " * 300  # tanpa tanda baca: satu kalimat panjang
+    passages, stats = asyncio.run(ContextBuilder(token_budget=30).build("pasal", [doc(text)]))
+    assert passages and passages[0].startswith("pasal pasal")
+    assert stats["tokens_after"] <= 30
+
+
+def test_truncate_to_tokens_cuts_on_word_boundary():
+    assert truncate_to_tokens("pendek", 10) == "pendek"
+    truncated = truncate_to_tokens("akreditasi program studi unggul", 4)
+    assert truncated == "akreditasi" and estimate_tokens(truncated) <= 4
+
+
+def test_compress_history_summarizes_older_messages():
+    messages = [
+        {"role": "user", "content": "Apa itu audit mutu internal? Saya ingin tahu detailnya."},
+        {"role": "assistant", "content": "Audit mutu internal adalah evaluasi berkala.\n\n" + "=" * 20 + "\n📚 REFERENSI: Pasal 3"},
+        {"role": "user", "content": "Siapa pelaksananya?"},
+        {"role": "assistant", "content": "Dilaksanakan oleh auditor internal."},
+    ]
+    history, stats = compress_history(messages, token_budget=200, recent_messages=2)
+    assert history.startswith("Ringkasan percakapan sebelumnya:\n- Pengguna: Apa itu audit mutu internal?")
+    assert "REFERENSI" not in history
+    assert history.endswith("Pengguna: Siapa pelaksananya?\nAsisten: Dilaksanakan oleh auditor internal.")
+    assert stats["tokens_after"] <= 200
@@ -0,0 +1,50 @@
+import time
+
+from conversation_cache import ConversationWindowCache
+
+
+def message(role, content):
+    return {"role": role, "content": content, "timestamp": time.time()}
+
+
+def test_conversation_cache_cold_miss_then_fill_and_append():
+    cache = ConversationWindowCache(window_size=4)
+    assert cache.get_recent("u1", "c1", 2) is None
+
+    cache.fill("u1", "c1", [message("user", "halo"), message("assistant", "hai")], total=2)
+    cache.append("u1", "c1", [message("user", "ya"), message("assistant", "oke")])
+    assert [m["content"] for m in cache.get_recent("u1", "c1", 3)] == ["hai", "ya", "oke"]
+    assert [m["content"] for m in cache.get_all("u1", "c1")] == ["halo", "hai", "ya", "oke"]
+    assert cache.get_recent("u2", "c1", 2) is None  # chat milik pengguna lain
+
+
+def test_conversation_cache_new_chat_and_uncached_append():
+    cache = ConversationWindowCache(window_size=4)
+    cache.append("u1", "lama", [message("user", "x")])
+    assert cache.get_recent("u1", "lama", 1) is None
+    cache.append("u1", "baru", [message("user", "x")], new_chat=True)
+    assert [m["content"] for m in cache.get_recent("u1", "baru", 4)] == ["x"]
+
+
+def test_conversation_cache_window_expires():
+    cache = ConversationWindowCache(window_ttl=-1)
+    cache.fill("u1", "c1", [message("user", "halo")], total=1)
+    assert cache.get_recent("u1", "c1", 1) is None
+    assert cache.metrics["expired"] == 1
+
+
+def test_conversation_cache_append_refreshes_window_expiry():
+    cache = ConversationWindowCache(window_ttl=60)
+    cache.fill("u1", "c1", [message("user", "halo")], total=1)
+    cache._chats["c1"].loaded_at -= 61  # dibaca dari Firestore lebih dari TTL yang lalu
+    cache.append("u1", "c1", [message("assistant", "hai")])
+    assert [m["content"] for m in cache.get_recent("u1", "c1", 2)] == ["halo", "hai"]
+    assert cache.metrics["expired"] == 0
+
+
+def test_conversation_cache_chat_list_ttl():
+    cache = ConversationWindowCache(chat_list_ttl=60)
+    cache.set_chat_list("u1", {"today": []})
+    assert cache.get_chat_list("u1") == {"today": []}
+    cache.invalidate_chat_list("u1")
+    assert cache.get_chat_list("u1") is None
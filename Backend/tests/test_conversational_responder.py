@@ -0,0 +1,16 @@
+from conversational_responder import PatternClassifier
+
+
+def test_classifier_labels():
+    classifier = PatternClassifier()
+    assert classifier.classify("Halo, selamat pagi") == "greeting"
+    assert classifier.classify("terima kasih atas jawabannya") == "gratitude"
+    assert classifier.classify("Apa bunyi pasal 10?") == "pasal_query"
+    assert classifier.classify("jelaskan ps.3 tentang audit") == "pasal_query"
+    assert classifier.classify("oke") == "small_talk"
+    assert classifier.classify("Bagaimana prosedur evaluasi diri program studi?") == "document_query"
+
+
+def test_classifier_priority_follows_rule_order():
+    # Sapaan di awal pesan menang atas penyebutan pasal di tempat lain
+    assert PatternClassifier().classify("halo, apa isi pasal 4?") == "greeting"
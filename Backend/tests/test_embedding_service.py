@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+from embedding_service import EmbeddingService, EmbeddingStore
+from local_stubs import HashEmbeddings
+
+
+class ThreadRecordingStore(EmbeddingStore):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.get_threads = []
+
+    def get(self, key):
+        self.get_threads.append(threading.get_ident())
+        return super().get(key)
+
+
+def test_concurrent_queries_share_one_batch_and_memoize():
+    async def run():
+        service = EmbeddingService(HashEmbeddings(), batch_window_ms=5)
+        vectors = await asyncio.gather(*[service.aembed_query(text) for text in ["audit mutu", "Audit  Mutu", "kurikulum"]])
+        again = await service.aembed_query("audit mutu")
+        return service, vectors, again
+
+    service, vectors, again = asyncio.run(run())
+    assert vectors[0] == vectors[1] == again
+    assert service.metrics["batches"] == 1 and service.metrics["batched_texts"] == 2
+    assert service.metrics["hits"] == 1
+
+
+def test_store_lookup_runs_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    EmbeddingService(HashEmbeddings(), store=EmbeddingStore(path, "hash")).embed_query("audit mutu")
+    store = ThreadRecordingStore(path, "hash")
+
+    async def run():
+        service = EmbeddingService(HashEmbeddings(), store=store)
+        return service, await service.aembed_query("audit mutu"), threading.get_ident()
+
+    service, vector, loop_thread = asyncio.run(run())
+    assert vector and service.metrics["store_hits"] == 1 and service.metrics["batches"] == 0
+    assert store.get_threads and loop_thread not in store.get_threads
+
+
+def test_cancelled_caller_does_not_strand_full_batch():
+    async def run():
+        service = EmbeddingService(HashEmbeddings(), max_batch_size=3, batch_window_ms=1000)
+        tasks = [asyncio.create_task(service.aembed_query(f"teks {i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks[2].cancel()
+        return await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 1)
+
+    results = asyncio.run(run())
+    assert all(isinstance(vector, list) for vector in results[:2])
+    assert isinstance(results[2], asyncio.CancelledError)
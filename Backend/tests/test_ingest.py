@@ -0,0 +1,106 @@
+import pytest
+
+import ingest
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.texts = []
+
+    def embed(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    """Koleksi palsu: upsert/delete dicatat alih-alih dikirim ke Weaviate."""
+    state = {"objects": {}, "upserts": [], "deletes": []}
+
+    def upsert_chunks(_collection, chunks, vectors, batch_size, concurrent_requests):
+        for chunk in chunks:
+            state["objects"][chunk["uuid"]] = chunk
+        state["upserts"].append([chunk["uuid"] for chunk in chunks])
+        return 0
+
+    def delete_objects(_collection, object_ids, batch_size=500):
+        for object_id in object_ids:
+            state["objects"].pop(object_id, None)
+        state["deletes"].append(list(object_ids))
+
+    monkeypatch.setattr(ingest, "upsert_chunks", upsert_chunks)
+    monkeypatch.setattr(ingest, "delete_objects", delete_objects)
+    return state
+
+
+def write_document(path, pasal_texts):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n".join(f"Pasal {number}\n{text}" for number, text in pasal_texts), encoding="utf-8")
+
+
+def sync(path, key, manifest, embedder):
+    return ingest.ingest_file(str(path), key, key.rsplit(".", 1)[0], None, embedder, manifest)
+
+
+def test_chunks_never_mix_pasal():
+    chunks = list(ingest.chunk_pages([(1, "Pembukaan\nPasal 1\nisi satu"), (2, "lanjutan satu\nPasal 2\nisi dua")], "uu"))
+    assert [(chunk["pasal"], chunk["page"]) for chunk in chunks] == [("-", 1), ("1", 1), ("2", 2)]
+    assert chunks[1]["content"] == "Pasal 1\nisi satu\nlanjutan satu"
+
+
+def test_reingest_unchanged_file_is_skipped(tmp_path, collection):
+    document = tmp_path / "uu.txt"
+    write_document(document, [(1, "Mutu wajib dijaga."), (2, "Audit dilakukan tahunan.")])
+    manifest, embedder = {"sources": {}}, FakeEmbedder()
+
+    first = sync(document, "uu.txt", manifest, embedder)
+    second = sync(document, "uu.txt", manifest, embedder)
+    assert first["status"] == "updated" and first["upserted"] == 2
+    assert second["status"] == "unchanged"
+    assert len(collection["upserts"]) == 1 and len(collection["objects"]) == 2
+
+
+def test_edited_file_upserts_changed_chunks_and_deletes_stale(tmp_path, collection):
+    document = tmp_path / "uu.txt"
+    write_document(document, [(1, "Mutu wajib dijaga."), (2, "Audit dilakukan tahunan.")])
+    manifest, embedder = {"sources": {}}, FakeEmbedder()
+    sync(document, "uu.txt", manifest, embedder)
+    old_ids = set(collection["objects"])
+
+    write_document(document, [(1, "Mutu wajib dijaga."), (2, "Audit dilakukan tiap semester.")])
+    summary = sync(document, "uu.txt", manifest, embedder)
+    assert summary["upserted"] == 1 and summary["deleted"] == 1
+    assert len(collection["objects"]) == 2 and len(old_ids & set(collection["objects"])) == 1
+    assert set(manifest["sources"]["uu.txt"]["object_ids"]) == set(collection["objects"])
+
+
+def test_shifted_chunk_is_reupserted_with_new_index(tmp_path, collection):
+    document = tmp_path / "uu.txt"
+    write_document(document, [(1, "Mutu wajib dijaga."), (2, "Audit dilakukan tahunan.")])
+    manifest, embedder = {"sources": {}}, FakeEmbedder()
+    sync(document, "uu.txt", manifest, embedder)
+
+    write_document(document, [(3, "Pasal baru di depan."), (1, "Mutu wajib dijaga."), (2, "Audit dilakukan tahunan.")])
+    summary = sync(document, "uu.txt", manifest, embedder)
+    assert summary["upserted"] == 3 and summary["deleted"] == 0
+    assert sorted(chunk["chunk_index"] for chunk in collection["objects"].values()) == [0, 1, 2]
+
+
+def test_same_file_name_in_different_folders_is_kept_apart(tmp_path, collection):
+    write_document(tmp_path / "2023" / "uu.txt", [(1, "Versi 2023.")])
+    write_document(tmp_path / "2024" / "uu.txt", [(1, "Versi 2024.")])
+    manifest, embedder = {"sources": {}}, FakeEmbedder()
+    for path, key in ingest.discover_files([str(tmp_path)]):
+        sync(path, key, manifest, embedder)
+
+    assert sorted(manifest["sources"]) == ["2023/uu.txt", "2024/uu.txt"]
+    assert len(collection["objects"]) == 2 and not any(collection["deletes"])
+
+
+def test_dry_run_does_not_touch_collection_or_manifest(tmp_path, collection):
+    document = tmp_path / "uu.txt"
+    write_document(document, [(1, "Mutu wajib dijaga.")])
+    manifest = {"sources": {}}
+    summary = ingest.ingest_file(str(document), "uu.txt", "uu", None, None, manifest, dry_run=True)
+    assert summary["status"] == "dry-run" and summary["upserted"] == 1
+    assert manifest == {"sources": {}} and not collection["upserts"]
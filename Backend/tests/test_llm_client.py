@@ -0,0 +1,160 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from llm_client import (Backend, CircuitBreaker, LLMUnavailableError, Priority, PriorityScheduler, QueueFullError,
+                        ResilientLLM)
+
+
+# ============================================================================
+# CIRCUIT BREAKER
+# ============================================================================
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_allows_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    breaker._opened_at = time.monotonic() - 61
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # hanya satu panggilan percobaan sekaligus
+    breaker.release_probe()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_breaker_reopens_when_probe_fails():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0)
+    for _ in range(5):
+        breaker.record_failure()
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+# ============================================================================
+# ANTREAN PRIORITAS
+# ============================================================================
+def test_scheduler_grants_interactive_before_batch():
+    async def run():
+        scheduler = PriorityScheduler("test", max_concurrency=1, max_queue=10)
+        await scheduler.acquire(Priority.INTERACTIVE)
+        order = []
+
+        async def worker(name, priority):
+            await scheduler.acquire(priority)
+            order.append(name)
+            scheduler.release()
+
+        tasks = [asyncio.create_task(worker("batch-1", Priority.BATCH)), asyncio.create_task(worker("batch-2", Priority.BATCH))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(worker("interaktif", Priority.INTERACTIVE)))
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order, scheduler.stats()
+
+    order, stats = asyncio.run(run())
+    assert order == ["interaktif", "batch-1", "batch-2"]
+    assert stats["active"] == 0 and stats["waiting"] == 0
+
+
+def test_scheduler_rejects_when_queue_full():
+    async def run():
+        scheduler = PriorityScheduler("test", max_concurrency=1, max_queue=1)
+        await scheduler.acquire(Priority.INTERACTIVE)
+        waiting = asyncio.create_task(scheduler.acquire(Priority.BATCH))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await scheduler.acquire(Priority.INTERACTIVE)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        return scheduler.stats()
+
+    stats = asyncio.run(run())
+    assert stats["rejected"] == 1 and stats["waiting"] == 0
+
+
+def test_scheduler_cancelled_waiter_does_not_leak_slot():
+    async def run():
+        scheduler = PriorityScheduler("test", max_concurrency=1, max_queue=10)
+        await scheduler.acquire(Priority.INTERACTIVE)
+        cancelled = asyncio.create_task(scheduler.acquire(Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        scheduler.release()
+        await asyncio.wait_for(scheduler.acquire(Priority.BATCH), 1)
+        scheduler.release()
+        return scheduler.stats()
+
+    assert asyncio.run(run())["active"] == 0
+
+
+# ============================================================================
+# RETRY DI BACKEND TUNGGAL
+# ============================================================================
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("rate limit")
+        self.response = SimpleNamespace(headers={"retry-after": str(retry_after)})
+
+
+class FlakyModel:
+    """Model yang gagal dengan error dari `errors` secara berurutan sebelum berhasil."""
+
+    def __init__(self, errors):
+        self.errors, self.calls = list(errors), 0
+
+    async def ainvoke(self, prompt, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"jawaban untuk {prompt}"
+
+
+def single_backend_llm(model, **kwargs):
+    return ResilientLLM([Backend("groq:utama", model)], PriorityScheduler("test"), base_backoff=0.01, **kwargs)
+
+
+def test_single_backend_absorbs_429_after_retry_after():
+    model = FlakyModel([RateLimitError(retry_after=0.05)])
+    llm = single_backend_llm(model)
+    started = time.monotonic()
+    assert asyncio.run(llm.ainvoke("halo")) == "jawaban untuk halo"
+    assert time.monotonic() - started >= 0.05
+    assert model.calls == 2 and llm.metrics["retries"] == 1 and llm.metrics["unavailable"] == 0
+
+
+def test_single_backend_retries_are_bounded():
+    model = FlakyModel([ConnectionResetError()] * 5)
+    llm = single_backend_llm(model, max_retries=2)
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(llm.ainvoke("halo"))
+    assert model.calls == 3
+
+
+def test_non_transient_error_and_long_retry_after_are_not_retried():
+    model = FlakyModel([ValueError("prompt tidak valid")])
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(single_backend_llm(model).ainvoke("halo"))
+    assert model.calls == 1
+
+    model = FlakyModel([RateLimitError(retry_after=120)])
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(single_backend_llm(model, max_retry_wait=10).ainvoke("halo"))
+    assert model.calls == 1
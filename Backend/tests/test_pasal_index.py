@@ -0,0 +1,39 @@
+from langchain.schema import Document
+
+from pasal_index import PasalIndex, extract_pasal_numbers
+
+
+def make_doc(pasal, page, chunk_index=None, source="Peraturan Mutu 1", content=None):
+    metadata = {"pasal": pasal, "page": page, "source": source}
+    if chunk_index is not None:
+        metadata["chunk_index"] = chunk_index
+    return Document(page_content=content or f"Pasal {pasal} halaman {page} potongan {chunk_index}", metadata=metadata)
+
+
+def test_extract_pasal_numbers():
+    assert extract_pasal_numbers("Apa isi pasal 5 dan 7, serta ps. 9?") == ["5", "7", "9"]
+    assert extract_pasal_numbers("jelaskan pasal ke-12 dan pasal 12") == ["12"]
+    assert extract_pasal_numbers("bagaimana akreditasi program studi?") == []
+
+
+def test_lookup_orders_chunks_by_page_then_chunk_index():
+    index = PasalIndex(max_chunks_per_pasal=10)
+    index.rebuild([make_doc("5", 3, 2), make_doc("5", 2, 7), make_doc("5", 3, None), make_doc("5", 3, 0), make_doc("6", 1, 0)])
+    pages_and_chunks = [(doc.metadata["page"], doc.metadata.get("chunk_index")) for doc in index.lookup("5")]
+    assert pages_and_chunks == [(2, 7), (3, 0), (3, 2), (3, None)]
+
+
+def test_lookup_normalizes_number_filters_source_and_limits():
+    index = PasalIndex(max_chunks_per_pasal=2)
+    index.rebuild([make_doc("05", 1, i, source="A") for i in range(3)] + [make_doc("5", 9, 0, source="B"), make_doc("-", 1, 0)])
+    assert len(index.lookup("5")) == 2
+    assert [doc.metadata["source"] for doc in index.lookup("005", source="B")] == ["B"]
+    assert index.lookup("5", source="C") is None
+    assert index.stats()["pasal_count"] == 1
+
+
+def test_lookup_before_rebuild_is_a_miss():
+    index = PasalIndex()
+    assert not index.is_ready
+    assert index.lookup("1") is None
+    assert index.metrics["misses"] == 1
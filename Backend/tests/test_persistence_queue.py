@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+from local_stubs import InMemoryChatHistory
+from persistence_queue import ChatWriteBehindQueue
+
+
+async def run_inline(function, *args):
+    return function(*args)
+
+
+class SaveMessageOnlyService:
+    """Layanan riwayat tanpa save_messages_batch, seperti ChatHistoryService produksi."""
+
+    def __init__(self, fail_after=None):
+        self.saved, self.threads, self.fail_after = [], set(), fail_after
+
+    def save_message(self, user_id, chat_id, content, role, metadata=None):
+        if self.fail_after is not None and len(self.saved) >= self.fail_after:
+            self.fail_after = None
+            raise ConnectionError("firestore sibuk")
+        self.threads.add(threading.get_ident())
+        self.saved.append((chat_id, role, content, metadata["message_id"]))
+
+
+def test_merge_recent_keeps_repeated_messages():
+    async def run():
+        queue = ChatWriteBehindQueue(lambda: InMemoryChatHistory.configure(), run_inline)
+        queue.enqueue_turn("u1", "c1", [{"role": "user", "content": "ya"}, {"role": "assistant", "content": "baik"}])
+        queue.enqueue_turn("u1", "c1", [{"role": "user", "content": "ya"}])
+        persisted = [{"role": "user", "content": "ya", "metadata": {"message_id": "lama"}}]
+        merged = queue.merge_recent("c1", persisted)
+        await queue.close()
+        return merged
+
+    assert [message["content"] for message in asyncio.run(run())] == ["ya", "ya", "baik", "ya"]
+
+
+def test_merge_recent_skips_messages_already_persisted():
+    async def run():
+        service = InMemoryChatHistory.configure()
+        queue = ChatWriteBehindQueue(lambda: service, run_inline)
+        queue.enqueue_turn("u1", "c1", [{"role": "user", "content": "ya"}])
+        in_flight = [dict(write) for write in queue._pending]  # batch sudah terbaca sebelum overlay dibersihkan
+        merged = queue.merge_recent("c1", in_flight)
+        await queue.close()
+        return merged, service.get_chat_messages("u1", "c1")
+
+    merged, stored = asyncio.run(run())
+    assert len(merged) == 1
+    assert [message["content"] for message in stored] == ["ya"]
+
+
+def test_batch_without_save_messages_batch_uses_save_message_in_one_job():
+    service = SaveMessageOnlyService()
+    jobs = []
+
+    async def run_in_thread(function, *args):
+        jobs.append(function.__name__)
+        return await asyncio.to_thread(function, *args)
+
+    async def run():
+        queue = ChatWriteBehindQueue(lambda: service, run_in_thread, flush_interval_ms=1)
+        queue.enqueue_turn("u1", "c1", [{"role": "user", "content": "halo"}, {"role": "assistant", "content": "hai"}])
+        await queue.close()
+        return queue.stats()
+
+    stats = asyncio.run(run())
+    assert [(chat_id, role, content) for chat_id, role, content, _ in service.saved] == [("c1", "user", "halo"), ("c1", "assistant", "hai")]
+    assert len({message_id for *_, message_id in service.saved}) == 2
+    assert jobs == ["save_messages_sequentially"] and len(service.threads) == 1
+    assert stats["flushed"] == 2 and stats["overlay_chats"] == 0
+
+
+def test_retry_does_not_resave_messages_already_written():
+    service = SaveMessageOnlyService(fail_after=1)
+
+    async def run():
+        queue = ChatWriteBehindQueue(lambda: service, run_inline, flush_interval_ms=1, base_backoff=0)
+        queue.enqueue_turn("u1", "c1", [{"role": "user", "content": "ya"}, {"role": "assistant", "content": "oke"}])
+        await queue.close()
+        return queue.stats()
+
+    stats = asyncio.run(run())
+    assert [content for _, _, content, _ in service.saved] == ["ya", "oke"]
+    assert stats["retries"] == 1 and stats["failed"] == 0
@@ -0,0 +1,74 @@
+import asyncio
+
+from langchain.schema import Document
+
+from prefetch_cache import PrefetchCache
+
+
+def test_prefetch_hit_on_same_query_and_miss_on_different_embedding():
+    async def embed_query(query):
+        return [1.0, 0.0] if "mutu" in query else [0.0, 1.0]
+
+    async def retrieve(query, embedding):
+        return [Document(page_content=f"hasil {query}", metadata={})]
+
+    async def run():
+        cache = PrefetchCache(similarity_threshold=0.9)
+        assert cache.start("s1", "audit mutu", embed_query, retrieve) == "scheduled"
+        assert cache.start("s1", "Audit  mutu", embed_query, retrieve) == "duplicate"  # teks sama setelah normalisasi
+        hit = await cache.take("s1", "audit mutu")
+        assert cache.start("s2", "audit mutu", embed_query, retrieve) == "scheduled"
+        await asyncio.sleep(0)
+        miss = await cache.take("s2", "kurikulum", embed_query=embed_query)
+        return cache, hit, miss
+
+    cache, hit, miss = asyncio.run(run())
+    assert hit[0].page_content == "hasil audit mutu"
+    assert miss is None
+    assert cache.metrics["hits"] == 1 and cache.metrics["misses"] == 1 and cache.metrics["deduplicated"] == 1
+
+
+def test_prefetch_expired_entry_is_not_used():
+    async def embed_query(query):
+        return [1.0]
+
+    async def retrieve(query, embedding):
+        return [Document(page_content="x", metadata={})]
+
+    async def run():
+        cache = PrefetchCache(ttl_seconds=-1)
+        cache.start("s1", "q", embed_query, retrieve)
+        return cache, await cache.take("s1", "q")
+
+    cache, documents = asyncio.run(run())
+    assert documents is None
+    assert cache.metrics["expired"] == 1
+
+
+def test_prefetch_rejects_when_all_slots_are_busy():
+    release = None
+
+    async def embed_query(query):
+        return [1.0]
+
+    async def retrieve(query, embedding):
+        await release.wait()
+        return [Document(page_content=query, metadata={})]
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        cache = PrefetchCache(max_in_flight=2)
+        statuses = [cache.start(f"s{i}", f"query {i}", embed_query, retrieve) for i in range(3)]
+        # Mengganti prefetch sesi yang sama membebaskan slotnya seketika
+        statuses.append(cache.start("s0", "query baru", embed_query, retrieve))
+        in_flight = cache.stats()["in_flight"]
+        release.set()
+        documents = await cache.take("s1", "query 1")
+        await cache.take("s0", "query baru")
+        return cache, statuses, in_flight, documents
+
+    cache, statuses, in_flight, documents = asyncio.run(run())
+    assert statuses == ["scheduled", "scheduled", "busy", "scheduled"]
+    assert in_flight == 2 and documents[0].page_content == "query 1"
+    assert cache.metrics["rejected"] == 1 and cache.stats()["in_flight"] == 0
@@ -0,0 +1,65 @@
+import numpy as np
+from langchain.schema import Document
+
+from semantic_cache import DiskCacheBackend, InMemoryCacheBackend, SemanticCache
+
+
+def random_vectors(count, dimensions=16, seed=0):
+    return [list(vector) for vector in np.random.default_rng(seed).normal(size=(count, dimensions))]
+
+
+def test_semantic_cache_hit_requires_similarity_threshold():
+    cache = SemanticCache(InMemoryCacheBackend(), similarity_threshold=0.95)
+    vector = random_vectors(1)[0]
+    cache.store("apa itu audit mutu?", vector, "Audit mutu adalah ...", [Document(page_content="isi", metadata={"pasal": "3"})])
+
+    entry = cache.lookup([value * 2 for value in vector])  # skala tidak mengubah cosine similarity
+    assert entry.response == "Audit mutu adalah ..."
+    assert entry.source_documents()[0].metadata == {"pasal": "3"}
+    assert cache.lookup(random_vectors(1, seed=1)[0]) is None
+    assert cache.metrics["hits"] == 1 and cache.metrics["misses"] == 1
+
+
+def test_semantic_cache_eviction_keeps_matrix_consistent():
+    cache = SemanticCache(InMemoryCacheBackend(), max_entries=10)
+    vectors = random_vectors(60)
+    for i, vector in enumerate(vectors):
+        cache.store(f"q{i}", vector, f"a{i}", [])
+    assert cache.stats()["entries"] == 10
+    for i in range(50, 60):
+        assert cache.lookup(vectors[i]).response == f"a{i}"
+    for i in range(50):
+        assert cache.lookup(vectors[i]) is None
+
+
+def test_semantic_cache_clears_on_collection_version_change():
+    cache = SemanticCache(InMemoryCacheBackend())
+    cache.ensure_collection_version("v1")
+    vector = random_vectors(1)[0]
+    cache.store("q", vector, "a", [])
+    cache.ensure_collection_version("v1")
+    assert cache.lookup(vector) is not None
+    cache.ensure_collection_version("v2")
+    assert cache.lookup(vector) is None
+    assert cache.metrics["invalidations"] == 1
+
+
+def test_semantic_cache_disk_backend_survives_restart(tmp_path):
+    path = str(tmp_path / "semantic_cache.sqlite3")
+    vector = random_vectors(1)[0]
+    cache = SemanticCache(DiskCacheBackend(path))
+    cache.ensure_collection_version("v1")
+    cache.store("q", vector, "a", [])
+
+    reloaded = SemanticCache(DiskCacheBackend(path))
+    assert reloaded.lookup(vector).response == "a"
+    reloaded.ensure_collection_version("v1")
+    assert reloaded.lookup(vector) is not None
+
+
+def test_semantic_cache_entry_expires_after_ttl():
+    cache = SemanticCache(InMemoryCacheBackend(), ttl_seconds=0)
+    vector = random_vectors(1)[0]
+    cache.store("q", vector, "a", [])
+    assert cache.lookup(vector) is None
+    assert cache.metrics["expirations"] == 1
@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+import httpx
+
+
+def parse_sse(body: str):
+    events = []
+    for block in body.split("\n\n"):
+        if not block.strip():
+            continue
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_filter_holds_reasoning_until_split_marker(rag):
+    stream_filter = rag.AnswerStreamFilter()
+    chunks = ["*PEMIKIRAN:* konteks ", "cukup.\n*JAWA", "BAN:*", "  Pasal 5 ", "mengatur mutu."]
+    emitted = "".join(stream_filter.feed(chunk) for chunk in chunks) + stream_filter.flush()
+    assert emitted == "Pasal 5 mengatur mutu."
+
+
+def test_filter_flushes_output_without_marker(rag):
+    stream_filter = rag.AnswerStreamFilter()
+    assert stream_filter.feed("*PEMIKIRAN:* Jawaban tanpa format") == ""
+    assert stream_filter.flush() == "Jawaban tanpa format"
+
+
+def test_format_sse_event_framing(rag):
+    frame = rag.format_sse_event("token", {"text": "baris\nbaru ✓"})
+    assert frame.endswith("\n\n")
+    assert frame.count("\n") == 3  # newline di data di-escape oleh JSON, bukan memecah frame
+    assert parse_sse(frame) == [("token", {"text": "baris\nbaru ✓"})]
+
+
+def test_ask_stream_emits_tokens_then_done(rag):
+    async def run():
+        transport = httpx.ASGITransport(app=rag.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            return await client.post("/ask/stream", json={"user_message": "Bagaimana pelaksanaan audit mutu internal di program studi?"})
+
+    response = asyncio.run(run())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    names = [name for name, _ in events]
+    assert names[-1] == "done" and names.count("done") == 1
+    assert set(names[:-1]) <= {"token"} and names[:-1]
+    streamed = "".join(data["text"] for name, data in events if name == "token")
+    assert "PEMIKIRAN" not in streamed
+    assert events[-1][1]["response"].startswith(streamed.strip())
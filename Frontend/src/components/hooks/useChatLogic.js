@@ -2,6 +2,23 @@ import { useState, useRef, useEffect } from 'react';
 import { useAuth } from './useAuth';
 
 const API_URL = "http://localhost:8000";
+// Jeda mengetik sebelum prefetch dikirim, dan panjang minimum query yang di-prefetch
+const PREFETCH_DEBOUNCE_MS = 400;
+const PREFETCH_MIN_CHARS = 12;
+
+const createSessionId = () =>
+  (window.crypto?.randomUUID ? window.crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`);
+
+// Parsing satu blok event Server-Sent Events ("event: ...\ndata: ...")
+const parseSseEvent = (rawEvent) => {
+  let event = 'message';
+  const dataLines = [];
+  for (const line of rawEvent.split('\n')) {
+    if (line.startsWith('event:')) event = line.slice(6).trim();
+    else if (line.startsWith('data:')) dataLines.push(line.slice(5).trimStart());
+  }
+  return { event, payload: dataLines.length ? JSON.parse(dataLines.join('\n')) : {} };
+};
 
 const useChatLogic = () => {
   const { currentUser, loading: authLoading } = useAuth();
@@ -24,6 +41,9 @@ const useChatLogic = () => {
   const [displayedText, setDisplayedText] = useState('');
   const messageEndRef = useRef(null);
   const bottomRef = useRef(null);
+  // ID sesi untuk prefetch retrieval; backend memakai hasil prefetch saat pesan dikirim
+  const sessionIdRef = useRef(createSessionId());
+  const lastPrefetchRef = useRef('');
 
 
   // Enhanced chat history
@@ -163,6 +183,25 @@ const useChatLogic = () => {
     }
   }, [needsHistoryRefresh, userId]);
 
+  // Prefetch retrieval selagi pengguna mengetik (debounce)
+  useEffect(() => {
+    const query = inputMessage.trim();
+    if (isLoading || query.length < PREFETCH_MIN_CHARS || query === lastPrefetchRef.current) return;
+
+    const prefetchTimer = setTimeout(() => {
+      lastPrefetchRef.current = query;
+      fetch(`${API_URL}/prefetch`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ user_message: query, session_id: sessionIdRef.current }),
+      }).catch(() => {
+        // Prefetch hanya optimasi; kegagalan diabaikan
+      });
+    }, PREFETCH_DEBOUNCE_MS);
+
+    return () => clearTimeout(prefetchTimer);
+  }, [inputMessage, isLoading]);
+
   // Auto-scroll ke pesan terbaru
   useEffect(() => {
     messageEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -185,12 +224,13 @@ const useChatLogic = () => {
     }
   }, [typingIndex, displayedText, messages]);
 
-  // Get bot response
-  const getBotResponse = async (userInput) => {
+  // Get bot response (streaming SSE dari /ask/stream)
+  const getBotResponse = async (userInput, onToken) => {
     try {
       const requestBody = { 
         user_message: userInput,
-        format_response: true
+        format_response: true,
+        session_id: sessionIdRef.current
       };
 
       if (userId) {
@@ -203,21 +243,47 @@ const useChatLogic = () => {
       console.log('🚀 SENDING REQUEST TO BACKEND:');
       console.log('  User ID:', userId);
       console.log('  Request Body:', requestBody);
-      console.log('  URL:', `${API_URL}/ask/`);
+      console.log('  URL:', `${API_URL}/ask/stream`);
 
-      const response = await fetch(`${API_URL}/ask/`, {
+      const response = await fetch(`${API_URL}/ask/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Accept': 'text/event-stream',
         },
         body: JSON.stringify(requestBody),
       });
       
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error(`HTTP ${response.status}: ${response.statusText}`);
       }
-      
-      const data = await response.json();
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let data = null;
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Setiap event SSE dipisahkan oleh baris kosong
+        const rawEvents = buffer.split('\n\n');
+        buffer = rawEvents.pop();
+        for (const rawEvent of rawEvents) {
+          const { event, payload } = parseSseEvent(rawEvent);
+          if (event === 'token') {
+            onToken?.(payload.text);
+          } else if (event === 'done' || event === 'error') {
+            data = payload;
+          }
+        }
+      }
+
+      if (!data) {
+        throw new Error('Stream berakhir tanpa respons final');
+      }
       console.log('📨 Backend response:', data);
       
       // Update current chat ID jika dapat dari backend
@@ -247,6 +313,7 @@ const useChatLogic = () => {
 
     setMessages(prev => [...prev, userMessage]);
     const userMessageText = inputMessage;
+    lastPrefetchRef.current = '';
     setInputMessage('');
     setIsSending(true);
     setIsLoading(true);
@@ -264,18 +331,30 @@ const useChatLogic = () => {
       };
       setMessages(prev => [...prev, loadingMessage]);
 
-      getBotResponse(userMessageText).then(response => {
+      // Token streaming langsung ditampilkan pada bubble bot terakhir
+      let hasStreamed = false;
+      const appendToken = (text) => {
+        hasStreamed = true;
+        setMessages(prev => {
+          const last = prev[prev.length - 1];
+          if (!last || !(last.isLoading || last.isStreaming)) return prev;
+          return [...prev.slice(0, -1), { ...last, isLoading: false, isStreaming: true, content: last.content + text }];
+        });
+      };
+
+      getBotResponse(userMessageText, appendToken).then(response => {
         setIsLoading(false);
 
         setMessages(prev => {
-          const newMessages = prev.filter(msg => !msg.isLoading);
+          const newMessages = prev.filter(msg => !msg.isLoading && !msg.isStreaming);
           const botMessage = {
             type: 'bot',
             content: response,
             timestamp: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
           };
           const result = [...newMessages, botMessage];
-          setTypingIndex(result.length - 1);
+          // Animasi ketikan hanya jika jawaban tidak datang lewat streaming
+          setTypingIndex(hasStreamed ? -1 : result.length - 1);
           setDisplayedText('');
           return result;
         });
@@ -293,7 +372,7 @@ const useChatLogic = () => {
         console.error("❌ Error getting bot response:", error);
         
         setMessages(prev => {
-          const newMessages = prev.filter(msg => !msg.isLoading);
+          const newMessages = prev.filter(msg => !msg.isLoading && !msg.isStreaming);
           const errorMessage = {
             type: 'bot',
             content: 'Maaf, terjadi kesalahan saat menghubungi server. Silakan coba lagi nanti.',